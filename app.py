@@ -1,10 +1,23 @@
 import streamlit as st
 from scripts.agent import make_agent_workflow
+from scripts.answer_cache import get_answer_cache
+from scripts.router import get_router
+from scripts.mongo_cache import get_mongo_cache
+from scripts.streaming import StreamTimings, stream_workflow
+from scripts.evaluation import get_evaluator, retry_if_poor
+from scripts.checkpointer import get_checkpointer
+from scripts.tracing import configure_logging, get_tracer, start_metrics_server
 from langgraph.types import Command
 import json
+import logging
 import os
+import uuid
 import dotenv
 
+configure_logging()
+start_metrics_server()
+logger = logging.getLogger(__name__)
+
 image_path = "img/workflow_graph.png"
 # Set page config
 st.set_page_config(
@@ -158,7 +171,9 @@ if "feedback_key" not in st.session_state:
 if "reasoning_chain" not in st.session_state:
     st.session_state.reasoning_chain = []
 if "thread_id" not in st.session_state:
-    st.session_state.thread_id = 0
+    st.session_state.thread_id = str(uuid.uuid4())
+if "latency" not in st.session_state:
+    st.session_state.latency = None
 
 dotenv.load_dotenv()
 # Header with gradient background
@@ -173,22 +188,73 @@ st.markdown("""
 
 
 
-# Display chat messages in a container
-with st.container():
-    for message in st.session_state.messages:
-        with st.container():
-            st.markdown(f"""
-                <div class="chat-message {message['role']}">
+def message_html(role, content):
+    return f"""
+                <div class="chat-message {role}">
                     <div class="content">
                         <div class="avatar">
-                            {'🧀' if message['role'] == 'assistant' else '👤'}
+                            {'🧀' if role == 'assistant' else '👤'}
                         </div>
                         <div class="message">
-                            {message['content']}
+                            {content}
                         </div>
                     </div>
                 </div>
-            """, unsafe_allow_html=True)
+            """
+
+
+def run_streaming(inputs):
+    """Run the workflow, streaming answer tokens into a live chat bubble and step updates into a status box.
+    Returns:
+        The final state and whether the run stopped for human feedback.
+    """
+    timings = StreamTimings()
+    status = st.status("Thinking...", expanded=False)
+    bubble = st.empty()
+    answer = ""
+    final_state, interrupted = None, False
+    for event in stream_workflow(
+        st.session_state.workflow,
+        inputs,
+        config={"configurable": {"thread_id": st.session_state.thread_id}},
+        timings=timings,
+    ):
+        if event.kind == "token":
+            answer += event.text
+            bubble.markdown(message_html("assistant", answer + "▌"), unsafe_allow_html=True)
+        elif event.kind == "reset":
+            answer = ""
+        elif event.kind == "status":
+            status.write(f"{event.elapsed_s:.1f}s · {event.text}")
+            status.update(label=event.text)
+        else:
+            final_state, interrupted = event.state, event.kind == "interrupt"
+    status.update(label="Waiting for more details" if interrupted else "Done", state="complete")
+    st.session_state.latency = timings
+    return final_state, interrupted
+
+
+def finish_speculative(final_state, interrupted):
+    """With the speculative evaluation policy the answer is already on screen; wait for its
+    background grade and, if it is POOR, stream the retried answer."""
+    if interrupted or get_evaluator().policy != "speculative":
+        return final_state, interrupted
+    config = {"configurable": {"thread_id": st.session_state.thread_id}}
+    if not retry_if_poor(st.session_state.workflow, config):
+        return final_state, interrupted
+    st.info("That answer did not pass the quality check, retrying...")
+    return run_streaming(None)
+
+
+# Display chat messages in a container
+with st.container():
+    for message in st.session_state.messages:
+        with st.container():
+            st.markdown(message_html(message['role'], message['content']), unsafe_allow_html=True)
+    if st.session_state.latency is not None:
+        latency = st.session_state.latency
+        ttft = f"{latency.ttft_s:.2f}s" if latency.ttft_s is not None else "n/a"
+        st.caption(f"Time to first token: {ttft} · Total: {latency.total_s:.2f}s")
     st.markdown(f"""
         <div class="content">
             <div class="message">
@@ -218,11 +284,11 @@ if st.session_state.needs_feedback:
     )
     
     if feedback_input:
-        with st.spinner("Processing..."):
-            final_state = st.session_state.workflow.invoke(
-                Command(resume=[{"args": feedback_input}]),
-                config={"configurable": {"thread_id": st.session_state.thread_id}}
-            )
+        final_state, interrupted = finish_speculative(*run_streaming(Command(resume=[{"args": feedback_input}])))
+        if interrupted:
+            st.session_state.feedback_key += 1
+            st.rerun()
+        else:
             st.session_state.needs_feedback = False
             st.session_state.feedback_key += 1
             if isinstance(final_state["message"], list):
@@ -242,55 +308,49 @@ if not st.session_state.needs_feedback:
 
     if user_input:
         st.session_state.messages.append({"role": "user", "content": user_input})
-        import random
-
-        # Generate a random integer between 0 and 100
-        st.session_state.thread_id = random.randint(0, 1000)
-        print(st.session_state.thread_id)  # Example output: 42
+        # A fresh thread per question; UUIDs keep concurrent sessions from resuming each other's runs
+        st.session_state.thread_id = str(uuid.uuid4())
+        logger.debug("thread id: %s", st.session_state.thread_id)
         chat_history = []
         for i in st.session_state.messages[-4:]:
             chat_history.append(i["role"] + ": " + i["content"])
-        print("chat history:")
-        print(chat_history)
-        print("--------------------------------")
+        logger.debug("chat history: %s", chat_history)
         initial_state = {
             "curr_state": "",
             "message": [user_input],
-            "aggregated_context": "",
-            "curr_context": [],
+            "context_ref": "",
+            "aggregated_context_ref": "",
+            "references": {},
             "query_to_retrieve_or_answer": "",
             "tool": "",
             "human_feedback": "",
             "answer_quality": "",
-            "reasoning_chain": []
+            "graded_by": "",
+            "reasoning_chain": [],
+            "iterations": 0,
+            "tokens_used": 0,
+            "best_answer": "",
+            "best_score": -1
         }
 
-        with st.spinner("Thinking..."):
-            final_state = st.session_state.workflow.invoke(
-                initial_state,
-                config={"configurable": {"thread_id": st.session_state.thread_id}}
-            )
-            
-            print("reasoning:")
-            print(final_state["reasoning_chain"])
-            print("--------------------------------")
-            print("final state:", final_state)
-            print("--------------------------------")
+        final_state, interrupted = finish_speculative(*run_streaming(initial_state))
+        logger.debug("reasoning: %s", final_state["reasoning_chain"])
+        logger.debug("final state: %s", final_state)
 
-            if "__interrupt__" in final_state:
-                st.session_state.needs_feedback = True
-                st.session_state.feedback_key += 1
-                st.rerun()
-            else:
-                if isinstance(final_state["message"], list):
-                    response = final_state["message"][-1]
-                else:
-                    response = final_state["message"]
-                
-                st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.reasoning_chain = final_state["reasoning_chain"]
-            st.session_state.input_key += 1
+        if interrupted:
+            st.session_state.needs_feedback = True
+            st.session_state.feedback_key += 1
             st.rerun()
+        else:
+            if isinstance(final_state["message"], list):
+                response = final_state["message"][-1]
+            else:
+                response = final_state["message"]
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+        st.session_state.reasoning_chain = final_state["reasoning_chain"]
+        st.session_state.input_key += 1
+        st.rerun()
 
 # Sidebar with information
 with st.sidebar:
@@ -303,3 +363,67 @@ with st.sidebar:
     # Add the workflow graph
 
     st.image(image_path)
+
+    # Semantic answer cache metrics
+    cache_stats = get_answer_cache().stats()
+    st.markdown("### Answer cache")
+    st.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+    st.metric("Latency saved", f"{cache_stats['saved_latency_s']:.1f}s")
+    st.caption(f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} cached answers")
+
+    # Fast-path router metrics
+    router_stats = get_router().stats()
+    st.markdown("### Fast-path router")
+    st.metric("Routed without the LLM", f"{router_stats['fast_path_rate']:.0%}")
+    for route, share in sorted(router_stats["routes"].items()):
+        st.caption(f"{route}: {share:.0%}")
+
+    # MongoDB query/result cache metrics
+    mongo_stats = get_mongo_cache().stats()
+    st.markdown("### MongoDB cache")
+    st.metric("Query hit ratio", f"{mongo_stats['query']['hit_ratio']:.0%}")
+    st.metric("Result hit ratio", f"{mongo_stats['result']['hit_ratio']:.0%}")
+    st.caption(f"{mongo_stats['query']['size']} queries, {mongo_stats['result']['size']} result sets cached")
+
+    # Answer grading metrics
+    evaluator = get_evaluator()
+    grading = evaluator.stats.stats().get(evaluator.policy)
+    st.markdown(f"### Answer grading ({evaluator.policy})")
+    if grading:
+        st.metric("Grading time per answer", f"{grading['mean_blocking_s'] * 1000:.0f}ms")
+        st.metric("Latency saved", f"{grading['saved_s']:.1f}s")
+        st.caption(f"{grading['answers']} answers, {grading['llm_graded']} graded by the LLM, "
+                   f"{grading['retries']} retried after a background grade")
+
+    # Checkpoint store metrics
+    checkpointer = get_checkpointer()
+    if hasattr(checkpointer, "stats"):
+        checkpoint_stats = checkpointer.stats()
+        st.markdown("### Checkpoints")
+        st.metric("Stored", f"{checkpoint_stats['bytes'] / 1024:.0f} KB")
+        st.metric("Write latency (p95)", f"{checkpoint_stats['p95_write_ms']:.1f}ms")
+        st.caption(f"{checkpoint_stats['checkpoints']} checkpoints in {checkpoint_stats['threads']} threads, "
+                   f"{checkpoint_stats['compression_ratio']:.1f}x compressed, "
+                   f"{checkpoint_stats['evicted_threads']} threads evicted")
+
+    # Per-request waterfall of the last question's trace
+    trace = get_tracer().export(st.session_state.thread_id)
+    if trace and trace["spans"]:
+        total = trace["duration_s"] or 1e-9
+        st.markdown("### Request waterfall")
+        st.caption(f"{total * 1000:.0f}ms, {len(trace['spans'])} spans")
+        colors = {"node": "#4a90e2", "llm": "#e2904a", "mongo": "#4ae290", "vector": "#904ae2", "embedding": "#e24a90"}
+        rows = []
+        for item in trace["spans"]:
+            left = 100 * item["start_s"] / total
+            width = max(100 * item["duration_s"] / total, 0.5)
+            tokens = item["attributes"].get("prompt_tokens", 0) + item["attributes"].get("completion_tokens", 0)
+            label = f"{item['kind']}:{item['name']} {item['duration_s'] * 1000:.0f}ms" + (f" {tokens} tok" if tokens else "")
+            color = "#d9534f" if item["error"] else colors.get(item["kind"], "#888888")
+            rows.append(
+                f"<div style='font-size: 0.75rem; margin: 2px 0;'>{label}"
+                f"<div style='background: #eeeeee; height: 6px; position: relative;'>"
+                f"<div style='position: absolute; left: {left:.1f}%; width: {width:.1f}%; height: 6px; "
+                f"background: {color};'></div></div></div>"
+            )
+        st.markdown("".join(rows), unsafe_allow_html=True)
@@ -0,0 +1,188 @@
+"""Compare request throughput of the sync graph on a thread pool with the async graph on one event loop.
+
+Every remote service is a local stand-in with simulated latency: the chat
+models (reasoning, query generation, answer, evaluation), the embedding model,
+the vector index and MongoDB. The sync graph blocks a thread for each of those
+waits; the async graph awaits them, so one loop keeps many conversations in flight.
+
+Usage:
+    python -m benchmarks.async_throughput
+    python -m benchmarks.async_throughput --requests 500 --threads 8 32 --concurrency 32 256 --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Caches and the local router would hide the latency being measured.
+os.environ.setdefault("ROUTER_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("MONGO_CACHE_ENABLED", "false")
+os.environ.setdefault("MONGO_EXPLAIN_SAMPLE_RATE", "0")
+
+from langchain_core.messages import AIMessage
+
+from benchmarks.query_compiler import WORKLOAD
+from benchmarks.standins import (AsyncInMemoryCollection, AsyncRemoteIndexStandIn, InMemoryCollection,
+                                 LatencyStandIn, RemoteIndexStandIn, fake_chain, fake_embedding)
+from scripts.agent import make_agent_workflow
+from scripts.catalog import iter_products
+from scripts.chains import register_chain
+from scripts.mongo_indexes import search_fields
+from scripts.nodes.answerNode import evaluationOutput
+from scripts.nodes.reasoningNode import reasoningOutput
+from scripts.vector_store import LocalVectorIndex, build_product_metadata, write_local_index
+import scripts.nodes.MongoDBretrievalNode as mongo_node
+import scripts.nodes.pineconeretrievalNode as vector_node
+
+SEMANTIC_WORKLOAD = [
+    "What are the characteristics of brie cheese?",
+    "Find cheese that's good for pizza",
+    "What cheese is similar to brie?",
+    "Show me creamy Italian cheeses",
+    "Describe the taste and texture of aged gouda",
+    "Which cheese melts best on a burger?",
+    "Something mild for kids' sandwiches",
+    "A tangy cheese for salads",
+]
+
+
+def install_standins(catalog_path: str, directory: str, llm_ms: float, embed_ms: float, rtt_ms: float):
+    """Point the nodes and chains at the stand-ins."""
+    products = list(iter_products(catalog_path))
+    documents = [dict({k: v for k, v in p.items() if k != "_id"}, **search_fields(p)) for p in products]
+    collection = InMemoryCollection(documents, rtt_ms=rtt_ms)
+    async_collection = AsyncInMemoryCollection(collection)
+    mongo_node.get_mongo_collection = lambda: collection
+    mongo_node.get_async_mongo_collection = lambda: async_collection
+
+    path = os.path.join(directory, "index")
+    write_local_index(path, [f"product_{i}" for i in range(len(products))],
+                      [fake_embedding(p.get("text") or p.get("name", "")) for p in products],
+                      [build_product_metadata(p) for p in products])
+    index = LocalVectorIndex(path)
+    remote_index = RemoteIndexStandIn(index, rtt_ms=rtt_ms)
+    async_remote_index = AsyncRemoteIndexStandIn(index, rtt_ms=rtt_ms)
+    vector_node.get_vector_index = lambda: remote_index
+    vector_node.get_async_vector_index = lambda: async_remote_index
+
+    embed_latency = LatencyStandIn(embed_ms, jitter_ms=embed_ms / 5)
+
+    def embed_query(text):
+        embed_latency.wait()
+        return fake_embedding(text)
+
+    async def aembed_query(text):
+        await embed_latency.await_()
+        return fake_embedding(text)
+
+    vector_node.embed_query = embed_query
+    vector_node.aembed_query = aembed_query
+
+    tools = {query: "mongoDB_retrieval" for query in WORKLOAD}
+    tools.update({query: "pinecone_retrieval" for query in SEMANTIC_WORKLOAD})
+    latency = LatencyStandIn(llm_ms, jitter_ms=llm_ms / 5)
+    register_chain("reasoning", lambda: fake_chain(lambda inputs: reasoningOutput(
+        query=inputs["message"][0], analysis="benchmark", curr_context="",
+        tool=tools.get(inputs["message"][0], "pinecone_retrieval")), latency))
+    register_chain("mongo_query", lambda: fake_chain(lambda inputs: AIMessage(
+        content='{"query_type": "find", "filter_conditions": {}, "limit": 10}'), latency))
+    register_chain("answer", lambda: fake_chain(lambda inputs: AIMessage(
+        content=f"Found products for {inputs['question']}."), latency))
+    register_chain("evaluation", lambda: fake_chain(lambda inputs: evaluationOutput(
+        analysis="benchmark", tool="GOOD"), latency))
+
+
+def initial_state(query: str) -> dict:
+    return {
+        "message": [query],
+        "context_ref": "",
+        "aggregated_context_ref": "",
+        "references": {},
+        "query_to_retrieve_or_answer": "",
+        "tool": "",
+        "curr_state": "",
+        "human_feedback": "",
+        "answer_quality": "",
+        "graded_by": "",
+        "reasoning_chain": [],
+        "iterations": 0,
+        "tokens_used": 0,
+        "best_answer": "",
+        "best_score": -1,
+    }
+
+
+def run_threads(workflow, queries, threads: int):
+    def one(i):
+        start = time.perf_counter()
+        workflow.invoke(initial_state(queries[i]), config={"configurable": {"thread_id": f"thread-{threads}-{i}"}})
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(len(queries))))
+    return time.perf_counter() - start, latencies
+
+
+async def run_event_loop(workflow, queries, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await workflow.ainvoke(initial_state(queries[i]),
+                                   config={"configurable": {"thread_id": f"async-{concurrency}-{i}"}})
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(len(queries))))
+    return time.perf_counter() - start, latencies
+
+
+def report(label: str, elapsed: float, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{label:<24} {len(latencies) / elapsed:>8.1f} req/s   p50 {statistics.median(latencies):.2f}s   "
+          f"p95 {p95:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, nargs="+", default=[8, 32], help="Thread pool sizes (sync graph)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[32, 256],
+                        help="In-flight requests on the event loop (async graph)")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="MongoDB and vector index round trip")
+    args = parser.parse_args()
+
+    workload = WORKLOAD + SEMANTIC_WORKLOAD
+    queries = [workload[i % len(workload)] for i in range(args.requests)]
+    with tempfile.TemporaryDirectory() as directory:
+        install_standins(args.catalog, directory, args.llm_latency_ms, args.embed_latency_ms, args.rtt_ms)
+        sync_workflow = make_agent_workflow(warm_up=True)
+        async_workflow = make_agent_workflow(warm_up=False, async_mode=True)
+
+        print(f"{args.requests} requests, LLM {args.llm_latency_ms:.0f}ms, embedding {args.embed_latency_ms:.0f}ms, "
+              f"round trip {args.rtt_ms:.0f}ms")
+        results = []
+        # The nodes log every step; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for threads in args.threads:
+                results.append((f"sync, {threads} threads", *run_threads(sync_workflow, queries, threads)))
+            for concurrency in args.concurrency:
+                results.append((f"async, {concurrency} in flight",
+                                *asyncio.run(run_event_loop(async_workflow, queries, concurrency))))
+        for label, elapsed, latencies in results:
+            report(label, elapsed, latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measure the checkpoint bytes and serialization time each graph step costs.
+
+Runs the workload through the graph on a SQLiteCheckpointer, with the stand-in
+services of benchmarks.async_throughput, and records every checkpoint write:
+
+  before  every channel re-serialized at each step, retrieved contexts inline:
+          what full-state node returns with the context in the state cost
+  after   only the channels the step's node returned, contexts as references
+
+Usage:
+    python -m benchmarks.checkpoint_size
+    python -m benchmarks.checkpoint_size --requests 100 --poor-rate 0.25
+"""
+import argparse
+import contextlib
+import itertools
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.async_throughput import SEMANTIC_WORKLOAD, initial_state, install_standins
+from benchmarks.query_compiler import WORKLOAD
+from benchmarks.standins import LatencyStandIn, fake_chain
+from scripts.agent import make_agent_workflow
+from scripts.chains import register_chain
+from scripts.checkpointer import SQLiteCheckpointer
+from scripts.context_store import get_context_store
+from scripts.nodes.answerNode import evaluationOutput
+import scripts.checkpointer as checkpointer_module
+
+
+class MeasuringCheckpointer(SQLiteCheckpointer):
+    """SQLiteCheckpointer that also records what each write costs, before and after."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.steps = []
+
+    def _measure(self, values: dict):
+        start = time.perf_counter()
+        size = sum(len(self._dump(value)[1]) for value in values.values())
+        return size, time.perf_counter() - start
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        values = checkpoint["channel_values"]
+        store = get_context_store()
+        inline = {channel: store.get(value) if channel.endswith("context_ref") else value
+                  for channel, value in values.items()}
+        before = self._measure(inline)
+        after = self._measure({channel: values[channel] for channel in new_versions if channel in values})
+        self.steps.append((before, after))
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+def summarize(label: str, samples, requests: int):
+    sizes = sorted(size for size, _ in samples)
+    times = [seconds for _, seconds in samples]
+    print(f"{label:<8} {statistics.mean(sizes):>9.0f}B {sizes[int(0.95 * (len(sizes) - 1))]:>9}B "
+          f"{sum(sizes) / requests / 1024:>11.1f}KB {statistics.mean(times) * 1e6:>10.0f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--poor-rate", type=float, default=0.25, help="Share of answers graded POOR (retried)")
+    args = parser.parse_args()
+
+    workload = WORKLOAD + SEMANTIC_WORKLOAD
+    queries = [workload[i % len(workload)] for i in range(args.requests)]
+    with tempfile.TemporaryDirectory() as directory:
+        install_standins(args.catalog, directory, 0.0, 0.0, 0.0)
+        every = max(1, round(1 / args.poor_rate)) if args.poor_rate > 0 else 0
+        grades = itertools.count(1)
+        register_chain("evaluation", lambda: fake_chain(lambda inputs: evaluationOutput(
+            analysis="benchmark", tool="POOR" if every and next(grades) % every == 0 else "GOOD"), LatencyStandIn(0)))
+        saver = MeasuringCheckpointer(os.path.join(directory, "checkpoints.sqlite"), compact_interval=0)
+        checkpointer_module._checkpointer = saver
+        workflow = make_agent_workflow(warm_up=True)
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for i, query in enumerate(queries):
+                workflow.invoke(initial_state(query), config={"configurable": {"thread_id": f"size-{i}"}})
+
+        print(f"{args.requests} requests, {len(saver.steps)} checkpoints")
+        print(f"{'':<8} {'mean/step':>10} {'p95/step':>10} {'per request':>13} {'serialize':>12}")
+        summarize("before", [before for before, _ in saver.steps], args.requests)
+        summarize("after", [after for _, after in saver.steps], args.requests)
+        stats = saver.stats()
+        print(f"stored: {stats['bytes'] / 1024:.1f}KB in {stats['checkpoints']} checkpoints, "
+              f"{stats['compression_ratio']:.1f}x compressed, p95 write {stats['p95_write_ms']:.2f}ms")
+        saver.close()
+
+
+if __name__ == "__main__":
+    main()
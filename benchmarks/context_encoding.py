@@ -0,0 +1,131 @@
+"""Compare the prompt tokens of the old str()/multi-line context formats with the compact encoder.
+
+The MongoDB contexts come from the query compiler's workload run against an
+in-memory copy of the fixture; the vector-search contexts from fixed top-5
+product sets. With --live N, the answer chain is also timed on the first N
+queries with each format (needs OPENAI_API_KEY).
+
+Usage:
+    python -m benchmarks.context_encoding
+    python -m benchmarks.context_encoding --live 5
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("MONGO_EXPLAIN_SAMPLE_RATE", "0")
+
+from benchmarks.query_compiler import WORKLOAD
+from benchmarks.standins import InMemoryCollection
+from scripts.catalog import iter_products
+from scripts.context_encoder import encode_products
+from scripts.query_compiler import QueryCompiler
+from scripts.tokens import estimate_tokens
+from scripts.vector_store import build_product_metadata
+import scripts.nodes.MongoDBretrievalNode as mongo_node
+
+
+def legacy_mongo_context(results: dict) -> str:
+    """The str() of the list of dicts the node produced before the encoder."""
+    if results["query_type"] == "aggregate":
+        return str([{"result": row} for row in results["rows"]])
+    formatted = [{"the number of products": results["total"]}]
+    for result in results["products"]:
+        formatted.append({
+            "name": result.get("name", "N/A"),
+            "brand": result.get("brand", "N/A"),
+            "price": f"${result.get('price', 'N/A')}",
+            "price_per_unit": f"${result.get('pricePer', 'N/A')}/{result.get('weight_unit', 'unit')}",
+            "department": result.get("department", "N/A"),
+            "weight": f"{result.get('weight_each', 'N/A')} {result.get('weight_unit', 'units')}",
+            "description": result.get("description", "N/A"),
+            "image": result.get("image", "N/A"),
+        })
+    return str(formatted)
+
+
+def legacy_vector_context(products) -> str:
+    """The multi-line block per product the vector search node produced before the encoder."""
+    formatted_info = []
+    for product in products:
+        info = f"Product: {product.get('name', 'N/A')}\n"
+        info += f"Category: {product.get('department', 'N/A')}\n"
+        info += f"Price: ${product.get('price', 'N/A')}\n"
+        if product.get('pricePer'):
+            info += f"Price per pound: ${product.get('pricePer')}/lb\n"
+        info += f"Brand: {product.get('brand', 'N/A')}\n"
+        info += f"Similarity Score: {product['score']:.2f}\n"
+        info += f"Product URL: {product.get('href', 'N/A')}\n"
+        info += f"image_url: {product.get('showImage', 'N/A')}\n"
+        info += f"SKU: {product.get('sku', 'N/A')}\n"
+        info += f"Related Products: {product.get('relateds', 'N/A')}\n"
+        formatted_info.append(info)
+    return "\n".join(formatted_info)
+
+
+def build_contexts(catalog_path: str, vector_sets: int):
+    catalog = list(iter_products(catalog_path))
+    collection = InMemoryCollection([{k: v for k, v in p.items() if k != "_id"} for p in catalog])
+    mongo_node.get_mongo_collection = lambda: collection
+    compiler = QueryCompiler()
+
+    cases = []
+    for query in WORKLOAD:
+        mongo_query = compiler.compile(query)
+        if mongo_query is None:
+            continue
+        results = mongo_node.run_mongo_query(mongo_query)
+        cases.append(("mongo", query, legacy_mongo_context(results), mongo_node.encode_mongo_results(results)))
+
+    rng = random.Random(0)
+    for i in range(vector_sets):
+        products = [dict(build_product_metadata(product), score=round(rng.uniform(0.3, 0.9), 4))
+                    for product in rng.sample(catalog, 5)]
+        cases.append(("vector", f"vector search #{i + 1}", legacy_vector_context(products), encode_products(products)))
+    return cases
+
+
+def time_answers(cases, count: int):
+    from scripts.chains import get_chain
+    import scripts.nodes.answerNode  # noqa: F401  registers the "answer" chain
+    chain = get_chain("answer")
+    timings = {"before": [], "after": []}
+    for _, query, before, after in cases[:count]:
+        for label, context in (("before", before), ("after", after)):
+            start = time.perf_counter()
+            chain.invoke({"context": context, "question": query})
+            timings[label].append(time.perf_counter() - start)
+    return {label: statistics.median(values) for label, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--vector-sets", type=int, default=10)
+    parser.add_argument("--live", type=int, default=0, help="Time the answer chain on this many queries")
+    args = parser.parse_args()
+
+    cases = build_contexts(args.catalog, args.vector_sets)
+    print(f"{'source':<8} {'before':>8} {'after':>8} {'saved':>7}  query")
+    totals = {}
+    for source, query, before, after in cases:
+        tokens_before, tokens_after = estimate_tokens(before), estimate_tokens(after)
+        total = totals.setdefault(source, [0, 0, 0])
+        total[0] += tokens_before
+        total[1] += tokens_after
+        total[2] += 1
+        print(f"{source:<8} {tokens_before:>8} {tokens_after:>8} {1 - tokens_after / tokens_before:>7.0%}  {query}")
+    print()
+    for source, (before, after, count) in totals.items():
+        print(f"{source}: {before / count:.0f} -> {after / count:.0f} context tokens per request "
+              f"({1 - after / before:.0%} fewer)")
+
+    if args.live:
+        latency = time_answers(cases, args.live)
+        print(f"Answer latency (median of {args.live}): before {latency['before']:.2f}s, after {latency['after']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Replay a versioned query corpus through the real agent graph, with every remote service stood in locally.
+
+The graph is the one make_agent_workflow() builds; the chat models are scripted
+from the corpus (route, follow-up route after a human reply, grade per attempt),
+the embedder, MongoDB and the vector index are the deterministic stand-ins of
+benchmarks.standins, loaded from the product fixture. Timings and token counts
+come from the request traces (scripts.tracing).
+
+Reports p50/p95/p99 end to end, per route and per span (graph nodes, LLM calls,
+Mongo and vector queries), plus LLM calls and tokens per query, and writes them
+as JSON so runs on two commits can be compared.
+
+Usage:
+    python -m benchmarks.end_to_end
+    python -m benchmarks.end_to_end --rounds 10 --output results/e2e.json
+    python -m benchmarks.end_to_end --async --compare results/e2e.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Caches and the local router would hide the work being measured; the suite needs the traces.
+os.environ.setdefault("ROUTER_ENABLED", "false")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+os.environ.setdefault("MONGO_CACHE_ENABLED", "false")
+os.environ.setdefault("MONGO_EXPLAIN_SAMPLE_RATE", "0")
+os.environ["TRACING_ENABLED"] = "true"
+
+from langchain_core.messages import AIMessage
+from langgraph.types import Command
+
+from benchmarks.async_throughput import initial_state, install_standins
+from benchmarks.standins import LatencyStandIn, fake_chain
+from scripts.agent import make_agent_workflow
+from scripts.chains import register_chain
+from scripts.checkpointer import SQLiteCheckpointer
+from scripts.evaluation import EVALUATION_POLICY
+from scripts.nodes.answerNode import evaluationOutput
+from scripts.nodes.reasoningNode import reasoningOutput
+from scripts.tracing import get_tracer
+import scripts.checkpointer as checkpointer_module
+
+DEFAULT_CORPUS = "./fixture/benchmark_queries_v1.json"
+PERCENTILES = (50, 95, 99)
+
+
+def load_corpus(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    routes = {"mongoDB_retrieval", "pinecone_retrieval", "combined_search", "human_in_the_loop", "out_of_scope"}
+    for entry in corpus["queries"]:
+        if entry["route"] not in routes or entry.get("route_after_feedback", "mongoDB_retrieval") not in routes:
+            raise ValueError(f"Unknown route in corpus entry {entry['id']}")
+        if entry["route"] == "human_in_the_loop" and "feedback" not in entry:
+            raise ValueError(f"Corpus entry {entry['id']} routes to human_in_the_loop without feedback")
+    return corpus
+
+
+def install_scripted_models(corpus: dict, llm_ms: float):
+    """Answer the reasoning and evaluation prompts from the corpus instead of a model."""
+    entries = {entry["query"]: entry for entry in corpus["queries"]}
+    latency = LatencyStandIn(llm_ms, jitter_ms=llm_ms / 5)
+
+    def reason(inputs):
+        entry = entries[inputs["message"][0]]
+        route = entry.get("route_after_feedback", "mongoDB_retrieval") if inputs["human_feedback"] else entry["route"]
+        query = f"{entry['query']} ({inputs['human_feedback']})" if inputs["human_feedback"] else entry["query"]
+        return reasoningOutput(query=query, analysis=f"Scripted route for {entry['id']}: {route}",
+                               curr_context="", tool=route)
+
+    def grade(inputs):
+        # message is the question followed by every answer so far, the one being graded last
+        grades = entries[inputs["message"][0]].get("grades", [])
+        attempt = len(inputs["message"]) - 2
+        return evaluationOutput(analysis="Scripted grade", tool=grades[attempt] if attempt < len(grades) else "GOOD")
+
+    def answer(inputs):
+        products = inputs["context"].count("\n")
+        return AIMessage(content=f"Here is what I found for {inputs['question']}: {products} catalog lines "
+                                 f"matched, the best fits are listed first with their prices and pack sizes.")
+
+    register_chain("reasoning", lambda: fake_chain(reason, latency))
+    register_chain("answer", lambda: fake_chain(answer, latency))
+    register_chain("evaluation", lambda: fake_chain(grade, latency))
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def distribution(values) -> dict:
+    return {"count": len(values), "mean_ms": 1000 * sum(values) / len(values),
+            **{f"p{q}_ms": 1000 * percentile(values, q) for q in PERCENTILES}}
+
+
+def run_query(workflow, entry: dict, thread_id: str, async_mode: bool) -> float:
+    """Run one corpus query to the end, answering the human-in-the-loop question if asked.
+    Returns the time spent in the graph (the human's reply time is not counted)."""
+    config = {"configurable": {"thread_id": thread_id}}
+
+    def invoke(inputs):
+        if async_mode:
+            return asyncio.run(workflow.ainvoke(inputs, config=config))
+        return workflow.invoke(inputs, config=config)
+
+    start = time.perf_counter()
+    result = invoke(initial_state(entry["query"]))
+    elapsed = time.perf_counter() - start
+    if "__interrupt__" in result:
+        start = time.perf_counter()
+        invoke(Command(resume=[{"args": entry["feedback"]}]))
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def collect(trace: dict) -> dict:
+    """LLM calls and tokens of one request trace."""
+    llm = [span for span in trace["spans"] if span["kind"] == "llm"]
+    return {
+        "llm_calls": len(llm),
+        "prompt_tokens": sum(span["attributes"].get("prompt_tokens", 0) for span in llm),
+        "completion_tokens": sum(span["attributes"].get("completion_tokens", 0) for span in llm),
+    }
+
+
+def run(corpus: dict, rounds: int, async_mode: bool, workflow) -> dict:
+    """Replay the corpus rounds times; one warm-up pass is not measured."""
+    tracer = get_tracer()
+    latencies, by_route, spans, per_query = [], {}, {}, {}
+    for entry in corpus["queries"]:
+        run_query(workflow, entry, f"warmup-{entry['id']}", async_mode)
+    llm_before = sum(item["count"] for key, item in tracer.summary().items() if key.startswith("llm:"))
+    for round_number in range(rounds):
+        for entry in corpus["queries"]:
+            thread_id = f"e2e-{round_number}-{entry['id']}"
+            elapsed = run_query(workflow, entry, thread_id, async_mode)
+            trace = tracer.export(thread_id)
+            latencies.append(elapsed)
+            by_route.setdefault(entry["route"], []).append(elapsed)
+            for span in trace["spans"]:
+                spans.setdefault(f"{span['kind']}:{span['name']}", []).append(span["duration_s"])
+            counts = collect(trace)
+            query = per_query.setdefault(entry["id"], {"route": entry["route"], "latencies": [],
+                                                       **{key: 0 for key in counts}})
+            query["latencies"].append(elapsed)
+            for key, value in counts.items():
+                query[key] += value
+    requests = rounds * len(corpus["queries"])
+    llm_after = sum(item["count"] for key, item in tracer.summary().items() if key.startswith("llm:"))
+    totals = {key: sum(query[key] for query in per_query.values()) for key in ("llm_calls", "prompt_tokens",
+                                                                               "completion_tokens")}
+    return {
+        "requests": requests,
+        "end_to_end": distribution(latencies),
+        "routes": {route: distribution(values) for route, values in sorted(by_route.items())},
+        "spans": {name: distribution(values) for name, values in sorted(spans.items())},
+        "per_query": {
+            **{key: value / requests for key, value in totals.items()},
+            # Includes the grades the speculative policy runs in the background, outside the request traces
+            "llm_calls_all": (llm_after - llm_before) / requests,
+        },
+        "queries": [{
+            "id": query_id,
+            "route": query["route"],
+            "p50_ms": 1000 * percentile(query["latencies"], 50),
+            **{key: query[key] / rounds for key in ("llm_calls", "prompt_tokens", "completion_tokens")},
+        } for query_id, query in per_query.items()],
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def print_report(results: dict, baseline: dict = None):
+    def row(label, current, before=None):
+        line = f"{label:<34}" + "".join(f"{current[f'p{q}_ms']:>10.1f}" for q in PERCENTILES)
+        if before:
+            change = (current["p50_ms"] - before["p50_ms"]) / before["p50_ms"] if before["p50_ms"] else 0.0
+            line += f"{change:>+10.0%}"
+        print(line)
+
+    print(f"corpus v{results['corpus_version']}, {results['requests']} requests, {results['mode']}, "
+          f"commit {results['commit'] or '?'}" + (f" vs {baseline['commit'] or '?'}" if baseline else ""))
+    print(f"{'':<34}" + "".join(f"{f'p{q} ms':>10}" for q in PERCENTILES) + (f"{'p50 diff':>10}" if baseline else ""))
+    row("end to end", results["end_to_end"], baseline and baseline["end_to_end"])
+    for section in ("routes", "spans"):
+        for name, current in results[section].items():
+            row(f"  {name}", current, baseline and baseline[section].get(name))
+    per_query = results["per_query"]
+    print(f"per query: {per_query['llm_calls']:.2f} LLM calls ({per_query['llm_calls_all']:.2f} with background "
+          f"grading), {per_query['prompt_tokens']:.0f} prompt + {per_query['completion_tokens']:.0f} completion tokens")
+    if baseline:
+        before = baseline["per_query"]
+        print(f"  before: {before['llm_calls']:.2f} LLM calls, {before['prompt_tokens']:.0f} prompt + "
+              f"{before['completion_tokens']:.0f} completion tokens")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=5, help="Times the corpus is replayed")
+    parser.add_argument("--async", dest="async_mode", action="store_true", help="Run the async graph")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="MongoDB and vector index round trip")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    # The index writer reports on stdout; keep the report readable.
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        install_standins(args.catalog, directory, args.llm_latency_ms, args.embed_latency_ms, args.rtt_ms)
+        install_scripted_models(corpus, args.llm_latency_ms)
+        checkpointer_module._checkpointer = SQLiteCheckpointer(os.path.join(directory, "checkpoints.sqlite"))
+        workflow = make_agent_workflow(warm_up=not args.async_mode, async_mode=args.async_mode)
+        results = run(corpus, args.rounds, args.async_mode, workflow)
+        checkpointer_module._checkpointer.close()
+
+    results = {
+        "benchmark": "end_to_end",
+        "corpus_version": corpus["version"],
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mode": "async" if args.async_mode else "sync",
+        "config": {"rounds": args.rounds, "llm_latency_ms": args.llm_latency_ms,
+                   "embed_latency_ms": args.embed_latency_ms, "rtt_ms": args.rtt_ms,
+                   "evaluation_policy": EVALUATION_POLICY},
+        **results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("corpus_version") != results["corpus_version"]:
+            print(f"warning: comparing corpus v{results['corpus_version']} against v{baseline.get('corpus_version')}")
+    print_report(results, baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare end-to-end latency of the answer evaluation policies.
+
+Runs the same workload through the graph once per policy, with the stand-in
+services of benchmarks.async_throughput. The grader's verdicts come from
+--poor-rate. Policies that do not wait for the LLM skip the retries the "llm"
+policy makes, except speculative, which retries after the answer was shown.
+
+Usage:
+    python -m benchmarks.evaluation_policies
+    python -m benchmarks.evaluation_policies --requests 100 --llm-latency-ms 800 --poor-rate 0.1
+"""
+import argparse
+import contextlib
+import itertools
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.async_throughput import SEMANTIC_WORKLOAD, initial_state, install_standins
+from benchmarks.query_compiler import WORKLOAD
+from benchmarks.standins import LatencyStandIn, fake_chain
+from scripts.agent import make_agent_workflow
+from scripts.chains import register_chain
+from scripts.nodes.answerNode import evaluationOutput
+import scripts.evaluation as evaluation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--poor-rate", type=float, default=0.1, help="Share of answers the LLM grader calls POOR")
+    parser.add_argument("--sample-rate", type=float, default=evaluation.EVALUATION_SAMPLE_RATE)
+    args = parser.parse_args()
+
+    workload = WORKLOAD + SEMANTIC_WORKLOAD
+    queries = [workload[i % len(workload)] for i in range(args.requests)]
+    with tempfile.TemporaryDirectory() as directory:
+        install_standins(args.catalog, directory, args.llm_latency_ms, 50.0, 5.0)
+        # Every n-th grade is POOR, so each policy sees the same verdict pattern.
+        every = max(1, round(1 / args.poor_rate)) if args.poor_rate > 0 else 0
+        grades = itertools.count(1)
+        register_chain("evaluation", lambda: fake_chain(lambda inputs: evaluationOutput(
+            analysis="benchmark", tool="POOR" if every and next(grades) % every == 0 else "GOOD"),
+            LatencyStandIn(args.llm_latency_ms, jitter_ms=args.llm_latency_ms / 5)))
+        workflow = make_agent_workflow(warm_up=True)
+
+        print(f"{'policy':<12} {'mean':>7} {'p95':>7} {'grading':>9} {'LLM grades':>11} {'retries':>8} {'saved':>8}")
+        for policy in evaluation.EVALUATION_POLICIES:
+            evaluation._evaluator = evaluation.AnswerEvaluator(policy, args.sample_rate)
+            latencies = []
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                for i, query in enumerate(queries):
+                    config = {"configurable": {"thread_id": f"{policy}-{i}"}}
+                    start = time.perf_counter()
+                    workflow.invoke(initial_state(query), config=config)
+                    # The answer is on screen here; a speculative retry only costs time when the grade is POOR.
+                    latencies.append(time.perf_counter() - start)
+                    if policy == "speculative" and evaluation.retry_if_poor(workflow, config):
+                        workflow.invoke(None, config=config)
+            stats = evaluation.get_evaluation_stats().stats()[policy]
+            latencies.sort()
+            print(f"{policy:<12} {statistics.mean(latencies):>6.2f}s {latencies[int(0.95 * (len(latencies) - 1))]:>6.2f}s "
+                  f"{stats['mean_blocking_s'] * 1000:>7.0f}ms {stats['llm_graded']:>11} {stats['answers'] - len(queries):>8} "
+                  f"{stats['saved_s']:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
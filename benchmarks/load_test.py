@@ -0,0 +1,289 @@
+"""Simulate many shoppers talking to one deployment at once and report how it scales.
+
+Each simulated session runs multi-turn conversations drawn from the benchmark
+corpus against the compiled workflow: a fresh thread per question, as in
+app.py and the HTTP server, answering the human-in-the-loop question with
+Command(resume=...) when the graph interrupts. Concurrency is ramped level by
+level; at each level N sessions run for a fixed time, as N threads on the sync
+graph or N tasks on one event loop with the async graph.
+
+Every remote service is a local stand-in (see benchmarks.end_to_end), so this
+runs on a laptop; the simulated latencies set how much waiting there is to overlap.
+
+Per level: turns per second, p50/p95/p99 turn latency, error rate, the resident
+memory per session at the level's peak and still held after it, and the
+checkpoint bytes each turn adds.
+
+Usage:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --mode async --sessions 1 8 64 256 --duration 20
+    python -m benchmarks.load_test --mode threads --think-ms 2000 --output results/load.json
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langgraph.types import Command
+
+from benchmarks.async_throughput import initial_state, install_standins
+from benchmarks.end_to_end import (DEFAULT_CORPUS, PERCENTILES, git_commit, install_scripted_models, load_corpus,
+                                   percentile)
+from scripts.agent import make_agent_workflow
+from scripts.checkpointer import SQLiteCheckpointer
+import scripts.checkpointer as checkpointer_module
+
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemorySampler:
+    """Memory of one level: the baseline before it, the peak during it and what is still held
+    after it (after a garbage collection). Samples the current resident set size in the
+    background; where that is not readable, Python allocations are traced instead."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.traced = rss_bytes() is None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory_sampler", daemon=True)
+
+    def _current(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.traced else rss_bytes()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.peak = max(self.peak, self._current())
+
+    def __enter__(self):
+        gc.collect()
+        if self.traced:
+            tracemalloc.start()
+        self.baseline = self.peak = self._current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self.traced:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        else:
+            self.peak = max(self.peak, self._current())
+        gc.collect()
+        self.retained = self._current()
+        if self.traced:
+            tracemalloc.stop()
+
+
+class Level:
+    """Turn latencies and errors of one concurrency level."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.errors = {}
+        self.conversations = 0
+
+    def record(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def fail(self, error: Exception):
+        with self._lock:
+            name = type(error).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def finish_conversation(self):
+        with self._lock:
+            self.conversations += 1
+
+
+def conversations(corpus: dict, session: int, turns: int):
+    """Endless, reproducible stream of conversations (lists of corpus entries) for one session."""
+    rng = random.Random(session)
+    entries = corpus["queries"]
+    while True:
+        yield [rng.choice(entries) for _ in range(turns)]
+
+
+def run_turn(workflow, entry: dict):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    result = workflow.invoke(initial_state(entry["query"]), config=config)
+    if "__interrupt__" in result:
+        workflow.invoke(Command(resume=[{"args": entry["feedback"]}]), config=config)
+
+
+async def arun_turn(workflow, entry: dict):
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    result = await workflow.ainvoke(initial_state(entry["query"]), config=config)
+    if "__interrupt__" in result:
+        await workflow.ainvoke(Command(resume=[{"args": entry["feedback"]}]), config=config)
+
+
+def run_threads(workflow, corpus: dict, sessions: int, args) -> Level:
+    level = Level()
+    deadline = time.perf_counter() + args.duration
+
+    def session(number: int):
+        for conversation in conversations(corpus, number, args.turns):
+            for entry in conversation:
+                if time.perf_counter() >= deadline:
+                    return
+                start = time.perf_counter()
+                try:
+                    run_turn(workflow, entry)
+                    level.record(time.perf_counter() - start)
+                except Exception as e:
+                    level.fail(e)
+                time.sleep(args.think_ms / 1000)
+            level.finish_conversation()
+
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as pool:
+        list(pool.map(session, range(sessions)))
+    return level
+
+
+async def run_event_loop(workflow, corpus: dict, sessions: int, args) -> Level:
+    level = Level()
+    deadline = time.perf_counter() + args.duration
+
+    async def session(number: int):
+        for conversation in conversations(corpus, number, args.turns):
+            for entry in conversation:
+                if time.perf_counter() >= deadline:
+                    return
+                start = time.perf_counter()
+                try:
+                    await arun_turn(workflow, entry)
+                    level.record(time.perf_counter() - start)
+                except Exception as e:
+                    level.fail(e)
+                await asyncio.sleep(args.think_ms / 1000)
+            level.finish_conversation()
+
+    await asyncio.gather(*(session(number) for number in range(sessions)))
+    return level
+
+
+def summarize(sessions: int, level: Level, elapsed: float, memory: MemorySampler, checkpoint_bytes: int) -> dict:
+    turns = len(level.latencies)
+    failed = sum(level.errors.values())
+    return {
+        "sessions": sessions,
+        "turns": turns,
+        "conversations": level.conversations,
+        "throughput_per_s": turns / elapsed,
+        **{f"p{q}_ms": 1000 * percentile(level.latencies, q) if turns else None for q in PERCENTILES},
+        "error_rate": failed / (turns + failed) if turns + failed else 0.0,
+        "errors": level.errors,
+        "memory": "tracemalloc" if memory.traced else "rss",
+        "peak_memory_per_session_kb": max(0, memory.peak - memory.baseline) / 1024 / sessions,
+        "retained_memory_per_session_kb": max(0, memory.retained - memory.baseline) / 1024 / sessions,
+        "peak_memory_mb": memory.peak / 1024 / 1024,
+        "checkpoint_bytes_per_turn": checkpoint_bytes / turns if turns else 0.0,
+    }
+
+
+def print_report(results: dict):
+    print(f"{results['mode']}, {results['config']['duration_s']:.0f}s per level, {results['config']['turns']} turns "
+          f"per conversation, think time {results['config']['think_ms']:.0f}ms, LLM "
+          f"{results['config']['llm_latency_ms']:.0f}ms, commit {results['commit'] or '?'}")
+    print(f"{'sessions':>8} {'turns/s':>9} {'scaling':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'peak KB/s':>10} {'held KB/s':>10} {'ckpt B/turn':>12} {'peak mem':>9}")
+    base = results["levels"][0]
+    for level in results["levels"]:
+        # Throughput relative to perfect linear scaling from the first level
+        ideal = base["throughput_per_s"] / base["sessions"] * level["sessions"]
+        latency = "".join(f"{level[f'p{q}_ms']:>10.0f}" if level[f"p{q}_ms"] is not None else f"{'-':>10}"
+                          for q in PERCENTILES)
+        print(f"{level['sessions']:>8} {level['throughput_per_s']:>9.1f} "
+              f"{level['throughput_per_s'] / ideal if ideal else 0.0:>8.0%}{latency} {level['error_rate']:>7.1%} "
+              f"{level['peak_memory_per_session_kb']:>10.0f} {level['retained_memory_per_session_kb']:>10.0f} "
+              f"{level['checkpoint_bytes_per_turn']:>12.0f} {level['peak_memory_mb']:>7.0f}MB")
+        for name, count in sorted(level["errors"].items()):
+            print(f"{'':>8} {count} x {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--mode", choices=("threads", "async"), default="async",
+                        help="Sessions as threads on the sync graph, or tasks on one event loop with the async graph")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16, 64],
+                        help="Concurrency levels, run in order")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per conversation")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause between a session's turns")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="MongoDB and vector index round trip")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    levels = []
+    # The index writer reports on stdout; keep the report readable.
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            install_standins(args.catalog, directory, args.llm_latency_ms, args.embed_latency_ms, args.rtt_ms)
+        install_scripted_models(corpus, args.llm_latency_ms)
+        # No background compaction, so the checkpoint growth of a level is what its turns wrote
+        checkpointer = SQLiteCheckpointer(os.path.join(directory, "checkpoints.sqlite"), compact_interval=0)
+        checkpointer_module._checkpointer = checkpointer
+        async_mode = args.mode == "async"
+        workflow = make_agent_workflow(warm_up=not async_mode, async_mode=async_mode)
+        # One pass over the corpus first, so the first level's memory is not the imports and warm caches
+        for entry in corpus["queries"]:
+            if async_mode:
+                asyncio.run(arun_turn(workflow, entry))
+            else:
+                run_turn(workflow, entry)
+        for sessions in args.sessions:
+            stored = checkpointer.stats()["bytes"]
+            with MemorySampler() as memory:
+                start = time.perf_counter()
+                if async_mode:
+                    level = asyncio.run(run_event_loop(workflow, corpus, sessions, args))
+                else:
+                    level = run_threads(workflow, corpus, sessions, args)
+                elapsed = time.perf_counter() - start
+            levels.append(summarize(sessions, level, elapsed, memory, checkpointer.stats()["bytes"] - stored))
+        checkpointer.close()
+
+    results = {
+        "benchmark": "load_test",
+        "corpus_version": corpus["version"],
+        "commit": git_commit(),
+        "mode": args.mode,
+        "config": {"duration_s": args.duration, "turns": args.turns, "think_ms": args.think_ms,
+                   "llm_latency_ms": args.llm_latency_ms, "embed_latency_ms": args.embed_latency_ms,
+                   "rtt_ms": args.rtt_ms},
+        "levels": levels,
+    }
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measure how much of the MongoDB query workload the local query compiler covers.
+
+Every query the compiler handles skips one gpt-4 query-generation call. The LLM
+latency is either given (--llm-latency-ms) or measured on a sample of the
+workload with --live, which needs OPENAI_API_KEY.
+
+Usage:
+    python -m benchmarks.query_compiler
+    python -m benchmarks.query_compiler --log ./data/routing_log.jsonl --live 5
+"""
+import argparse
+import statistics
+import time
+
+from scripts.query_compiler import QueryCompiler
+from scripts.router import load_routing_log
+
+# Queries in the style of the examples in the routing and query-generation prompts.
+WORKLOAD = [
+    "Find mozzarella under $50",
+    "Show me the most expensive cheese",
+    "What cheese does Galbani make?",
+    "cheese by Galbani out of stock in Specialty Cheese department",
+    "how many brands are there?",
+    "how many cheeses are in the stock?",
+    "how many brands have cheese under $10?",
+    "all cheese products out of stock",
+    "most expensive cheese",
+    "all mozzarella cheeses under $50 in the stock",
+    "all goat cheeses",
+    "all Sliced Cheeses",
+    "average price by brand",
+    "list all brands",
+    "total weight of all cheeses",
+    "cheapest cheddar",
+    "top 5 most popular cheeses",
+    "feta under $3 per lb",
+    "cheese between $20 and $40",
+    "Philadelphia cream cheese in stock",
+    "how many cheeses per department",
+    "shredded cheese under $30",
+    "What does Tillamook sell?",
+    "provolone slices over $25",
+    "show me Belgioioso cheeses",
+    "cheapest cheese in the Cheese Loaf department",
+    "Which brands make parmesan?",
+    "sharp cheddar for burgers under $40",
+    "mozzarella or provolone under $20",
+    "cheese with the best price per pound",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="Routing log; its MongoDB-routed queries are added to the workload")
+    parser.add_argument("--llm-latency-ms", type=float, default=2500.0,
+                        help="Assumed latency of one query-generation call")
+    parser.add_argument("--live", type=int, default=0, help="Measure the LLM latency on this many queries")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    workload = list(WORKLOAD)
+    if args.log:
+        workload += [query for query, tool in load_routing_log(args.log) if tool == "mongoDB_retrieval"]
+
+    compiler = QueryCompiler()
+    compiled = {query: compiler.compile(query) for query in workload}
+    covered = [query for query, result in compiled.items() if result is not None]
+
+    timings = []
+    for _ in range(args.repeat):
+        for query in workload:
+            start = time.perf_counter()
+            compiler.compile(query)
+            timings.append((time.perf_counter() - start) * 1000.0)
+
+    llm_ms = args.llm_latency_ms
+    if args.live:
+        from scripts.chains import get_chain
+        import scripts.nodes.MongoDBretrievalNode  # noqa: F401  registers the "mongo_query" chain
+        chain = get_chain("mongo_query")
+        samples = []
+        for query in workload[:args.live]:
+            start = time.perf_counter()
+            chain.invoke({"message": query})
+            samples.append((time.perf_counter() - start) * 1000.0)
+        llm_ms = statistics.median(samples)
+
+    coverage = len(covered) / len(workload)
+    saved_ms = len(covered) * (llm_ms - statistics.fmean(timings))
+    print(f"Workload: {len(workload)} queries")
+    print(f"Compiled locally: {len(covered)} ({coverage:.0%}); LLM fallback: {len(workload) - len(covered)}")
+    print(f"Compile time: p50 {statistics.median(timings):.3f} ms, max {max(timings):.3f} ms")
+    print(f"LLM query generation: {llm_ms:.0f} ms per call ({'measured' if args.live else 'assumed'})")
+    print(f"Latency saved: {saved_ms / 1000.0:.1f}s over the workload, "
+          f"{coverage * llm_ms:.0f} ms per query on average")
+    print("\nFallback queries:")
+    for query, result in compiled.items():
+        if result is None:
+            print(f"  {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Deterministic local stand-ins for the remote services used by the agent.
+
+They let the benchmarks run without OpenAI, MongoDB or Pinecone credentials.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from operator import ge, gt, le, lt
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+from scripts.vector_store import QueryResult
+
+_ABSENT = object()
+_COMPARISONS = {"$gt": gt, "$gte": ge, "$lt": lt, "$lte": le}
+
+
+class RemoteIndexStandIn:
+    """Wraps a local index and adds a simulated network round trip per query,
+    approximating a remote Pinecone index."""
+
+    def __init__(self, index, rtt_ms: float = 25.0, jitter_ms: float = 5.0, seed: int = 0):
+        self.index = index
+        self.rtt_ms = rtt_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+    def _delay_s(self) -> float:
+        return max(0.0, self.rtt_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def query(self, vector, top_k: int = 5, include_metadata: bool = True, **kwargs) -> QueryResult:
+        time.sleep(self._delay_s())
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
+
+
+class AsyncRemoteIndexStandIn(RemoteIndexStandIn):
+    """RemoteIndexStandIn with an awaitable query(), like Pinecone's async index."""
+
+    async def query(self, vector, top_k: int = 5, include_metadata: bool = True, **kwargs) -> QueryResult:
+        await asyncio.sleep(self._delay_s())
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata)
+
+
+class LatencyStandIn:
+    """Simulated service latency: time.sleep for sync callers, asyncio.sleep for async ones."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+    def _delay_s(self) -> float:
+        return max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def wait(self):
+        time.sleep(self._delay_s())
+
+    async def await_(self):
+        await asyncio.sleep(self._delay_s())
+
+
+def fake_chain(respond, latency: LatencyStandIn) -> RunnableLambda:
+    """A chain stand-in that returns respond(inputs) after the simulated model latency,
+    blocking under invoke and awaiting under ainvoke."""
+    def call(inputs):
+        latency.wait()
+        return respond(inputs)
+
+    async def acall(inputs):
+        await latency.await_()
+        return respond(inputs)
+
+    return RunnableLambda(call, afunc=acall)
+
+
+def fake_embedding(text: str, dimension: int = 64):
+    """Deterministic unit vector for a text, standing in for an embedding model."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _matches_condition(value, condition) -> bool:
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$options":
+                continue
+            if operator == "$regex":
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                values = value if isinstance(value, list) else [value]
+                if not any(isinstance(item, str) and re.search(operand, item, flags) for item in values):
+                    return False
+            elif operator == "$exists":
+                if (value is not _ABSENT) != bool(operand):
+                    return False
+            elif operator == "$in":
+                values = value if isinstance(value, list) else [value]
+                if not any(item in operand for item in values):
+                    return False
+            elif operator == "$nin":
+                values = value if isinstance(value, list) else [value]
+                if any(item in operand for item in values):
+                    return False
+            elif operator == "$all":
+                if not isinstance(value, list) or not all(item in value for item in operand):
+                    return False
+            elif operator == "$ne":
+                if value == operand:
+                    return False
+            elif operator == "$eq":
+                if not _matches_condition(value, operand):
+                    return False
+            elif operator in _COMPARISONS:
+                if value is _ABSENT or value is None or not _COMPARISONS[operator](value, operand):
+                    return False
+            else:
+                raise NotImplementedError(f"Operator {operator} is not supported by the in-memory collection")
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def _matches(document, filter_conditions) -> bool:
+    for field, condition in (filter_conditions or {}).items():
+        if field == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif field == "$nor":
+            if any(_matches(document, clause) for clause in condition):
+                return False
+        elif not _matches_condition(document.get(field, _ABSENT), condition):
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return dict(document)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {field: document[field] for field in included if field in document}
+        if projection.get("_id", 1) and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+    return {field: value for field, value in document.items() if projection.get(field, 1)}
+
+
+def _sorted(documents, sort):
+    # Stable sorts from the last key to the first; missing values sort lowest, as in MongoDB.
+    for field, direction in reversed(list(sort)):
+        present = [document for document in documents if document.get(field) is not None]
+        missing = [document for document in documents if document.get(field) is None]
+        present.sort(key=lambda document: document[field], reverse=direction < 0)
+        documents = missing + present if direction > 0 else present + missing
+    return documents
+
+
+class _Cursor:
+    def __init__(self, documents, projection=None):
+        self._documents = documents
+        self._projection = projection
+        self._sort = None
+        self._limit = 0
+
+    def sort(self, keys, direction=None):
+        self._sort = [(keys, direction)] if isinstance(keys, str) else list(keys)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def __iter__(self):
+        documents = self._documents
+        if self._sort:
+            documents = _sorted(documents, self._sort)
+        if self._limit:
+            documents = documents[:self._limit]
+        return iter([_project(document, self._projection) for document in documents])
+
+
+class InMemoryCollection:
+    """A small pymongo Collection stand-in over a list of documents.
+
+    Supports the filters, projections, sorts and aggregation stages the query
+    compiler and the retrieval node use, with an optional simulated round trip.
+    """
+
+    def __init__(self, documents, name: str = "products", rtt_ms: float = 0.0):
+        self._documents = [dict(document) for document in documents]
+        self.name = name
+        self.full_name = f"benchmark.{name}"
+        self.rtt_ms = rtt_ms
+
+    def _round_trip(self):
+        if self.rtt_ms:
+            time.sleep(self.rtt_ms / 1000.0)
+
+    def find(self, filter_conditions=None, projection=None):
+        self._round_trip()
+        return self._find(filter_conditions, projection)
+
+    def find_one(self, filter_conditions=None, projection=None):
+        return next(iter(self.find(filter_conditions, projection)), None)
+
+    def count_documents(self, filter_conditions, limit: int = 0):
+        self._round_trip()
+        return self._count(filter_conditions, limit)
+
+    def aggregate(self, pipeline):
+        self._round_trip()
+        return iter(self._aggregate(pipeline))
+
+    def distinct(self, key, filter_conditions=None):
+        self._round_trip()
+        return self._distinct(key, filter_conditions)
+
+    def _find(self, filter_conditions, projection):
+        return _Cursor([document for document in self._documents if _matches(document, filter_conditions)],
+                       projection)
+
+    def _distinct(self, key, filter_conditions):
+        values = []
+        for document in self._documents:
+            if key in document and _matches(document, filter_conditions):
+                value = document[key]
+                values.extend(value if isinstance(value, list) else [value])
+        return list(dict.fromkeys(values))
+
+    def _count(self, filter_conditions, limit: int = 0):
+        count = sum(1 for document in self._documents if _matches(document, filter_conditions))
+        return min(count, limit) if limit else count
+
+    def _aggregate(self, pipeline):
+        documents = [dict(document) for document in self._documents]
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if _matches(document, spec)]
+            elif operator == "$sort":
+                documents = _sorted(documents, spec.items())
+            elif operator == "$limit":
+                documents = documents[:spec]
+            elif operator == "$count":
+                documents = [{spec: len(documents)}] if documents else []
+            elif operator == "$group":
+                documents = self._group(documents, spec)
+            elif operator == "$project":
+                documents = [_project(document, spec) for document in documents]
+            else:
+                raise NotImplementedError(f"Stage {operator} is not supported by the in-memory collection")
+        return documents
+
+    @staticmethod
+    def _group(documents, spec):
+        def value(document, expression):
+            return document.get(expression[1:]) if isinstance(expression, str) and expression.startswith("$") \
+                else expression
+
+        groups = {}
+        for document in documents:
+            groups.setdefault(value(document, spec["_id"]), []).append(document)
+        results = []
+        for key, members in groups.items():
+            result = {"_id": key}
+            for field, accumulator in spec.items():
+                if field == "_id":
+                    continue
+                (operator, expression), = accumulator.items()
+                values = [value(member, expression) for member in members]
+                numbers = [item for item in values if isinstance(item, (int, float))]
+                if operator == "$sum":
+                    result[field] = sum(numbers)
+                elif operator == "$avg":
+                    result[field] = sum(numbers) / len(numbers) if numbers else None
+                elif operator == "$max":
+                    result[field] = max(numbers) if numbers else None
+                elif operator == "$min":
+                    result[field] = min(numbers) if numbers else None
+                else:
+                    raise NotImplementedError(f"Accumulator {operator} is not supported by the in-memory collection")
+            results.append(result)
+        return results
+
+
+class _AsyncResults:
+    def __init__(self, owner, documents):
+        self._owner = owner
+        self._documents = documents
+
+    def sort(self, keys, direction=None):
+        self._documents.sort(keys, direction)
+        return self
+
+    def limit(self, limit):
+        self._documents.limit(limit)
+        return self
+
+    async def to_list(self, length=None):
+        await self._owner._round_trip()
+        documents = list(self._documents)
+        return documents[:length] if length else documents
+
+
+class AsyncInMemoryCollection:
+    """pymongo AsyncCollection-style view over an InMemoryCollection; the round trip is awaited."""
+
+    def __init__(self, collection: InMemoryCollection):
+        self._collection = collection
+        self.name = collection.name
+        self.full_name = collection.full_name
+
+    async def _round_trip(self):
+        if self._collection.rtt_ms:
+            await asyncio.sleep(self._collection.rtt_ms / 1000.0)
+
+    def find(self, filter_conditions=None, projection=None):
+        return _AsyncResults(self, self._collection._find(filter_conditions, projection))
+
+    async def find_one(self, filter_conditions=None, projection=None):
+        documents = await self.find(filter_conditions, projection).limit(1).to_list()
+        return documents[0] if documents else None
+
+    async def count_documents(self, filter_conditions, limit: int = 0):
+        await self._round_trip()
+        return self._collection._count(filter_conditions, limit)
+
+    async def aggregate(self, pipeline):
+        return _AsyncResults(self, self._collection._aggregate(pipeline))
+
+    async def distinct(self, key, filter_conditions=None):
+        await self._round_trip()
+        return self._collection._distinct(key, filter_conditions)
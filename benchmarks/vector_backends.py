@@ -0,0 +1,78 @@
+"""Benchmark the in-process NumPy vector index against the remote query path.
+
+The remote path is simulated with RemoteIndexStandIn (same scoring plus a
+configurable round trip), so no Pinecone account is needed.
+
+Usage:
+    python -m benchmarks.vector_backends --sizes 100 10000 50000 --rtt-ms 25
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.standins import RemoteIndexStandIn
+from scripts.vector_store import LocalVectorIndex, build_product_metadata, write_local_index
+
+
+def load_catalog(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_index(directory: str, catalog, size: int, dimension: int, rng):
+    """Write a synthetic index of `size` rows, cycling through the fixture metadata."""
+    ids = [f"product_{i}" for i in range(size)]
+    metadata_list = [build_product_metadata(catalog[i % len(catalog)]) for i in range(size)]
+    embeddings = rng.standard_normal((size, dimension), dtype=np.float32)
+    path = os.path.join(directory, f"index_{size}")
+    write_local_index(path, ids, embeddings, metadata_list)
+    return LocalVectorIndex(path)
+
+
+def time_queries(index, queries, top_k: int):
+    latencies = []
+    for vector in queries:
+        start = time.perf_counter()
+        index.query(vector=vector, top_k=top_k, include_metadata=True)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "mean_ms": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default="./fixture/products.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 50000])
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=25.0, help="Simulated remote round trip")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    catalog = load_catalog(args.catalog)
+    queries = rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+    remote_queries = queries[: max(1, args.queries // 10)]
+
+    print(f"{'size':>8} {'backend':>8} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            local = build_index(directory, catalog, size, args.dimension, rng)
+            remote = RemoteIndexStandIn(local, rtt_ms=args.rtt_ms)
+            for name, index, vectors in (("local", local, queries), ("remote", remote, remote_queries)):
+                stats = time_queries(index, vectors, args.top_k)
+                print(f"{size:>8} {name:>8} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['mean_ms']:>10.3f}")
+            del local
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,9 @@
 from typing import Literal
 from langchain_core.messages import HumanMessage
 from langchain_openai.chat_models import ChatOpenAI
-from langchain_community.document_loaders import UnstructuredURLLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
 from langchain_openai.embeddings import OpenAIEmbeddings
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph, MessagesState
 from langgraph.prebuilt import ToolNode
 from langchain.prompts import PromptTemplate
@@ -14,34 +11,83 @@ from pydantic import BaseModel, Field
 from typing import List, TypedDict, Optional
 from dotenv import load_dotenv
 import os
-from pinecone import Pinecone
 import json
-from openai import OpenAI
-from pymongo import MongoClient
 from langchain.output_parsers import PydanticOutputParser
 from langgraph.types import Command, interrupt
 
 
 from scripts.schema import PlanExecute
 from scripts.nodes.human_in_the_loopNode import human_in_the_loopNode
-from scripts.nodes.reasoningNode import reasoningNode
-from scripts.nodes.MongoDBretrievalNode import MongoDBretrievalNode
-from scripts.nodes.pineconeretrievalNode import pineconeretrievalNode
-from scripts.nodes.answerNode import answerNode
+from scripts.nodes.reasoningNode import reasoningNode, reasoningNodeAsync
+from scripts.nodes.MongoDBretrievalNode import MongoDBretrievalNode, MongoDBretrievalNodeAsync
+from scripts.nodes.pineconeretrievalNode import pineconeretrievalNode, pineconeretrievalNodeAsync
+from scripts.nodes.answerNode import answerNode, answerNodeAsync
 from scripts.conditional_edges.retrieve_or_answer import retrieve_or_answer
 from scripts.conditional_edges.retry_or_end import retry_or_end
-from scripts.nodes.combinedSearchNode import combinedSearchNode
+from scripts.nodes.combinedSearchNode import combinedSearchNode, combinedSearchNodeAsync
+from scripts.nodes.answerCacheNode import answerCacheNode, answerCacheNodeAsync
+from scripts.nodes.cacheStoreNode import cacheStoreNode, cacheStoreNodeAsync
+from scripts.nodes.bestAnswerNode import bestAnswerNode
+from scripts.conditional_edges.cached_or_reason import cached_or_reason
+from scripts.chains import warm_up_chains
+from scripts.checkpointer import get_checkpointer
+from scripts.tracing import traced_node
+
+def make_agent_workflow(warm_up: bool = True, async_mode: bool = False):
+    """Build and compile the agent graph.
+    Args:
+        warm_up: Build every registered prompt/LLM chain up front so the first
+            request does not pay the construction cost.
+        async_mode: Use the async nodes, which await every LLM, Mongo, embedding and
+            vector call. Run the result with ainvoke/astream so one event loop can
+            serve many conversations at once.
+    Returns:
+        The compiled workflow.
+    """
+    if warm_up:
+        warm_up_chains()
+
+    # The conditional edges only read the state, so both graphs share them;
+    # human_in_the_loop and best_answer do no I/O and are shared as well.
+    if async_mode:
+        nodes = {
+            "reasoning": reasoningNodeAsync,
+            "MongoDB_retrieval": MongoDBretrievalNodeAsync,
+            "pinecone_retrieval": pineconeretrievalNodeAsync,
+            "answer": answerNodeAsync,
+            "combined_search": combinedSearchNodeAsync,
+            "answer_cache": answerCacheNodeAsync,
+            "cache_store": cacheStoreNodeAsync,
+        }
+    else:
+        nodes = {
+            "reasoning": reasoningNode,
+            "MongoDB_retrieval": MongoDBretrievalNode,
+            "pinecone_retrieval": pineconeretrievalNode,
+            "answer": answerNode,
+            "combined_search": combinedSearchNode,
+            "answer_cache": answerCacheNode,
+            "cache_store": cacheStoreNode,
+        }
+
+    nodes["human_in_the_loop"] = human_in_the_loopNode
+    nodes["best_answer"] = bestAnswerNode
 
-def make_agent_workflow():
     agent_workflow = StateGraph(PlanExecute)
-    agent_workflow.add_node("reasoning", reasoningNode)
-    agent_workflow.add_node("MongoDB_retrieval", MongoDBretrievalNode)
-    agent_workflow.add_node("pinecone_retrieval", pineconeretrievalNode)
-    agent_workflow.add_node("answer", answerNode)
-    agent_workflow.add_node("human_in_the_loop", human_in_the_loopNode)
-    agent_workflow.add_node("combined_search", combinedSearchNode)
+    # Every node runs inside a tracing span (scripts/tracing.py)
+    for name in ("reasoning", "MongoDB_retrieval", "pinecone_retrieval", "answer", "human_in_the_loop",
+                 "combined_search", "answer_cache", "cache_store", "best_answer"):
+        agent_workflow.add_node(name, traced_node(name, nodes[name]))
 
-    agent_workflow.add_edge(START, "reasoning")
+    agent_workflow.add_edge(START, "answer_cache")
+    agent_workflow.add_conditional_edges(
+        "answer_cache",
+        cached_or_reason,
+        {
+            "cache_hit": END,
+            "cache_miss": "reasoning"
+        },
+    )
     agent_workflow.add_conditional_edges(
         "reasoning",
         retrieve_or_answer,
@@ -50,7 +96,8 @@ def make_agent_workflow():
             "chosen_tool_is_pinecone_retrieval": "pinecone_retrieval",
             "chosen_tool_is_human_in_the_loop": "human_in_the_loop",
             "chosen_tool_is_answer": "answer",
-            "chosen_tool_is_combined_search": "combined_search"
+            "chosen_tool_is_combined_search": "combined_search",
+            "chosen_tool_is_fast_reply": END
         },
     )
 
@@ -64,13 +111,17 @@ def make_agent_workflow():
         retry_or_end,
         {
             "retry_reasoning": "reasoning",
-            "end_workflow": END
+            "end_workflow": "cache_store",
+            # Answers graded POOR are not cached
+            "return_best_answer": "best_answer"
         }
     )
-    agent_workflow.add_edge("combined_search", "MongoDB_retrieval")
-    agent_workflow.add_edge("combined_search", "pinecone_retrieval")
+    agent_workflow.add_edge("cache_store", END)
+    agent_workflow.add_edge("best_answer", END)
+    agent_workflow.add_edge("combined_search", "answer")
 
-    checkpointer = MemorySaver()
+    # Durable and bounded (see scripts/checkpointer.py); shared by every graph in the process
+    checkpointer = get_checkpointer()
 
     workflow = agent_workflow.compile(checkpointer=checkpointer)
     return workflow
@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Awaitable, Callable, FrozenSet, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from scripts.catalog import DEPARTMENTS, load_brands
+from scripts.embeddings import aembed_query, embed_query
+
+load_dotenv()
+
+# ----- Configuration -----
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a user query: lowercase, single-spaced, prices written as $N."""
+    text = query.lower().strip()
+    text = re.sub(r"\$\s*(\d+(?:\.\d+)?)", r"$\1", text)
+    text = re.sub(r"(\d+(?:\.\d+)?)\s*(?:dollars?|usd|bucks)\b", r"$\1", text)
+    text = re.sub(r"[^\w$.\s]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .")
+
+
+_NUMBER = re.compile(r"\$?\d+(?:\.\d+)?")
+
+
+def _number_term(text: str) -> str:
+    """A number as a key term, with or without a currency sign: "$50", "50" and "50.00" are all "50"."""
+    value = float(text.lstrip("$"))
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    reasoning_chain: List[str]
+    catalog_version: str
+    latency_s: float
+    expires_at: float
+    similarity: float = 1.0
+    vector: Optional[np.ndarray] = field(default=None, repr=False)
+    key_terms: FrozenSet[str] = frozenset()
+
+
+class SemanticAnswerCache:
+    """Caches final answers by query meaning.
+
+    A lookup first tries the exact normalized query, then the cosine similarity of
+    its embedding against every live entry. A semantic match also needs the same
+    numbers (prices, counts) and the same brand and department names, which the
+    embedding barely tells apart: "mozzarella under $20" must not get the answer
+    for "mozzarella under $50". Entries expire after a TTL and only match requests
+    made against the same catalog version, so price and stock changes invalidate them.
+    """
+
+    def __init__(self, embed: Callable[[str], List[float]], threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE,
+                 aembed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 terms: Optional[List[str]] = None):
+        """
+        Args:
+            embed: Embeds a normalized query.
+            aembed: Async embed, used by alookup and astore.
+            terms: Brand and department names a semantic hit must agree on.
+            threshold: Minimum cosine similarity for a semantic hit.
+            ttl: Seconds an answer stays valid.
+            max_entries: Oldest entries are evicted beyond this size.
+        """
+        self.embed = embed
+        self.aembed = aembed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        names = sorted({normalize_query(term) for term in terms or [] if normalize_query(term)}, key=len, reverse=True)
+        self._terms = re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b") if names else None
+        self._entries: List[CachedAnswer] = []
+        self._matrix = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_s = 0.0
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _prune(self, catalog_version: str):
+        now = time.monotonic()
+        live = [entry for entry in self._entries
+                if entry.expires_at > now and entry.catalog_version == catalog_version]
+        if len(live) != len(self._entries):
+            self._entries = live
+            self._matrix = None
+
+    def _exact(self, normalized: str, catalog_version: str) -> Optional[CachedAnswer]:
+        with self._lock:
+            self._prune(catalog_version)
+            return next((entry for entry in self._entries if entry.query == normalized), None)
+
+    def _key_terms(self, normalized: str) -> FrozenSet[str]:
+        """Numbers and brand/department names of a normalized query."""
+        terms = {_number_term(number) for number in _NUMBER.findall(normalized)}
+        if self._terms is not None:
+            terms.update(self._terms.findall(normalized))
+        return frozenset(terms)
+
+    def _nearest(self, normalized: str, vector: np.ndarray) -> Optional[CachedAnswer]:
+        key_terms = self._key_terms(normalized)
+        best = None
+        with self._lock:
+            if self._matrix is None and self._entries:
+                self._matrix = np.stack([entry.vector for entry in self._entries])
+            if self._matrix is not None and self._matrix.shape[1] == vector.shape[0]:
+                scores = self._matrix @ vector
+                # Most similar first; the first above the threshold with the same key terms is the hit
+                for i in np.argsort(-scores):
+                    if scores[i] < self.threshold:
+                        break
+                    if self._entries[i].key_terms == key_terms:
+                        best = (self._entries[i], float(scores[i]))
+                        break
+        if best is None:
+            return self._record_miss()
+        return self._record_hit(*best)
+
+    def lookup(self, query: str, catalog_version: str) -> Optional[CachedAnswer]:
+        """Return a cached answer for a query with the same meaning, or None."""
+        normalized = normalize_query(query)
+        exact = self._exact(normalized, catalog_version)
+        if exact is not None:
+            return self._record_hit(exact, 1.0)
+        if not self._entries:
+            return self._record_miss()
+        return self._nearest(normalized, self._unit(self.embed(normalized)))
+
+    async def alookup(self, query: str, catalog_version: str) -> Optional[CachedAnswer]:
+        """Async lookup(): the query embedding is awaited."""
+        normalized = normalize_query(query)
+        exact = self._exact(normalized, catalog_version)
+        if exact is not None:
+            return self._record_hit(exact, 1.0)
+        if not self._entries:
+            return self._record_miss()
+        return self._nearest(normalized, self._unit(await self.aembed(normalized)))
+
+    def _record_hit(self, entry: CachedAnswer, similarity: float) -> CachedAnswer:
+        with self._lock:
+            self.hits += 1
+            self.saved_latency_s += entry.latency_s
+        return replace(entry, similarity=similarity)
+
+    def _record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _add(self, normalized: str, answer: str, reasoning_chain: List[str], catalog_version: str,
+             latency_s: float, vector: np.ndarray):
+        entry = CachedAnswer(
+            query=normalized,
+            answer=answer,
+            reasoning_chain=list(reasoning_chain),
+            catalog_version=catalog_version,
+            latency_s=latency_s,
+            expires_at=time.monotonic() + self.ttl,
+            vector=vector,
+            key_terms=self._key_terms(normalized),
+        )
+        with self._lock:
+            self._entries = [existing for existing in self._entries if existing.query != normalized]
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+            self._matrix = None
+
+    def store(self, query: str, answer: str, reasoning_chain: List[str], catalog_version: str, latency_s: float):
+        """Remember the final answer for a query."""
+        normalized = normalize_query(query)
+        self._add(normalized, answer, reasoning_chain, catalog_version, latency_s,
+                  self._unit(self.embed(normalized)))
+
+    async def astore(self, query: str, answer: str, reasoning_chain: List[str], catalog_version: str,
+                     latency_s: float):
+        """Async store(): the query embedding is awaited."""
+        normalized = normalize_query(query)
+        self._add(normalized, answer, reasoning_chain, catalog_version, latency_s,
+                  self._unit(await self.aembed(normalized)))
+
+    def discard(self, query: str):
+        """Forget the answer stored for a query, e.g. once it was graded POOR."""
+        normalized = normalize_query(query)
+        with self._lock:
+            self._entries = [entry for entry in self._entries if entry.query != normalized]
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_latency_s": self.saved_latency_s,
+                "entries": len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Process-wide semantic answer cache, embedding through the shared embedding cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache(embed=embed_query, aembed=aembed_query,
+                                             terms=load_brands() + DEPARTMENTS)
+    return _cache
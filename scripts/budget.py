@@ -0,0 +1,66 @@
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from scripts.tokens import estimate_tokens
+
+load_dotenv()
+
+# ----- Configuration -----
+# Per-request limits on the reasoning -> retrieval -> answer retry loop. When one runs out
+# after a POOR answer, the best answer so far is returned instead of retrying.
+MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "3"))
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "60"))
+REQUEST_TOKEN_BUDGET = int(os.getenv("REQUEST_TOKEN_BUDGET", "40000"))
+# Context kept from earlier attempts for the retries.
+AGGREGATED_CONTEXT_TOKENS = int(os.getenv("AGGREGATED_CONTEXT_TOKENS", "4000"))
+
+_SEPARATOR = "\n---\n"
+
+
+def budget_exhausted(state) -> Optional[str]:
+    """What ran out for this request (attempts, time or tokens), or None while there is budget left."""
+    if state.get("iterations", 0) >= MAX_ITERATIONS:
+        return f"{MAX_ITERATIONS} attempts"
+    if state.get("started_at") and time.time() - state["started_at"] >= REQUEST_DEADLINE_S:
+        return f"the {REQUEST_DEADLINE_S:.0f}s deadline"
+    if state.get("tokens_used", 0) >= REQUEST_TOKEN_BUDGET:
+        return f"the {REQUEST_TOKEN_BUDGET} token budget"
+    return None
+
+
+def charge_tokens(state, *texts) -> dict:
+    """The state update adding the estimated tokens of LLM prompts and outputs to the request's usage."""
+    return {"tokens_used": state.get("tokens_used", 0) + sum(estimate_tokens(str(text)) for text in texts)}
+
+
+def accumulate_context(aggregated: str, context: str) -> str:
+    """Add a retrieved context to the context of earlier attempts, dropping repeats and,
+    past AGGREGATED_CONTEXT_TOKENS, the oldest blocks."""
+    blocks = [block for block in (aggregated or "").split(_SEPARATOR) if block]
+    if context and context not in blocks:
+        blocks.append(context)
+    while len(blocks) > 1 and estimate_tokens(_SEPARATOR.join(blocks)) > AGGREGATED_CONTEXT_TOKENS:
+        blocks.pop(0)
+    return _SEPARATOR.join(blocks)
+
+
+def answer_context(aggregated: str, context: str) -> str:
+    """The context for an answer: the latest retrieval, then what earlier attempts found."""
+    earlier = _SEPARATOR.join(block for block in (aggregated or "").split(_SEPARATOR) if block and block != context)
+    if not earlier:
+        return context
+    if not context:
+        return earlier
+    return f"{context}\n\nFrom earlier searches:\n{earlier}"
+
+
+def record_attempt(state, answer: str, score: int) -> dict:
+    """The state update counting an answer attempt and keeping it if it is the best so far
+    (ties go to the later attempt)."""
+    update = {"iterations": state.get("iterations", 0) + 1}
+    if score >= state.get("best_score", -1):
+        update.update(best_answer=answer, best_score=score)
+    return update
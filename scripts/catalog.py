@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local record of what was last written to the vector index, keyed by SKU.
+MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "./data/index_manifest.sqlite")
+# Product feed the serving process reads reference data (e.g. the brand list) from.
+CATALOG_PATH = os.getenv("CATALOG_PATH", "./fixture/products.json")
+
+# Departments the product feed files cheeses under.
+DEPARTMENTS = [
+    "Specialty Cheese",
+    "Sliced Cheese",
+    "Cream Cheese",
+    "Crumbled, Cubed, Grated, Shaved",
+    "Shredded Cheese",
+    "Cottage Cheese",
+    "Cheese Loaf",
+    "Cheese Wheel",
+]
+
+_READ_CHUNK_SIZE = 1 << 16
+# How long serving processes reuse the version read from the manifest before re-reading it.
+CATALOG_VERSION_REFRESH_S = float(os.getenv("CATALOG_VERSION_REFRESH_S", "30"))
+_version_memo = {"value": None, "read_at": 0.0}
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str) -> str:
+    """Hash of the text that gets embedded; a change means the vector must be regenerated."""
+    return _digest(text)
+
+
+def metadata_hash(metadata: Dict[str, Any]) -> str:
+    """Hash of the stored metadata; a change alone only needs a metadata update."""
+    return _digest(json.dumps(metadata, sort_keys=True, default=str))
+
+
+def iter_products(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream products from a JSON array, a single JSON object or a JSONL file.
+
+    JSON arrays are decoded element by element from a bounded read buffer, so the
+    whole feed is never held in memory.
+    """
+    if path.endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(_READ_CHUNK_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        fill()
+        skip_whitespace()
+        if position >= len(buffer):
+            return
+        if buffer[position] != "[":
+            # A single object: it has to be decoded in one piece.
+            yield json.loads(buffer[position:] + f.read())
+            return
+        position += 1
+
+        while True:
+            skip_whitespace()
+            if position >= len(buffer):
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+            if buffer[position] == "]":
+                return
+            if buffer[position] == ",":
+                position += 1
+                continue
+            try:
+                product, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # An element ending exactly at the buffer edge may be a truncated number.
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            position = end
+            yield product
+
+
+def load_brands(path: Optional[str] = None) -> List[str]:
+    """Distinct brand names in the product feed, longest first ([] if the feed is missing)."""
+    path = path or CATALOG_PATH
+    if not os.path.exists(path):
+        return []
+    brands = {product["brand"] for product in iter_products(path) if product.get("brand")}
+    return sorted(brands, key=lambda brand: (-len(brand), brand))
+
+
+class CatalogManifest:
+    """SQLite record of the content and metadata hash last synced for each SKU.
+
+    A sync run stages the new hashes of every product it sees and commits them
+    only once the index writes succeeded, so an interrupted run is simply
+    redone the next time. Lookups are per batch, so memory stays flat however
+    large the catalog.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " sku TEXT PRIMARY KEY,"
+            " content_hash TEXT,"
+            " metadata_hash TEXT,"
+            " staged_content_hash TEXT,"
+            " staged_metadata_hash TEXT,"
+            " seen INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);"
+        )
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM products WHERE content_hash IS NOT NULL LIMIT 1").fetchone() is None
+
+    @property
+    def catalog_version(self) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()
+        return row[0] if row else ""
+
+    def begin_run(self, full: bool = False):
+        """Start a sync run. A full run forgets every committed hash."""
+        if full:
+            self._conn.execute("DELETE FROM products")
+        self._conn.execute("UPDATE products SET seen = 0, staged_content_hash = NULL, staged_metadata_hash = NULL")
+        self._conn.commit()
+
+    def lookup(self, skus: Sequence[str]) -> Dict[str, Tuple[str, str]]:
+        """Committed (content_hash, metadata_hash) for the given SKUs that are known."""
+        found = {}
+        for start in range(0, len(skus), 500):
+            chunk = list(skus[start:start + 500])
+            rows = self._conn.execute(
+                f"SELECT sku, content_hash, metadata_hash FROM products WHERE sku IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for sku, content, metadata in rows:
+                if content is not None:
+                    found[sku] = (content, metadata)
+        return found
+
+    def stage(self, rows: Sequence[Tuple[str, str, str]]):
+        """Mark (sku, content_hash, metadata_hash) rows as seen in this run."""
+        self._conn.executemany(
+            "INSERT INTO products (sku, staged_content_hash, staged_metadata_hash, seen) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT(sku) DO UPDATE SET staged_content_hash = excluded.staged_content_hash, "
+            "staged_metadata_hash = excluded.staged_metadata_hash, seen = 1",
+            rows,
+        )
+        self._conn.commit()
+
+    def iter_unseen(self, batch_size: int = 1000) -> Iterator[List[str]]:
+        """Batches of committed SKUs that were not seen in this run, i.e. removed from the catalog."""
+        cursor = self._conn.execute("SELECT sku FROM products WHERE seen = 0 AND content_hash IS NOT NULL")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [sku for (sku,) in rows]
+
+    def commit_run(self) -> str:
+        """Promote the staged hashes, drop removed SKUs and refresh the catalog version."""
+        self._conn.execute("DELETE FROM products WHERE seen = 0")
+        self._conn.execute(
+            "UPDATE products SET content_hash = staged_content_hash, metadata_hash = staged_metadata_hash, "
+            "staged_content_hash = NULL, staged_metadata_hash = NULL")
+        digest = hashlib.sha256()
+        for sku, content, metadata in self._conn.execute(
+                "SELECT sku, content_hash, metadata_hash FROM products ORDER BY sku"):
+            digest.update(f"{sku}:{content}:{metadata}\n".encode("utf-8"))
+        version = digest.hexdigest()[:16]
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('catalog_version', ?)", (version,))
+        self._conn.commit()
+        return version
+
+    def close(self):
+        self._conn.close()
+
+
+def get_catalog_version(path: Optional[str] = None) -> str:
+    """Version tag of the catalog last loaded into the vector index ("" if never synced)."""
+    path = path or MANIFEST_PATH
+    if not os.path.exists(path):
+        return ""
+    manifest = CatalogManifest(path)
+    try:
+        return manifest.catalog_version
+    finally:
+        manifest.close()
+
+
+def current_catalog_version() -> str:
+    """Catalog version for cache invalidation in serving processes.
+
+    CATALOG_VERSION wins when set (e.g. by the deploy that ran the sync); otherwise the
+    manifest is re-read at most every CATALOG_VERSION_REFRESH_S seconds.
+    """
+    override = os.getenv("CATALOG_VERSION")
+    if override:
+        return override
+    now = time.monotonic()
+    if _version_memo["value"] is None or now - _version_memo["read_at"] > CATALOG_VERSION_REFRESH_S:
+        _version_memo["value"] = get_catalog_version()
+        _version_memo["read_at"] = now
+    return _version_memo["value"]
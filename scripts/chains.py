@@ -0,0 +1,50 @@
+import logging
+import threading
+from typing import Callable, Dict
+
+from langchain_core.runnables import Runnable
+
+from scripts.tracing import TracedChain
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_factories: Dict[str, Callable[[], Runnable]] = {}
+_chains: Dict[str, TracedChain] = {}
+
+
+def register_chain(name: str, factory: Callable[[], Runnable]):
+    """Register the factory that builds a named chain.
+    Args:
+        name: The registry key, e.g. "reasoning".
+        factory: Zero-argument callable returning the compiled chain.
+    """
+    with _lock:
+        _factories[name] = factory
+        _chains.pop(name, None)
+
+
+def get_chain(name: str) -> TracedChain:
+    """Return the compiled chain registered under name, building it once.
+    Its invoke/ainvoke calls are traced as LLM spans."""
+    chain = _chains.get(name)
+    if chain is None:
+        with _lock:
+            chain = _chains.get(name)
+            if chain is None:
+                chain = TracedChain(name, _factories[name]())
+                _chains[name] = chain
+    return chain
+
+
+def warm_up_chains():
+    """Build every registered chain so no request pays the construction cost."""
+    for name in list(_factories):
+        get_chain(name)
+    logger.info("Warmed up chains: %s", ", ".join(sorted(_chains)))
+
+
+def clear_chains():
+    """Drop the compiled chains; they are rebuilt on next use."""
+    with _lock:
+        _chains.clear()
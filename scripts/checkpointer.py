@@ -0,0 +1,525 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple, get_checkpoint_id,
+                                       get_checkpoint_metadata)
+from langgraph.checkpoint.memory import MemorySaver
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+# "sqlite" (durable, bounded, default) or "memory" (in-process MemorySaver, unbounded)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "./data/checkpoints.sqlite")
+# Threads untouched for this long are dropped
+CHECKPOINT_TTL_S = float(os.getenv("CHECKPOINT_TTL_S", "86400"))
+# Least recently updated threads are dropped while the stored checkpoints exceed this size
+CHECKPOINT_MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(256 * 1024 * 1024)))
+# Checkpoints kept per thread; resuming only needs the latest, the rest serve get_state_history
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "5"))
+# Seconds between background compactions (0 disables the background thread)
+CHECKPOINT_COMPACT_INTERVAL_S = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL_S", "300"))
+CHECKPOINT_COMPRESSION_LEVEL = int(os.getenv("CHECKPOINT_COMPRESSION_LEVEL", "6"))
+
+# Bumped when the tables change; older files are recreated, checkpoints being short-lived
+_SCHEMA_VERSION = 2
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    " thread_id TEXT NOT NULL,"
+    " checkpoint_ns TEXT NOT NULL DEFAULT '',"
+    " checkpoint_id TEXT NOT NULL,"
+    " parent_checkpoint_id TEXT,"
+    " type TEXT NOT NULL,"
+    " checkpoint BLOB NOT NULL,"
+    " metadata_type TEXT NOT NULL,"
+    " metadata BLOB NOT NULL,"
+    " channel_versions TEXT NOT NULL,"
+    " raw_size INTEGER NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    # One row per channel value; a checkpoint references the versions it was taken at
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    " thread_id TEXT NOT NULL,"
+    " checkpoint_ns TEXT NOT NULL DEFAULT '',"
+    " channel TEXT NOT NULL,"
+    " version TEXT NOT NULL,"
+    " type TEXT NOT NULL,"
+    " value BLOB NOT NULL,"
+    " raw_size INTEGER NOT NULL,"
+    " PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    " thread_id TEXT NOT NULL,"
+    " checkpoint_ns TEXT NOT NULL DEFAULT '',"
+    " checkpoint_id TEXT NOT NULL,"
+    " task_id TEXT NOT NULL,"
+    " idx INTEGER NOT NULL,"
+    " channel TEXT NOT NULL,"
+    " type TEXT NOT NULL,"
+    " value BLOB NOT NULL,"
+    " raw_size INTEGER NOT NULL,"
+    " task_path TEXT NOT NULL DEFAULT '',"
+    " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    "CREATE INDEX IF NOT EXISTS checkpoints_created_at ON checkpoints (thread_id, created_at)",
+    # Retrieved contexts behind the context_ref channels (scripts/context_store.py), by content hash
+    "CREATE TABLE IF NOT EXISTS contexts ("
+    " ref TEXT PRIMARY KEY,"
+    " value BLOB NOT NULL,"
+    " used_at REAL NOT NULL)",
+)
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """LangGraph checkpointer on a SQLite file, with compressed checkpoints and bounded growth.
+
+    Checkpoints are serialized with the graph's msgpack serializer and zlib-compressed when that
+    makes them smaller.
+    Channel values are stored once per version, so a step only writes the channels
+    its node returned. A background thread periodically drops expired threads, trims each thread to its
+    latest checkpoints, evicts the least recently updated threads over the size limit
+    and returns the freed pages to the file system.
+
+    It also keeps the retrieved contexts the checkpoints refer to, so a thread resumed after
+    a restart, or by another process on the same file, still has its context. Contexts
+    are dropped once unused for the thread TTL, and count toward the size limit. Reads
+    only note the time a context was used; compaction writes those times in one batch.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, ttl: Optional[float] = CHECKPOINT_TTL_S,
+                 max_bytes: Optional[int] = CHECKPOINT_MAX_BYTES, keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD,
+                 compact_interval: float = CHECKPOINT_COMPACT_INTERVAL_S,
+                 compression_level: int = CHECKPOINT_COMPRESSION_LEVEL):
+        """
+        Args:
+            path: SQLite file holding the checkpoints, or ":memory:".
+            ttl: Seconds a thread is kept after its last checkpoint, or None to keep threads until evicted.
+            max_bytes: Size limit of the stored checkpoints, writes and contexts, or None for no limit.
+            keep_per_thread: Latest checkpoints kept per thread by compaction.
+            compact_interval: Seconds between background compactions; 0 disables them.
+            compression_level: zlib level, 0 stores the serialized bytes uncompressed.
+        """
+        super().__init__()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.keep_per_thread = max(1, keep_per_thread)
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Only takes effect on a new file, before the first table is created
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Durable across process restarts; an OS crash may lose the last few commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self._write_latencies = deque(maxlen=1000)
+        self._touched_contexts = {}
+        self._touched_lock = threading.Lock()
+        self.evicted_threads = 0
+        self.trimmed_checkpoints = 0
+        self.last_compaction = None
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                               name="checkpoint_compaction", daemon=True)
+            self._compactor.start()
+
+    # ----- Serialization -----
+
+    def _dump(self, value: Any):
+        type_, data = self.serde.dumps_typed(value)
+        compressed = zlib.compress(data, self.compression_level) if self.compression_level else data
+        # Small values (most channel updates) do not shrink; they are stored as they are
+        if len(compressed) < len(data):
+            return type_, b"z" + compressed, len(data)
+        return type_, b"r" + data, len(data)
+
+    def _load(self, type_: str, blob: bytes) -> Any:
+        data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+        return self.serde.loads_typed((type_, data))
+
+    # ----- Reads -----
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Load a thread's checkpoint: the one named in the config, otherwise the latest."""
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = ("SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata,"
+                 " channel_versions FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            blobs, writes = self._fetch(thread_id, checkpoint_ns, row)
+        return self._tuple(thread_id, checkpoint_ns, row, blobs, writes)
+
+    def _fetch(self, thread_id: str, checkpoint_ns: str, row):
+        """The channel values and pending writes of a checkpoint row; called with the lock held."""
+        versions = list(json.loads(row[6]).items())
+        blobs = []
+        for start in range(0, len(versions), 400):
+            chunk = versions[start:start + 400]
+            blobs += self._conn.execute(
+                "SELECT channel, type, value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?"
+                f" AND (channel, version) IN (VALUES {','.join(['(?, ?)'] * len(chunk))})",
+                [thread_id, checkpoint_ns, *(item for channel, version in chunk for item in (channel, str(version)))],
+            ).fetchall()
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, row[0]),
+        ).fetchall()
+        return blobs, writes
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row, blobs, writes) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata, _ = row
+        checkpoint = self._load(type_, checkpoint)
+        checkpoint["channel_values"] = {channel: self._load(value_type, value)
+                                        for channel, value_type, value in blobs if value_type != "empty"}
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=checkpoint,
+            metadata=self._load(metadata_type, metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[(task_id, channel, self._load(value_type, value))
+                            for task_id, channel, value_type, value in writes],
+        )
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first, optionally for one thread, before a checkpoint or matching metadata."""
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,"
+                 " metadata_type, metadata, channel_versions FROM checkpoints WHERE 1 = 1")
+        params = []
+        if config:
+            configurable = config["configurable"]
+            query += " AND thread_id = ?"
+            params.append(str(configurable["thread_id"]))
+            if configurable.get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params.append(get_checkpoint_id(before))
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self._load(row[4], row[5])
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                blobs, writes = self._fetch(thread_id, checkpoint_ns, row)
+            yield self._tuple(thread_id, checkpoint_ns, row, blobs, writes)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """A channel version unique to this write: the counter plus a random fraction, as in
+        InMemorySaver. update_state() and forks from an older checkpoint bump a channel from
+        the same version twice; plain counters would give both values one version, and the
+        second would be dropped as a blob that is already stored."""
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+
+    # ----- Writes -----
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """Store a checkpoint and the channel values that changed since the previous one."""
+        start = time.perf_counter()
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+        blobs = []
+        for channel, version in new_versions.items():
+            value_type, blob, raw_size = self._dump(values[channel]) if channel in values else ("empty", b"r", 0)
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), value_type, blob, raw_size))
+        type_, checkpoint_blob, raw_size = self._dump(checkpoint)
+        metadata_type, metadata_blob, _ = self._dump(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)", blobs)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"), type_,
+                 checkpoint_blob, metadata_type, metadata_blob,
+                 json.dumps({channel: str(version) for channel, version in checkpoint["channel_versions"].items()}),
+                 raw_size, time.time()),
+            )
+            self._conn.commit()
+        self._write_latencies.append(time.perf_counter() - start)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                   task_path: str = "") -> None:
+        """Store a task's pending writes against a checkpoint."""
+        start = time.perf_counter()
+        configurable = config["configurable"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob, raw_size = self._dump(value)
+            rows.append((str(configurable["thread_id"]), configurable.get("checkpoint_ns", ""),
+                         configurable["checkpoint_id"], task_id, WRITES_IDX_MAP.get(channel, idx), channel,
+                         type_, blob, raw_size, task_path))
+        # Special channels (errors, interrupts, resumes) overwrite; regular writes are kept from the first attempt
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+        self._write_latencies.append(time.perf_counter() - start)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads([str(thread_id)])
+            self._conn.commit()
+
+    # ----- Async: SQLite calls run on a worker thread so the event loop is not blocked -----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # ----- Contexts -----
+
+    def put_context(self, ref: str, text: str):
+        """Store a retrieved context under its reference, or mark a stored one as used."""
+        value = zlib.compress(text.encode("utf-8"), self.compression_level)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO contexts VALUES (?, ?, ?) ON CONFLICT(ref) DO UPDATE SET used_at = excluded.used_at",
+                (ref, value, time.time()),
+            )
+            self._conn.commit()
+
+    def get_context(self, ref: str) -> Optional[str]:
+        """The context stored under a reference, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM contexts WHERE ref = ?", (ref,)).fetchone()
+        if row is None:
+            return None
+        self.touch_context(ref)
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def touch_context(self, ref: str):
+        """Note that a context was used; the next compaction stores the time."""
+        with self._touched_lock:
+            self._touched_contexts[ref] = time.time()
+
+    def _flush_touched_contexts(self):
+        with self._touched_lock:
+            touched, self._touched_contexts = self._touched_contexts, {}
+        self._conn.executemany("UPDATE contexts SET used_at = MAX(used_at, ?) WHERE ref = ?",
+                               [(used_at, ref) for ref, used_at in touched.items()])
+
+    # ----- Eviction and compaction -----
+
+    def compact(self) -> dict:
+        """Drop expired threads, trim each thread to its latest checkpoints, evict the least
+        recently updated threads over the size limit and release the freed pages.
+        Returns:
+            The number of threads evicted and checkpoints trimmed.
+        """
+        with self._lock:
+            evicted = 0
+            self._flush_touched_contexts()
+            if self.ttl is not None:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (time.time() - self.ttl,),
+                )]
+                evicted += self._delete_threads(expired)
+                self._conn.execute("DELETE FROM contexts WHERE used_at < ?", (time.time() - self.ttl,))
+
+            trimmed = self._conn.execute(
+                "DELETE FROM checkpoints WHERE rowid IN (SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+                " PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS position FROM checkpoints)"
+                " WHERE position > ?)",
+                (self.keep_per_thread,),
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM writes WHERE NOT EXISTS (SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+                " AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+            )
+            if trimmed:
+                # Channel values no remaining checkpoint refers to
+                self._conn.execute(
+                    "DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM checkpoints c, json_each(c.channel_versions) v"
+                    " WHERE c.thread_id = blobs.thread_id AND c.checkpoint_ns = blobs.checkpoint_ns"
+                    " AND v.key = blobs.channel AND v.value = blobs.version)"
+                )
+
+            if self.max_bytes is not None:
+                excess = self._stored_bytes() - self.max_bytes
+                if excess > 0:
+                    # Threads by their last checkpoint and contexts by their last use, oldest first
+                    candidates = self._conn.execute(
+                        "SELECT MAX(c.created_at), 'thread', c.thread_id, SUM(LENGTH(c.checkpoint) + LENGTH(c.metadata))"
+                        " + (SELECT COALESCE(SUM(LENGTH(value)), 0) FROM blobs b WHERE b.thread_id = c.thread_id)"
+                        " + (SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes w WHERE w.thread_id = c.thread_id)"
+                        " FROM checkpoints c GROUP BY c.thread_id"
+                        " UNION ALL SELECT used_at, 'context', ref, LENGTH(value) FROM contexts ORDER BY 1"
+                    ).fetchall()
+                    victims, contexts = [], []
+                    for _, kind, key, size in candidates:
+                        if excess <= 0:
+                            break
+                        (victims if kind == "thread" else contexts).append(key)
+                        excess -= size
+                    evicted += self._delete_threads(victims)
+                    self._conn.executemany("DELETE FROM contexts WHERE ref = ?", [(ref,) for ref in contexts])
+            self._conn.commit()
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.evicted_threads += evicted
+            self.trimmed_checkpoints += trimmed
+            self.last_compaction = time.time()
+        return {"evicted_threads": evicted, "trimmed_checkpoints": trimmed}
+
+    def _delete_threads(self, thread_ids) -> int:
+        for start in range(0, len(thread_ids), 500):
+            chunk = thread_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id IN ({placeholders})", chunk)
+        return len(thread_ids)
+
+    def _stored_bytes(self) -> int:
+        checkpoints = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints").fetchone()[0]
+        values = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM blobs").fetchone()[0]
+        writes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+        contexts = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM contexts").fetchone()[0]
+        return checkpoints + values + writes + contexts
+
+    def _compact_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                result = self.compact()
+                if result["evicted_threads"] or result["trimmed_checkpoints"]:
+                    logger.info("Checkpoint compaction: %d threads evicted, %d checkpoints trimmed",
+                                result["evicted_threads"], result["trimmed_checkpoints"])
+            except sqlite3.Error as e:
+                logger.warning("Checkpoint compaction failed: %s", e)
+
+    def stats(self) -> dict:
+        """Stored checkpoints, threads and bytes, compression ratio, write latency and evictions."""
+        with self._lock:
+            checkpoints, threads, raw = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT thread_id), COALESCE(SUM(raw_size), 0) FROM checkpoints").fetchone()
+            raw_values = self._conn.execute("SELECT COALESCE(SUM(raw_size), 0) FROM blobs").fetchone()[0]
+            writes, raw_writes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0) FROM writes").fetchone()
+            contexts, context_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM contexts").fetchone()
+            stored = self._stored_bytes()
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        latencies = sorted(self._write_latencies)
+        return {
+            "checkpoints": checkpoints,
+            "threads": threads,
+            "writes": writes,
+            "contexts": contexts,
+            "context_bytes": context_bytes,
+            "bytes": stored,
+            "file_bytes": page_count * page_size,
+            "compression_ratio": (raw + raw_values + raw_writes) / (stored - context_bytes)
+            if stored > context_bytes else 0.0,
+            "mean_write_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+            "p95_write_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+            "evicted_threads": self.evicted_threads,
+            "trimmed_checkpoints": self.trimmed_checkpoints,
+            "last_compaction": self.last_compaction,
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """Process-wide checkpointer for CHECKPOINT_BACKEND, shared by every compiled graph."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                if CHECKPOINT_BACKEND == "memory":
+                    _checkpointer = MemorySaver()
+                elif CHECKPOINT_BACKEND == "sqlite":
+                    _checkpointer = SQLiteCheckpointer()
+                else:
+                    raise ValueError(f"Unknown checkpoint backend {CHECKPOINT_BACKEND!r}, expected sqlite or memory")
+    return _checkpointer
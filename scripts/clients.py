@@ -0,0 +1,230 @@
+import asyncio
+import atexit
+import inspect
+import logging
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai.chat_models import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
+from pinecone import Pinecone, PineconeAsyncio
+from pymongo import AsyncMongoClient, MongoClient
+
+from scripts.embedding_cache import EmbeddingCache
+from scripts.vector_store import AsyncLocalVectorIndex, LocalVectorIndex
+
+# Loaded once per process instead of on every node call.
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Pool settings -----
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))
+
+# ----- Vector backend -----
+# "pinecone" (remote, default) or "local" (in-process NumPy index written by convert_data).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./data/vector_index")
+
+# ----- Embedding cache -----
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+_lock = threading.RLock()
+_clients = {}
+# Async clients hold connections bound to the event loop that opened them, so each loop gets its own set.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_or_create(key, factory):
+    """Return the client registered under key, building it on first use."""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive HTTP pool used by every OpenAI client in the process."""
+    return _get_or_create("http", lambda: httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=OPENAI_TIMEOUT,
+    ))
+
+
+def get_openai_client() -> OpenAI:
+    """Shared OpenAI client (embeddings and raw completions)."""
+    return _get_or_create("openai", lambda: OpenAI(http_client=get_http_client()))
+
+
+def get_chat_model(model_name: str, temperature: float = 0, **kwargs) -> ChatOpenAI:
+    """Shared chat model for a given model name and settings.
+    Args:
+        model_name: The OpenAI model name, e.g. "gpt-4o".
+        temperature: Sampling temperature.
+        kwargs: Extra ChatOpenAI settings such as max_tokens.
+    Returns:
+        A ChatOpenAI instance reused by every caller asking for the same settings.
+        Its async calls (ainvoke) go through langchain_openai's pooled async HTTP client.
+    """
+    key = ("chat", model_name, temperature, tuple(sorted(kwargs.items())))
+    return _get_or_create(key, lambda: ChatOpenAI(
+        model_name=model_name,
+        temperature=temperature,
+        http_client=get_http_client(),
+        **kwargs,
+    ))
+
+
+def get_mongo_client() -> MongoClient:
+    """Shared MongoClient; pymongo keeps its own connection pool per client."""
+    return _get_or_create("mongo", lambda: MongoClient(
+        os.getenv("MONGODB_URI"),
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+    ))
+
+
+def get_mongo_collection():
+    """The products collection configured by MONGODB_DB / MONGODB_COLLECTION."""
+    # Collection handles are cheap views over the pooled client, no need to cache them.
+    return get_mongo_client()[os.getenv("MONGODB_DB")][os.getenv("MONGODB_COLLECTION")]
+
+
+def _get_pinecone() -> Pinecone:
+    return _get_or_create("pinecone", lambda: Pinecone(
+        api_key=os.getenv("PINECONE_API_KEY"),
+        pool_threads=PINECONE_POOL_THREADS,
+    ))
+
+
+def get_pinecone_index():
+    """Shared handle on the Pinecone index configured by INDEX_NAME."""
+    def build():
+        return _get_pinecone().Index(os.getenv("INDEX_NAME"), pool_threads=PINECONE_POOL_THREADS)
+    return _get_or_create("pinecone_index", build)
+
+
+def get_vector_index():
+    """Vector index for the configured VECTOR_BACKEND ("pinecone" or "local")."""
+    if VECTOR_BACKEND == "local":
+        return _get_or_create("local_vector_index", lambda: LocalVectorIndex(LOCAL_INDEX_PATH))
+    return get_pinecone_index()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Shared two-tier (memory + SQLite) embedding cache."""
+    return _get_or_create("embedding_cache", lambda: EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_SIZE))
+
+
+def _get_or_create_async(key, factory):
+    """Return the async client registered under key for the running event loop, building it on first use."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = factory()
+            clients[key] = client
+    return client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Keep-alive async HTTP pool shared by the async OpenAI client of the running loop."""
+    return _get_or_create_async("http", lambda: httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=OPENAI_TIMEOUT,
+    ))
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Async OpenAI client (embeddings) for the running loop."""
+    return _get_or_create_async("openai", lambda: AsyncOpenAI(http_client=get_async_http_client()))
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """Async MongoClient for the running loop, with the same pool settings as the sync one."""
+    return _get_or_create_async("mongo", lambda: AsyncMongoClient(
+        os.getenv("MONGODB_URI"),
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+    ))
+
+
+def get_async_mongo_collection():
+    """The products collection on the async client."""
+    return get_async_mongo_client()[os.getenv("MONGODB_DB")][os.getenv("MONGODB_COLLECTION")]
+
+
+def _get_async_pinecone() -> PineconeAsyncio:
+    # Registered so aclose_clients closes its HTTP session along with the index's
+    return _get_or_create_async("pinecone", lambda: PineconeAsyncio(api_key=os.getenv("PINECONE_API_KEY")))
+
+
+def get_async_pinecone_index():
+    """Async handle on the Pinecone index; the host comes from PINECONE_INDEX_HOST or is looked up once."""
+    def build():
+        host = os.getenv("PINECONE_INDEX_HOST") or _get_pinecone().describe_index(os.getenv("INDEX_NAME")).host
+        return _get_async_pinecone().IndexAsyncio(host=host)
+    return _get_or_create_async("pinecone_index", build)
+
+
+def get_async_vector_index():
+    """Async vector index for the configured VECTOR_BACKEND; query() is awaitable."""
+    if VECTOR_BACKEND == "local":
+        return _get_or_create_async("local_vector_index", lambda: AsyncLocalVectorIndex(
+            _get_or_create("local_vector_index", lambda: LocalVectorIndex(LOCAL_INDEX_PATH))))
+    return get_async_pinecone_index()
+
+
+async def aclose_clients():
+    """Close the async clients of the running loop."""
+    with _lock:
+        clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        close = getattr(client, "aclose", None) or getattr(client, "close", None)
+        if callable(close):
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Error closing client %s: %s", type(client).__name__, e)
+
+
+def close_clients():
+    """Close every pooled client and empty the registry."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.warning("Error closing client %s: %s", type(client).__name__, e)
+
+
+atexit.register(close_clients)
@@ -0,0 +1,12 @@
+from scripts.schema import PlanExecute
+
+def cached_or_reason(state: PlanExecute):
+    """Decide whether the answer cache already answered the question.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        "cache_hit" to end the workflow, "cache_miss" to start reasoning.
+    """
+    if state["tool"] == "answer_cache":
+        return "cache_hit"
+    return "cache_miss"
@@ -7,7 +7,6 @@ def retrieve_or_answer(state: PlanExecute):
     Returns:
         updates the tool to use .
     """
-    print("deciding whether to retrieve or answer")
     if state["tool"] == "MongoDB_retrieval":
         return "chosen_tool_is_MongoDB_retrieval"
     elif state["tool"] == "pinecone_retrieval":
@@ -18,5 +17,7 @@ def retrieve_or_answer(state: PlanExecute):
         return "chosen_tool_is_combined_search"
     elif state["tool"] == "answer":
         return "chosen_tool_is_answer"
+    elif state["tool"] == "fast_reply":
+        return "chosen_tool_is_fast_reply"
     else:
         raise ValueError("Invalid tool was outputed. Must be either 'retrieve' or 'answer_from_context'")  
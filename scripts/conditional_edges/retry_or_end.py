@@ -1,16 +1,25 @@
+import logging
+
 from scripts.schema import PlanExecute
+from scripts.budget import budget_exhausted
+
+logger = logging.getLogger(__name__)
 
 def retry_or_end(state: PlanExecute):
     """Decide whether to retry or end the workflow.
     Args:
         state: The current state of the plan execution.
     Returns:
-        updates the tool to use .
+        "end_workflow" for a GOOD answer, "retry_reasoning" for a POOR one, or
+        "return_best_answer" for a POOR one once the request's budget is spent.
     """
-    print("deciding whether to retry or end")
     if state["answer_quality"] == "GOOD":
         return "end_workflow"
     elif state["answer_quality"] == "POOR":
+        exhausted = budget_exhausted(state)
+        if exhausted:
+            logger.info("Retry budget spent (%s), returning the best answer", exhausted)
+            return "return_best_answer"
         return "retry_reasoning"
     else:
-        raise ValueError("Invalid tool was outputed. Must be either 'retrieve' or 'answer_from_context'")  
\ No newline at end of file
+        raise ValueError("Invalid tool was outputed. Must be either 'retrieve' or 'answer_from_context'")  
@@ -0,0 +1,138 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from scripts.tokens import estimate_tokens
+
+_EMPTY = (None, "", "N/A", "$N/A", [], {})
+_REFERENCE = re.compile(r"\[(image|link):([\w-]+)\]")
+_URL = re.compile(r"https?://\S+?(?=[\s)\]]|[.,;](?:\s|$)|$)")
+
+REFERENCE_NOTE = "Write [image:SKU] or [link:SKU] to show a product's image or page."
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        value = f"{value:.2f}".rstrip("0").rstrip(".")
+    elif isinstance(value, (list, tuple)):
+        value = " ".join(str(item) for item in value)
+    return str(value).replace("|", "/").replace("\n", " ").strip()
+
+
+def _urls(product: Dict[str, Any]) -> Dict[str, str]:
+    urls = {"image": product.get("image") or product.get("showImage"), "link": product.get("href")}
+    return {kind: url for kind, url in urls.items() if url not in _EMPTY}
+
+
+def product_references(products: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """The URLs behind the [image:SKU] / [link:SKU] references encode_products writes for these
+    products, by SKU. They travel with the run (the "references" state key) to expand_references."""
+    references = {}
+    for product in products:
+        sku, urls = str(product.get("sku") or ""), _urls(product)
+        if sku and urls:
+            references[sku] = urls
+    return references
+
+
+def _shorten_urls(text: str, sku: str, image: Optional[str], link: Optional[str]) -> str:
+    def replace(match):
+        url = match.group(0)
+        if url == image:
+            return f"[image:{sku}]"
+        if url == link:
+            return f"[link:{sku}]"
+        return url
+    return _URL.sub(replace, text)
+
+
+def encode_table(rows: Iterable[Dict[str, Any]], title: str = "") -> str:
+    """Encode dicts as a header row plus one pipe-separated line per row.
+
+    Columns that are empty in every row are dropped, and so are empty cells.
+    """
+    rows = [{key: value for key, value in row.items() if value not in _EMPTY} for row in rows]
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    lines = [title] if title else []
+    if columns:
+        lines.append("|".join(columns))
+        lines.extend("|".join(_cell(row.get(column, "")) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def product_row(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Table fields of one product; the SKU suffix is dropped from the name since it has its own column."""
+    sku = str(product.get("sku") or "")
+    name = product.get("name") or ""
+    if sku:
+        name = re.sub(rf"\s*-?\s*{re.escape(sku)}\s*$", "", name)
+    unit = product.get("weight_unit") or product.get("price_unit") or ""
+    price_per = product.get("pricePer")
+    weight = product.get("weight_each")
+    return {
+        "sku": sku,
+        "name": name,
+        "brand": product.get("brand"),
+        "price": product.get("price"),
+        "price_per_unit": f"{_cell(price_per)}/{unit}" if price_per else None,
+        "department": product.get("department"),
+        "weight": f"{_cell(weight)} {unit}".strip() if weight else None,
+        "score": product.get("score"),
+        "related": product.get("relateds"),
+    }
+
+
+def estimate_product_tokens(product: Dict[str, Any]) -> int:
+    """Tokens one product's table row will take."""
+    return estimate_tokens("|".join(_cell(value) for value in product_row(product).values() if value not in _EMPTY))
+
+
+def encode_products(products: List[Dict[str, Any]], total: Optional[int] = None) -> str:
+    """Compact context for a list of products.
+
+    Products are a table; descriptions follow once each (identical descriptions
+    are listed once for all their SKUs), and image and page URLs are replaced by
+    SKU references that expand_references turns back into links with the map
+    product_references builds for the same products.
+    """
+    shown = len(products)
+    if total is None:
+        header = f"Found {shown} products."
+    elif total > shown:
+        header = f"Found {total} products in total; showing the first {shown}."
+    else:
+        header = f"Found {total} products."
+
+    descriptions: Dict[str, List[str]] = {}
+    has_urls = False
+    for product in products:
+        sku, urls = str(product.get("sku") or ""), _urls(product)
+        has_urls = has_urls or (bool(sku) and bool(urls))
+        description = product.get("description") or product.get("text")
+        if description not in _EMPTY:
+            descriptions.setdefault(_shorten_urls(description, sku, urls.get("image"), urls.get("link")),
+                                    []).append(sku or "?")
+
+    sections = [header, encode_table(product_row(product) for product in products)]
+    if descriptions:
+        sections.append("Descriptions:\n" + "\n".join(
+            f"{','.join(skus)}: {text}" for text, skus in descriptions.items()))
+    if has_urls:
+        sections.append(REFERENCE_NOTE)
+    return "\n".join(section for section in sections if section)
+
+
+def expand_references(text: str, references: Dict[str, Dict[str, str]]) -> str:
+    """Replace [image:SKU] and [link:SKU] references in an answer with markdown image and links.
+    Args:
+        text: The answer.
+        references: URLs by SKU of the products the run retrieved (product_references).
+    Returns:
+        The answer with links; a link to a SKU the run has no URL for becomes the plain SKU.
+    """
+    def replace(match):
+        kind, sku = match.groups()
+        url = (references.get(sku) or {}).get(kind)
+        if url is None:
+            return "" if kind == "image" else f"SKU {sku}"
+        return f"![{sku}]({url})" if kind == "image" else f"[product page]({url})"
+    return _REFERENCE.sub(replace, text)
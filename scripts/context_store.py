@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from scripts.cache import LRUCache
+from scripts.checkpointer import get_checkpointer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+# Retrieved contexts live here instead of in the graph state, so checkpoints carry a short reference.
+# The in-process LRU fronts the durable copy the SQLite checkpointer keeps next to the checkpoints.
+CONTEXT_STORE_SIZE = int(os.getenv("CONTEXT_STORE_SIZE", "2000"))
+CONTEXT_STORE_TTL_S = float(os.getenv("CONTEXT_STORE_TTL_S", "3600"))
+
+
+class ContextStore:
+    """In-process store for retrieved contexts, referenced from the graph state by id.
+
+    Ids are content hashes, so a retry that retrieves the same products stores them once.
+    With a durable backend (the SQLite checkpointer) every context is also written through
+    to it, so a thread resumed after a restart or in another process on the same checkpoint
+    file finds its context. A reference found nowhere reads as an empty context; the answer
+    is then graded POOR and the retry retrieves again. Async nodes use aput()/aget(), which
+    run the backend calls off the event loop.
+    """
+
+    def __init__(self, maxsize: int = CONTEXT_STORE_SIZE, ttl: float = CONTEXT_STORE_TTL_S, backend=None):
+        """
+        Args:
+            backend: Durable store with put_context(ref, text), get_context(ref) and
+                touch_context(ref), or None.
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.backend = backend
+
+    def put(self, text: str) -> str:
+        """Store a context and return its reference ("" for an empty context)."""
+        if not text:
+            return ""
+        ref = self._cache_put(text)
+        if self.backend is not None:
+            self.backend.put_context(ref, text)
+        return ref
+
+    async def aput(self, text: str) -> str:
+        """Async put()."""
+        if not text:
+            return ""
+        ref = self._cache_put(text)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.put_context, ref, text)
+        return ref
+
+    def get(self, ref: str) -> str:
+        """The context behind a reference, or "" when there is none."""
+        if not ref:
+            return ""
+        text = self._cache.get(ref)
+        if text is None and self.backend is not None:
+            text = self.backend.get_context(ref)
+            if text is not None:
+                self._cache.set(ref, text)
+        return self._found(ref, text)
+
+    async def aget(self, ref: str) -> str:
+        """Async get()."""
+        if not ref:
+            return ""
+        text = self._cache.get(ref)
+        if text is None and self.backend is not None:
+            text = await asyncio.to_thread(self.backend.get_context, ref)
+            if text is not None:
+                self._cache.set(ref, text)
+        return self._found(ref, text)
+
+    def _cache_put(self, text: str) -> str:
+        ref = "ctx-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        self._cache.set(ref, text)
+        return ref
+
+    def _found(self, ref: str, text) -> str:
+        if text is None:
+            logger.warning("Context %s expired from the context store", ref)
+            return ""
+        if self.backend is not None:
+            # Keeps a context read only from the cache from expiring in the backend
+            self.backend.touch_context(ref)
+        return text
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_context_store() -> ContextStore:
+    """Process-wide context store, backed by the checkpointer when it can keep contexts."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                checkpointer = get_checkpointer()
+                _store = ContextStore(backend=checkpointer if hasattr(checkpointer, "put_context") else None)
+    return _store
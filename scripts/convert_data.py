@@ -1,11 +1,16 @@
-import json
+import argparse
 import os
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Tuple
 import time
 from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from scripts.catalog import CatalogManifest, content_hash, iter_products, metadata_hash
+from scripts.clients import get_embedding_cache, get_openai_client
+from scripts.ingestion import IngestionPipeline, TokenBucketLimiter, rate_limited_embedder
+from scripts.vector_store import LocalIndexWriter, LocalVectorIndex, build_product_metadata
+
 load_dotenv()
 
 # ----- Configuration -----
@@ -13,64 +18,66 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 INDEX_NAME = os.getenv("INDEX_NAME")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./data/vector_index")
+# Provider quotas for the embedding model; the limiter adapts downward on 429s.
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "3000"))
+EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "1000000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
 
 # ----- Initialize clients -----
 os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-client = OpenAI()
+limiter = TokenBucketLimiter(EMBEDDING_RPM, EMBEDDING_TPM)
 
 # ----- Functions -----
 def load_json_data(json_path: str) -> List[Dict[str, Any]]:
-    """Load data from a JSON file."""
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Handle both array and single object formats
-    if isinstance(data, dict):
-        return [data]
-    return data
+    """Load data from a JSON (array or single object) or JSONL file.
+
+    Loads everything into memory; the ingestion paths stream with iter_products instead.
+    """
+    return list(iter_products(json_path))
+
+def make_ingestion_pipeline(upsert, model: str = EMBEDDING_MODEL) -> IngestionPipeline:
+    """Build the concurrent embed -> upsert pipeline, with cache lookups in front of the rate-limited API."""
+    cache = get_embedding_cache()
+
+    def create_embeddings(batch: List[str]) -> List[List[float]]:
+        response = get_openai_client().embeddings.create(input=batch, model=model)
+        return [item.embedding for item in response.data]
+
+    embed_api = rate_limited_embedder(create_embeddings, limiter)
+    return IngestionPipeline(
+        embed=lambda texts: cache.embed(texts, model, embed_api),
+        upsert=upsert,
+        concurrency=EMBEDDING_CONCURRENCY,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        upsert_batch_size=UPSERT_BATCH_SIZE,
+        queue_size=INGEST_QUEUE_SIZE,
+    )
 
 def generate_embeddings(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
-    """Generate embeddings using OpenAI API v1.0+."""
+    """Generate embeddings using OpenAI API v1.0+, reusing cached vectors for unchanged texts."""
     if not texts:
         print("WARNING: No texts provided for embedding generation")
         return []
-    
-    embeddings = []
-    # Reduce batch size to avoid quota issues
-    batch_size = 50  # Reduced from 100 to 50
-    
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        print(f"Generating embeddings for batch {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}")
-        
-        max_retries = 3
-        retry_delay = 5
-        
-        for attempt in range(max_retries):
-            try:
-                response = client.embeddings.create(
-                    input=batch,
-                    model=model
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                embeddings.extend(batch_embeddings)
-                print(f"Successfully embedded {len(batch)} texts")
-                # Add a small delay between batches to avoid rate limits
-                time.sleep(1)
-                break
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"Error: {str(e)}. Retrying in {retry_delay} seconds... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    print(f"Failed to generate embeddings after {max_retries} attempts: {str(e)}")
-                    raise
-    
+
+    embeddings = [None] * len(texts)
+
+    def collect(records):
+        for i, embedding, _ in records:
+            embeddings[i] = embedding
+
+    make_ingestion_pipeline(collect, model).run((i, text, None) for i, text in enumerate(texts))
+    print(f"Embedding cache stats: {get_embedding_cache().stats()}")
     return embeddings
 
+def product_id(product: Dict[str, Any]) -> str:
+    """Stable vector ID derived from the product SKU."""
+    return f"product_{product.get('sku', '')}"
+
 def prepare_product_text(product: Dict[str, Any]) -> str:
     """Create a rich text representation of a product for embedding."""
     parts = []
@@ -112,6 +119,33 @@ def initialize_pinecone():
     print(f"Existing indexes: {pc.list_indexes().names()}")
     return pc
 
+def wait_for_index_ready(pc, index_name: str, timeout: float = 120, poll_interval: float = 1):
+    """Poll the index status until Pinecone reports it ready."""
+    print("Waiting for index to be ready...")
+    deadline = time.monotonic() + timeout
+    while not pc.describe_index(index_name).status["ready"]:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {index_name} not ready after {timeout} seconds")
+        time.sleep(poll_interval)
+
+def ensure_index(pc, index_name: str, dimension: int = None, metric: str = "cosine"):
+    """Connect to the index, creating it first if it does not exist. Never deletes data."""
+    if index_name not in pc.list_indexes().names():
+        if dimension is None:
+            raise ValueError(f"Index {index_name} does not exist; run with --mode full to build it")
+        print(f"Creating index: {index_name} with dimension {dimension}")
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric=metric,
+            spec=ServerlessSpec(
+                cloud='aws',
+                region='us-east-1'
+            )
+        )
+    wait_for_index_ready(pc, index_name)
+    return pc.Index(index_name)
+
 def check_and_recreate_index(pc, index_name: str, dimension: int, metric: str = "cosine"):
     """Check if index exists with correct dimensions, delete and recreate if needed."""
     try:
@@ -133,8 +167,7 @@ def check_and_recreate_index(pc, index_name: str, dimension: int, metric: str =
         )
         
         # Wait for index to be ready
-        print("Waiting for index to be ready...")
-        time.sleep(10)
+        wait_for_index_ready(pc, index_name)
         
         return pc.Index(index_name)
     except Exception as e:
@@ -142,80 +175,164 @@ def check_and_recreate_index(pc, index_name: str, dimension: int, metric: str =
         print("Please verify your Pinecone API key and account status")
         raise
         
+def pinecone_upserter(pc, index_name: str, create_index):
+    """Upsert sink for the ingestion pipeline; the index is set up on the first batch, once the dimension is known."""
+    state = {}
+
+    def upsert(records):
+        if "index" not in state:
+            print(f"Setting up index '{index_name}'...")
+            state["index"] = create_index(pc, index_name, len(records[0][1]))
+        state["index"].upsert(vectors=[
+            {"id": vector_id, "values": values, "metadata": metadata}
+            for vector_id, values, metadata in records
+        ])
+
+    return upsert, state
+
+def plan_catalog(json_path: str, manifest: CatalogManifest, counts: Dict[str, int],
+                 batch_size: int = 500) -> Iterator[Tuple[str, tuple]]:
+    """Stream the catalog and classify each product against the manifest.
+
+    Yields ("embed", (id, text, metadata)) for new or re-described products and
+    ("update", (id, metadata)) for metadata-only changes. Every product seen is
+    staged in the manifest; only a bounded batch is held in memory at a time.
+    """
+    products = iter_products(json_path)
+    while True:
+        chunk = list(islice(products, batch_size))
+        if not chunk:
+            return
+        prepared = []
+        for product in chunk:
+            sku = str(product.get("sku", ""))
+            if not sku:
+                print(f"WARNING: Skipping product without sku: {product.get('name', 'N/A')}")
+                continue
+            text = prepare_product_text(product)
+            metadata = build_product_metadata(product)
+            prepared.append((sku, text, metadata, content_hash(text), metadata_hash(metadata)))
+        previous = manifest.lookup([sku for sku, *_ in prepared])
+        manifest.stage([(sku, text_hash, meta_hash) for sku, _, _, text_hash, meta_hash in prepared])
+        for sku, text, metadata, text_hash, meta_hash in prepared:
+            counts["products"] += 1
+            known = previous.get(sku)
+            if known is None or known[0] != text_hash:
+                counts["embed"] += 1
+                yield "embed", (f"product_{sku}", text, metadata)
+            elif known[1] != meta_hash:
+                counts["update"] += 1
+                yield "update", (f"product_{sku}", metadata)
+            else:
+                counts["unchanged"] += 1
+
+def items_to_embed(plan: Iterator[Tuple[str, tuple]], on_update) -> Iterator[tuple]:
+    """Feed the "embed" entries of a plan to the pipeline, handing metadata-only changes to on_update."""
+    for action, payload in plan:
+        if action == "embed":
+            yield payload
+        else:
+            on_update(*payload)
+
+def new_counts() -> Dict[str, int]:
+    return {"products": 0, "embed": 0, "update": 0, "unchanged": 0, "delete": 0}
+
 def create_vector_db_from_food_products(json_path: str, index_name: str):
-    """Create a vector database from food product JSON data."""
-    # Load data
-    print(f"Loading JSON data from {json_path}...")
-    data = load_json_data(json_path)
-    print(f"Loaded {len(data)} product records")
-    
-    # Prepare text for embedding
-    print("Preparing product text for embedding...")
-    product_texts = [prepare_product_text(product) for product in data]
-    print(f"Created {len(product_texts)} text descriptions")
-    
-    # Generate embeddings
-    print("Generating embeddings...")
-    embeddings = generate_embeddings(product_texts)
-    
-    if not embeddings:
-        raise ValueError("Failed to generate embeddings")
-    
-    dimension = len(embeddings[0])
-    print(f"Generated embeddings with dimension {dimension}")
-    
-    # Initialize Pinecone
-    print("Initializing Pinecone...")
-    pc = initialize_pinecone()
-    
-    # Create or connect to index - with correct dimensions
-    print(f"Setting up index '{index_name}'...")
-    index = check_and_recreate_index(pc, index_name, dimension)
-    
-    # Prepare metadata and IDs
-    print("Preparing metadata and IDs...")
-    ids = [f"product_{product.get('SKU_number', i)}" for i, product in enumerate(data)]
-    
-    # Prepare metadata
-    metadata_list = []
-    for product in data:
-        metadata = {
-            "name": product.get("name", ""),
-            "sku": str(product.get("sku", "")),
-            "department": str(product.get("department", "")),
-            "brand": str(product.get("brand", "")),
-            "showImage": str(product.get("showImage", "")),
-            "price": float(product.get("price", 0)),
-            "pricePer": float(product.get("priceper", 0)),
-            "price_each": float(product.get("price_each", 0)),
-            "price_unit": str(product.get("price_unit", "")),
-            "price_order": float(product.get("price_order", 0)),
-            "weight_each": float(product.get("weight_each", 0)),
-            "weight_case": float(product.get("weight_case", 0)),
-            "count_unit": str(product.get("count_unit", "")),
-            "dimension_each": str(product.get("dimension_each", "")),
-            "href": str(product.get("href", "")),
-            "popularity_order": float(product.get("popularity_order", 0)),
-            
-        }
-        metadata_list.append(metadata)
-    
-    # Insert vectors in batches
-    print("Inserting vectors into Pinecone...")
-    batch_size = 100
-    for i in range(0, len(embeddings), batch_size):
-        end_idx = min(i + batch_size, len(embeddings))
-        batch_vectors = [
-            {"id": ids[j], 
-             "values": embeddings[j], 
-             "metadata": metadata_list[j]
-            } for j in range(i, end_idx)
-        ]
-        
-        index.upsert(vectors=batch_vectors)
-        print(f"Inserted batch {i//batch_size + 1}/{(len(embeddings)-1)//batch_size + 1}")
-    
-    print(f"Successfully created vector database with {len(embeddings)} product vectors")
+    """Create a vector database from food product JSON or JSONL data.
+
+    Products stream from the file through embedding to upsert with bounded buffers,
+    so peak memory does not grow with the size of the feed.
+    """
+    print(f"Streaming products from {json_path}...")
+    manifest = CatalogManifest()
+    manifest.begin_run(full=True)
+    counts = new_counts()
+    items = items_to_embed(plan_catalog(json_path, manifest, counts), on_update=None)
+
+    if VECTOR_BACKEND == "local":
+        writer = LocalIndexWriter(LOCAL_INDEX_PATH)
+        try:
+            make_ingestion_pipeline(writer.add_many).run(items)
+        except Exception:
+            writer.abort()
+            raise
+        writer.close()
+        pc, index = None, LocalVectorIndex(LOCAL_INDEX_PATH)
+    else:
+        # Initialize Pinecone
+        print("Initializing Pinecone...")
+        pc = initialize_pinecone()
+        upsert, sink = pinecone_upserter(pc, index_name, check_and_recreate_index)
+        make_ingestion_pipeline(upsert).run(items)
+        if "index" not in sink:
+            raise ValueError("No products to embed")
+        index = sink["index"]
+
+    version = manifest.commit_run()
+    manifest.close()
+    print(f"Successfully created vector database with {counts['embed']} product vectors, catalog version {version}")
+    return pc, index
+
+def rewrite_local_index(upserts: Dict[str, tuple], metadata_updates: Dict[str, Dict[str, Any]], deletes: set):
+    """Apply a sync diff to the local NumPy index, streaming the stored vectors of unchanged products."""
+    writer = LocalIndexWriter(LOCAL_INDEX_PATH)
+    try:
+        if os.path.exists(f"{LOCAL_INDEX_PATH}.npy"):
+            existing = LocalVectorIndex(LOCAL_INDEX_PATH)
+            for i, vector_id in enumerate(existing.ids):
+                if vector_id in deletes or vector_id in upserts:
+                    continue
+                writer.add(vector_id, existing.vectors[i], metadata_updates.get(vector_id, existing.metadata[i]))
+        for vector_id, (values, metadata) in upserts.items():
+            writer.add(vector_id, values, metadata)
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+def sync_vector_db_from_food_products(json_path: str, index_name: str):
+    """Bring the vector index in line with the catalog, touching only what changed.
+
+    Products are keyed by SKU and compared with the manifest written by the last run:
+    new or re-described products are re-embedded and upserted, price/stock-style changes
+    get a metadata-only update, and SKUs missing from the catalog are deleted.
+    """
+    manifest = CatalogManifest()
+    if manifest.is_empty():
+        manifest.close()
+        print("No sync manifest found, running a full rebuild")
+        return create_vector_db_from_food_products(json_path, index_name)
+
+    print(f"Streaming products from {json_path}...")
+    manifest.begin_run()
+    counts = new_counts()
+    plan = plan_catalog(json_path, manifest, counts)
+
+    if VECTOR_BACKEND == "local":
+        # Only the changes are held in memory; unchanged vectors are copied from disk.
+        metadata_updates = {}
+        rows = []
+        make_ingestion_pipeline(rows.extend).run(items_to_embed(plan, metadata_updates.__setitem__))
+        upserts = {vector_id: (values, metadata) for vector_id, values, metadata in rows}
+        deletes = {f"product_{sku}" for batch in manifest.iter_unseen() for sku in batch}
+        counts["delete"] = len(deletes)
+        if upserts or metadata_updates or deletes:
+            rewrite_local_index(upserts, metadata_updates, deletes)
+        pc, index = None, LocalVectorIndex(LOCAL_INDEX_PATH)
+    else:
+        pc = initialize_pinecone()
+        index = ensure_index(pc, index_name)
+        upsert, _ = pinecone_upserter(pc, index_name, lambda *args: index)
+        update = lambda vector_id, metadata: index.update(id=vector_id, set_metadata=metadata)
+        make_ingestion_pipeline(upsert).run(items_to_embed(plan, update))
+        for batch in manifest.iter_unseen():
+            index.delete(ids=[f"product_{sku}" for sku in batch])
+            counts["delete"] += len(batch)
+
+    version = manifest.commit_run()
+    manifest.close()
+    print(f"Sync complete: {counts['embed']} embedded and upserted, {counts['update']} metadata updates, "
+          f"{counts['delete']} deletions, {counts['unchanged']} unchanged; catalog version {version}")
     return pc, index
 
 def query_product_database(pc, index_name, query_text: str, top_k: int = 5):
@@ -224,7 +341,10 @@ def query_product_database(pc, index_name, query_text: str, top_k: int = 5):
     query_embedding = generate_embeddings([query_text])[0]
     
     # Get the index
-    index = pc.Index(index_name)
+    if VECTOR_BACKEND == "local":
+        index = LocalVectorIndex(LOCAL_INDEX_PATH)
+    else:
+        index = pc.Index(index_name)
     
     # Query the index
     results = index.query(
@@ -237,11 +357,22 @@ def query_product_database(pc, index_name, query_text: str, top_k: int = 5):
 
 # ----- Main execution -----
 def main():
-    # Path to your JSON file
-    json_path = "./fixture/products.json"  # Update with your file path
+    parser = argparse.ArgumentParser(description="Load the product catalog into the vector index.")
+    parser.add_argument("--json-path", default="./fixture/products.json")
+    parser.add_argument(
+        "--mode",
+        choices=["sync", "full"],
+        default="sync",
+        help="sync: apply only the changes since the last run (full rebuild if no manifest exists); "
+             "full: delete and recreate the index",
+    )
+    args = parser.parse_args()
     
-    # Create the vector database
-    pc, index = create_vector_db_from_food_products(json_path, INDEX_NAME)
+    # Create or update the vector database
+    if args.mode == "full":
+        pc, index = create_vector_db_from_food_products(args.json_path, INDEX_NAME)
+    else:
+        pc, index = sync_vector_db_from_food_products(args.json_path, INDEX_NAME)
     
     # Example query
     results = query_product_database(pc, INDEX_NAME, "mozzarella cheese for pizza")
@@ -249,7 +380,7 @@ def main():
     print("\nSearch Results for 'mozzarella cheese for pizza':")
     for i, match in enumerate(results.matches):
         print(f"\n{i+1}. {match.metadata.get('name', 'No name')}")
-        print(f"   Category: {match.metadata.get('category', 'N/A')}")
+        print(f"   Category: {match.metadata.get('department', 'N/A')}")
         print(f"   Price: ${match.metadata.get('price', 'N/A')}")
         print(f"   Similarity Score: {match.score:.4f}")
 
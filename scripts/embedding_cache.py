@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from scripts.cache import LRUCache
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-memory LRU in front of a SQLite store.
+
+    Entries are keyed by (model, sha256(text)), so ingestion and query-time
+    embedding share the same vectors whenever they embed the same text.
+    """
+
+    def __init__(self, path: str, memory_size: int = 10000):
+        """
+        Args:
+            path: SQLite file holding the persistent tier.
+            memory_size: Number of vectors kept in the in-memory LRU tier.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.memory = LRUCache(maxsize=memory_size)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look texts up in memory, then on disk. Missing entries come back as None."""
+        keys = [(model, text_hash(text)) for text in texts]
+        vectors = [self.memory.get(key) for key in keys]
+        missing = {key[1] for key, vector in zip(keys, vectors) if vector is None}
+        self.memory_hits += len(keys) - sum(vector is None for vector in vectors)
+
+        found = {}
+        if missing:
+            hashes = list(missing)
+            with self._lock:
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                        [model, *chunk],
+                    ).fetchall()
+                    for digest, blob in rows:
+                        found[digest] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+        for i, (key, vector) in enumerate(zip(keys, vectors)):
+            if vector is not None:
+                continue
+            vector = found.get(key[1])
+            if vector is None:
+                self.misses += 1
+                continue
+            self.disk_hits += 1
+            self.memory.set(key, vector)
+            vectors[i] = vector
+        return vectors
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store freshly generated vectors in both tiers."""
+        rows = []
+        for text, vector in zip(texts, vectors):
+            key = (model, text_hash(text))
+            self.memory.set(key, list(vector))
+            rows.append((model, key[1], np.asarray(vector, dtype=np.float32).tobytes()))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def embed(self, texts: Sequence[str], model: str,
+              embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return embeddings for texts, calling embed_fn only for cache misses.
+        Args:
+            texts: The texts to embed.
+            model: The embedding model name, part of the cache key.
+            embed_fn: Called with the list of uncached texts, returns their vectors in order.
+        Returns:
+            One vector per input text.
+        """
+        vectors = self.get_many(model, texts)
+        unique_texts = self._missing_texts(texts, vectors)
+        if unique_texts:
+            self._fill(model, texts, vectors, unique_texts, embed_fn(unique_texts))
+        return vectors
+
+    async def aembed(self, texts: Sequence[str], model: str,
+                     embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]]) -> List[List[float]]:
+        """Async embed(): embed_fn is a coroutine function, awaited only for cache misses.
+        The SQLite reads and writes run in a worker thread so they do not block the event loop."""
+        vectors = await asyncio.to_thread(self.get_many, model, texts)
+        unique_texts = self._missing_texts(texts, vectors)
+        if unique_texts:
+            generated = await embed_fn(unique_texts)
+            await asyncio.to_thread(self._fill, model, texts, vectors, unique_texts, generated)
+        return vectors
+
+    @staticmethod
+    def _missing_texts(texts: Sequence[str], vectors: List[Optional[List[float]]]) -> List[str]:
+        # Embed each distinct text once, even if it appears several times in the batch.
+        return list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+    def _fill(self, model: str, texts: Sequence[str], vectors: List[Optional[List[float]]],
+              unique_texts: List[str], generated: List[List[float]]):
+        self.put_many(model, unique_texts, generated)
+        by_text = dict(zip(unique_texts, generated))
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                vectors[i] = list(by_text[texts[i]])
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
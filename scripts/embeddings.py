@@ -0,0 +1,42 @@
+import os
+from typing import List, Optional, Sequence
+
+from scripts.clients import get_async_openai_client, get_embedding_cache, get_openai_client
+
+
+def embed_texts(texts: Sequence[str], model: Optional[str] = None) -> List[List[float]]:
+    """Embed texts with the OpenAI API, going through the shared embedding cache.
+    Args:
+        texts: The texts to embed.
+        model: Embedding model name, defaults to EMBEDDING_MODEL.
+    Returns:
+        One vector per input text.
+    """
+    model = model or os.getenv("EMBEDDING_MODEL")
+
+    def create_embeddings(batch: List[str]) -> List[List[float]]:
+        response = get_openai_client().embeddings.create(input=batch, model=model)
+        return [item.embedding for item in response.data]
+
+    return get_embedding_cache().embed(list(texts), model, create_embeddings)
+
+
+def embed_query(text: str, model: Optional[str] = None) -> List[float]:
+    """Embed a single query; repeated queries are served from the cache."""
+    return embed_texts([text], model)[0]
+
+
+async def aembed_texts(texts: Sequence[str], model: Optional[str] = None) -> List[List[float]]:
+    """Async embed_texts(), using the async OpenAI client of the running loop."""
+    model = model or os.getenv("EMBEDDING_MODEL")
+
+    async def create_embeddings(batch: List[str]) -> List[List[float]]:
+        response = await get_async_openai_client().embeddings.create(input=batch, model=model)
+        return [item.embedding for item in response.data]
+
+    return await get_embedding_cache().aembed(list(texts), model, create_embeddings)
+
+
+async def aembed_query(text: str, model: Optional[str] = None) -> List[float]:
+    """Async embed_query()."""
+    return (await aembed_texts([text], model))[0]
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from scripts.answer_cache import get_answer_cache
+from scripts.budget import budget_exhausted
+from scripts.cache import LRUCache
+from scripts.chains import get_chain
+from scripts.nodes.cacheStoreNode import astore_confirmed_answer, store_confirmed_answer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+# How answers are graded GOOD/POOR (POOR sends the question back to reasoning):
+#   llm          every answer is graded by the evaluation LLM before the run continues
+#   heuristic    local checks only, no LLM call
+#   sampled      local checks, plus a blocking LLM grade on EVALUATION_SAMPLE_RATE of the answers
+#   speculative  local checks; the LLM grade runs in the background while the answer is shown,
+#                and a POOR grade reopens the run for a retry (see retry_if_poor)
+EVALUATION_POLICIES = ("llm", "heuristic", "sampled", "speculative")
+EVALUATION_POLICY = os.getenv("EVALUATION_POLICY", "llm").lower()
+EVALUATION_SAMPLE_RATE = float(os.getenv("EVALUATION_SAMPLE_RATE", "0.1"))
+SPECULATIVE_GRADE_TIMEOUT_S = float(os.getenv("SPECULATIVE_GRADE_TIMEOUT_S", "15"))
+SPECULATIVE_GRADE_WORKERS = int(os.getenv("SPECULATIVE_GRADE_WORKERS", "8"))
+# Assumed LLM grading latency for the savings estimate until a grade has been timed in this process.
+EVALUATION_LLM_LATENCY_S = float(os.getenv("EVALUATION_LLM_LATENCY_S", "1.0"))
+
+_REFUSAL = re.compile(
+    r"not enough information|no (?:relevant |specific )?information|"
+    r"context (?:does ?n[o']t|did ?n[o']t) (?:contain|provide|include|mention)|"
+    r"\bI (?:do ?n[o']t|could ?n[o']t|ca ?n[o']t|cannot) (?:have|find|provide)",
+    re.IGNORECASE,
+)
+_CONTEXT_TOTAL = re.compile(r"^Found (\d+) products", re.MULTILINE)
+_ANSWER_TOTAL = re.compile(r"\bFound (\d+) products?\b", re.IGNORECASE)
+
+
+@dataclass
+class Evaluation:
+    """A GOOD/POOR grade, shaped like the evaluation chain's output."""
+    tool: str
+    analysis: str
+    source: str = "llm"
+
+
+def heuristic_evaluation(answer: str, context: str) -> Evaluation:
+    """Grade an answer with local checks: empty answers, "not enough information"
+    replies, and a product count that contradicts the retrieved context."""
+    text = (answer or "").strip()
+    if len(text) < 10:
+        return Evaluation("POOR", "The answer is empty.", "heuristic")
+    if _REFUSAL.search(text):
+        return Evaluation("POOR", "The answer says the information is missing.", "heuristic")
+    context_total = _CONTEXT_TOTAL.search(context or "")
+    answer_total = _ANSWER_TOTAL.search(text)
+    if context_total and answer_total and context_total.group(1) != answer_total.group(1):
+        return Evaluation(
+            "POOR",
+            f"The answer reports {answer_total.group(1)} products but the context has {context_total.group(1)}.",
+            "heuristic",
+        )
+    return Evaluation("GOOD", "The answer passed the local quality checks.", "heuristic")
+
+
+class EvaluationStats:
+    """Time each policy spends grading on the critical path, and the LLM grading time it avoided."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.policies = {}
+        self.llm_grades = 0
+        self.llm_grade_s = 0.0
+
+    def _entry(self, policy: str) -> dict:
+        return self.policies.setdefault(policy, {"answers": 0, "llm_graded": 0, "blocking_s": 0.0, "retries": 0})
+
+    def record(self, policy: str, blocking_s: float, llm_graded: bool):
+        with self._lock:
+            entry = self._entry(policy)
+            entry["answers"] += 1
+            entry["llm_graded"] += int(llm_graded)
+            entry["blocking_s"] += blocking_s
+
+    def record_llm(self, latency_s: float):
+        with self._lock:
+            self.llm_grades += 1
+            self.llm_grade_s += latency_s
+
+    def record_retry(self, policy: str):
+        with self._lock:
+            self._entry(policy)["retries"] += 1
+
+    def stats(self) -> dict:
+        """Per policy: answers graded, LLM grades, mean grading time on the critical path, and the
+        latency saved against grading every answer with the LLM (at the mean observed LLM grade time)."""
+        with self._lock:
+            mean_llm_s = self.llm_grade_s / self.llm_grades if self.llm_grades else EVALUATION_LLM_LATENCY_S
+            return {
+                policy: {
+                    "answers": entry["answers"],
+                    "llm_graded": entry["llm_graded"],
+                    "retries": entry["retries"],
+                    "mean_blocking_s": entry["blocking_s"] / entry["answers"] if entry["answers"] else 0.0,
+                    "saved_s": max(0.0, mean_llm_s * entry["answers"] - entry["blocking_s"]),
+                }
+                for policy, entry in self.policies.items()
+            }
+
+
+_stats = EvaluationStats()
+# Shared by every evaluator, so creating one does not leave a pool of grading threads behind.
+_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_GRADE_WORKERS, thread_name_prefix="speculative_grade")
+
+
+def get_evaluation_stats() -> EvaluationStats:
+    """Process-wide grading statistics, shared by every evaluator."""
+    return _stats
+
+
+class AnswerEvaluator:
+    """Grades answers according to an evaluation policy."""
+
+    def __init__(self, policy: str = EVALUATION_POLICY, sample_rate: float = EVALUATION_SAMPLE_RATE):
+        if policy not in EVALUATION_POLICIES:
+            raise ValueError(f"Unknown evaluation policy {policy!r}, expected one of {', '.join(EVALUATION_POLICIES)}")
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.stats = get_evaluation_stats()
+        # Background grades of speculative runs, by thread id
+        self._pending = LRUCache(maxsize=1000, ttl=600)
+
+    def _grade(self, message, response: str) -> Evaluation:
+        start = time.perf_counter()
+        output = get_chain("evaluation").invoke({"message": message, "response": response})
+        self.stats.record_llm(time.perf_counter() - start)
+        return Evaluation(output.tool, output.analysis)
+
+    async def _agrade(self, message, response: str) -> Evaluation:
+        start = time.perf_counter()
+        output = await get_chain("evaluation").ainvoke({"message": message, "response": response})
+        self.stats.record_llm(time.perf_counter() - start)
+        return Evaluation(output.tool, output.analysis)
+
+    def _local(self, message, response: str, context: str, thread_id: Optional[str]):
+        """The heuristic grade, and whether the LLM should grade this answer in line."""
+        evaluation = heuristic_evaluation(response, context)
+        if evaluation.tool != "GOOD":
+            return evaluation, False
+        if self.policy == "sampled":
+            return evaluation, random.random() < self.sample_rate
+        if self.policy == "speculative" and thread_id is not None:
+            self._pending.set(thread_id, _executor.submit(self._grade, list(message), response))
+        return evaluation, False
+
+    def evaluate(self, message, response: str, context: str, thread_id: Optional[str] = None) -> Evaluation:
+        """Grade an answer.
+        Args:
+            message: The conversation, ending with the answer.
+            response: The raw answer text.
+            context: The retrieved context the answer was based on.
+            thread_id: The run's thread id, needed by the speculative policy.
+        Returns:
+            The grade; with the speculative policy, the local grade.
+        """
+        start = time.perf_counter()
+        if self.policy == "llm":
+            evaluation, in_line = None, True
+        else:
+            evaluation, in_line = self._local(message, response, context, thread_id)
+        if in_line:
+            evaluation = self._grade(message, response)
+        self.stats.record(self.policy, time.perf_counter() - start, in_line)
+        return evaluation
+
+    async def aevaluate(self, message, response: str, context: str, thread_id: Optional[str] = None) -> Evaluation:
+        """Async evaluate()."""
+        start = time.perf_counter()
+        if self.policy == "llm":
+            evaluation, in_line = None, True
+        else:
+            evaluation, in_line = self._local(message, response, context, thread_id)
+        if in_line:
+            evaluation = await self._agrade(message, response)
+        self.stats.record(self.policy, time.perf_counter() - start, in_line)
+        return evaluation
+
+    def speculative_grade(self, thread_id: str, timeout: float = SPECULATIVE_GRADE_TIMEOUT_S) -> Optional[Evaluation]:
+        """Wait for the background grade of a thread's last answer; None when there is none."""
+        future = self._pending.pop(thread_id)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning("Speculative grading failed: %s", e)
+            return None
+
+    async def aspeculative_grade(self, thread_id: str,
+                                 timeout: float = SPECULATIVE_GRADE_TIMEOUT_S) -> Optional[Evaluation]:
+        """Async speculative_grade()."""
+        future = self._pending.pop(thread_id)
+        if future is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except Exception as e:
+            logger.warning("Speculative grading failed: %s", e)
+            return None
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+
+def get_evaluator() -> AnswerEvaluator:
+    """Process-wide evaluator for EVALUATION_POLICY."""
+    global _evaluator
+    if _evaluator is None:
+        with _evaluator_lock:
+            if _evaluator is None:
+                _evaluator = AnswerEvaluator()
+    return _evaluator
+
+
+def _reopen(evaluation: Evaluation) -> dict:
+    logger.info("Speculative grade POOR, retrying: %s", evaluation.analysis)
+    get_evaluator().stats.record_retry("speculative")
+    return {"answer_quality": "POOR", "reasoning_chain": [evaluation.analysis]}
+
+
+def retry_if_poor(workflow, config) -> bool:
+    """After a speculative run has ended, wait for its background grade. On GOOD, the answer goes
+    into the answer cache. On POOR, it is dropped from the cache and, if the request's retry budget
+    allows, the run is reopened at the answer node's retry edge, so resuming it (invoke or stream
+    with None as input) retries.
+    Returns:
+        Whether the run was reopened.
+    """
+    evaluation = get_evaluator().speculative_grade(str(config["configurable"]["thread_id"]))
+    if evaluation is None:
+        return False
+    values = workflow.get_state(config).values
+    if evaluation.tool != "POOR":
+        store_confirmed_answer(values)
+        return False
+    get_answer_cache().discard(values["message"][0])
+    if budget_exhausted(values):
+        return False
+    workflow.update_state(config, _reopen(evaluation), as_node="answer")
+    return True
+
+
+async def aretry_if_poor(workflow, config) -> bool:
+    """Async retry_if_poor()."""
+    evaluation = await get_evaluator().aspeculative_grade(str(config["configurable"]["thread_id"]))
+    if evaluation is None:
+        return False
+    values = (await workflow.aget_state(config)).values
+    if evaluation.tool != "POOR":
+        await astore_confirmed_answer(values)
+        return False
+    get_answer_cache().discard(values["message"][0])
+    if budget_exhausted(values):
+        return False
+    await workflow.aupdate_state(config, _reopen(evaluation), as_node="answer")
+    return True
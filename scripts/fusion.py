@@ -0,0 +1,36 @@
+import os
+from typing import Any, Dict, List, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ----- Configuration -----
+# The usual RRF constant: higher values flatten the difference between top and lower ranks.
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[List[Dict[str, Any]]], key: str = "sku",
+                           k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Merge ranked result lists into one list, deduplicated by key.
+
+    Each item scores sum(1 / (k + rank)) over the lists it appears in, so items
+    found by several retrievers rise to the top. Items without a key are kept
+    as they are. When an item is in several lists, the fields of the earlier
+    list win.
+    Args:
+        ranked_lists: Result lists, each ordered best first.
+        key: The field identifying an item across lists.
+        k: The RRF constant.
+    Returns:
+        The merged items, best first, each with its "rrf_score".
+    """
+    scores: Dict[Any, float] = {}
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for results in ranked_lists:
+        for rank, item in enumerate(results, start=1):
+            identity = item.get(key) or id(item)
+            scores[identity] = scores.get(identity, 0.0) + 1.0 / (k + rank)
+            merged[identity] = {**item, **merged.get(identity, {})}
+    ranked = sorted(merged, key=lambda identity: scores[identity], reverse=True)
+    return [dict(merged[identity], rrf_score=scores[identity]) for identity in ranked]
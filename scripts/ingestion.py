@@ -0,0 +1,242 @@
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from scripts.tokens import estimate_tokens
+
+# (vector id, text to embed, metadata)
+Item = Tuple[str, str, Dict[str, Any]]
+# (vector id, embedding, metadata)
+Record = Tuple[str, List[float], Dict[str, Any]]
+
+
+class TokenBucketLimiter:
+    """Adaptive request/token rate limiter for an API with RPM and TPM quotas.
+
+    Two token buckets (requests and tokens) refill continuously at the quota
+    rate scaled by an adaptive factor. A 429 halves the factor and pauses all
+    callers for the server's Retry-After; each success lets the factor recover.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 min_factor: float = 0.1, recovery_step: float = 0.05):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.min_factor = min_factor
+        self.recovery_step = recovery_step
+        self.factor = 1.0
+        # One second of burst capacity per bucket, and always room for one request: below 60 RPM
+        # a second's worth is less than one request, which could then never be admitted.
+        self.request_capacity = max(1.0, self.request_rate)
+        self.token_capacity = max(1.0, self.token_rate)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._paused_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.request_rate * self.factor)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_rate * self.factor)
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request costing `tokens` tokens fits in both buckets."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                # A request larger than the bucket is let through once the bucket is full.
+                needed_tokens = min(tokens, self.token_capacity)
+                if now >= self._paused_until and self._requests >= 1 and self._tokens >= needed_tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait_s = max(
+                    self._paused_until - now,
+                    (1 - self._requests) / (self.request_rate * self.factor),
+                    (needed_tokens - self._tokens) / (self.token_rate * self.factor),
+                    0.001,
+                )
+            time.sleep(wait_s)
+
+    def penalize(self, retry_after: Optional[float] = None):
+        """Record a 429: slow down and pause everyone until the server's retry window passes."""
+        with self._lock:
+            self.rate_limited += 1
+            self.factor = max(self.min_factor, self.factor / 2)
+            pause = retry_after if retry_after is not None else 1.0 / (self.request_rate * self.factor)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def reward(self):
+        """Record a success: recover toward the full quota rate."""
+        with self._lock:
+            self.factor = min(1.0, self.factor + self.recovery_step)
+
+
+def _retry_after(error: RateLimitError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def rate_limited_embedder(create_embeddings: Callable[[List[str]], List[List[float]]],
+                          limiter: TokenBucketLimiter, max_retries: int = 6) -> Callable[[List[str]], List[List[float]]]:
+    """Wrap a raw batch-embedding call with rate limiting and retries.
+    Args:
+        create_embeddings: Calls the embedding API for a batch of texts.
+        limiter: Shared limiter that every worker acquires from before calling the API.
+        max_retries: Attempts per batch before giving up.
+    Returns:
+        A function with the same signature that respects the limiter.
+    """
+    def embed(texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        backoff = 1.0
+        for attempt in range(max_retries):
+            limiter.acquire(tokens)
+            try:
+                vectors = create_embeddings(texts)
+                limiter.reward()
+                return vectors
+            except RateLimitError as e:
+                limiter.penalize(_retry_after(e))
+                print(f"Rate limited, backing off (attempt {attempt + 1}/{max_retries})")
+                if attempt == max_retries - 1:
+                    raise
+            except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == max_retries - 1:
+                    raise
+                print(f"Error: {str(e)}. Retrying in {backoff} seconds... (Attempt {attempt + 1}/{max_retries})")
+                time.sleep(backoff)
+                backoff *= 2
+    return embed
+
+
+@dataclass
+class IngestionStats:
+    products: int = 0
+    batches: int = 0
+    upserts: int = 0
+    elapsed: float = 0.0
+    # The upsert thread and the embedding loop both count into the same stats
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, products: int = 0, batches: int = 0, upserts: int = 0):
+        with self._lock:
+            self.products += products
+            self.batches += batches
+            self.upserts += upserts
+
+    @property
+    def products_per_second(self) -> float:
+        return self.products / self.elapsed if self.elapsed else 0.0
+
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """Embeds items with a bounded pool of concurrent requests and upserts them as they arrive.
+
+    Embedding batches run on a thread pool (at most `concurrency` in flight) and their
+    results flow through a bounded queue to a single upsert thread, so writes to the
+    vector index overlap with embedding and a slow sink applies backpressure.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]],
+                 upsert: Callable[[List[Record]], None], concurrency: int = 4,
+                 batch_size: int = 100, upsert_batch_size: int = 100, queue_size: int = 8):
+        """
+        Args:
+            embed: Embeds a batch of texts, returning vectors in order.
+            upsert: Writes a batch of (id, vector, metadata) records to the index.
+            concurrency: Maximum number of embedding requests in flight.
+            batch_size: Texts per embedding request.
+            upsert_batch_size: Records per upsert call.
+            queue_size: Embedded batches buffered between the embedding pool and the upsert thread.
+        """
+        self.embed = embed
+        self.upsert = upsert
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_size = queue_size
+
+    def _upsert_worker(self, records: "queue.Queue", stats: IngestionStats, errors: list):
+        pending: List[Record] = []
+        while True:
+            batch = records.get()
+            if batch is _DONE:
+                break
+            if errors:
+                continue  # drain the queue so producers never block on a dead consumer
+            pending.extend(batch)
+            try:
+                while len(pending) >= self.upsert_batch_size:
+                    self.upsert(pending[:self.upsert_batch_size])
+                    del pending[:self.upsert_batch_size]
+                    stats.add(upserts=1)
+            except Exception as e:
+                errors.append(e)
+        if pending and not errors:
+            try:
+                self.upsert(pending)
+                stats.add(upserts=1)
+            except Exception as e:
+                errors.append(e)
+
+    def _embed_batch(self, batch: List[Item]) -> List[Record]:
+        vectors = self.embed([text for _, text, _ in batch])
+        return [(item_id, vector, metadata) for (item_id, _, metadata), vector in zip(batch, vectors)]
+
+    def run(self, items: Iterable[Item]) -> IngestionStats:
+        """Embed and upsert every item; returns throughput stats."""
+        stats = IngestionStats()
+        start = time.perf_counter()
+        records: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        errors: list = []
+        consumer = threading.Thread(target=self._upsert_worker, args=(records, stats, errors), daemon=True)
+        consumer.start()
+
+        def drain(futures, return_when):
+            done, not_done = wait(futures, return_when=return_when)
+            for future in done:
+                batch = future.result()
+                stats.add(products=len(batch), batches=1)
+                records.put(batch)
+            return not_done
+
+        iterator = iter(items)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+                in_flight = set()
+                while not errors:
+                    batch = list(islice(iterator, self.batch_size))
+                    if not batch:
+                        break
+                    in_flight.add(pool.submit(self._embed_batch, batch))
+                    if len(in_flight) >= self.concurrency:
+                        in_flight = drain(in_flight, FIRST_COMPLETED)
+                if in_flight:
+                    drain(in_flight, "ALL_COMPLETED")
+        finally:
+            records.put(_DONE)
+            consumer.join()
+        if errors:
+            raise errors[0]
+
+        stats.elapsed = time.perf_counter() - start
+        print(f"Ingested {stats.products} products in {stats.elapsed:.2f}s "
+              f"({stats.products_per_second:.1f} products/sec, {stats.batches} embedding batches, "
+              f"{stats.upserts} upserts)")
+        return stats
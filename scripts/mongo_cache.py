@@ -0,0 +1,94 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from scripts.answer_cache import normalize_query
+from scripts.cache import LRUCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+MONGO_CACHE_ENABLED = os.getenv("MONGO_CACHE_ENABLED", "true").lower() == "true"
+MONGO_QUERY_CACHE_SIZE = int(os.getenv("MONGO_QUERY_CACHE_SIZE", "1000"))
+MONGO_QUERY_CACHE_TTL = float(os.getenv("MONGO_QUERY_CACHE_TTL", "3600"))
+MONGO_RESULT_CACHE_SIZE = int(os.getenv("MONGO_RESULT_CACHE_SIZE", "500"))
+MONGO_RESULT_CACHE_TTL = float(os.getenv("MONGO_RESULT_CACHE_TTL", "300"))
+
+
+def query_fingerprint(mongo_query: dict) -> str:
+    """Canonical hash of a query dict: key order and formatting do not matter."""
+    canonical = json.dumps(mongo_query, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MongoRetrievalCache:
+    """Two-level cache for MongoDB retrieval.
+
+    The first level maps normalized retrieval text to the generated query dict, so a
+    repeat skips query generation. The second maps the query's canonical hash to the
+    retrieved results, so a repeat also skips the database. Both levels are LRU and
+    TTL bounded, and both are dropped when the catalog version changes.
+    """
+
+    def __init__(self, query_size: int = MONGO_QUERY_CACHE_SIZE, query_ttl: float = MONGO_QUERY_CACHE_TTL,
+                 result_size: int = MONGO_RESULT_CACHE_SIZE, result_ttl: float = MONGO_RESULT_CACHE_TTL):
+        self.queries = LRUCache(maxsize=query_size, ttl=query_ttl)
+        self.results = LRUCache(maxsize=result_size, ttl=result_ttl)
+        self._catalog_version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, catalog_version: str):
+        with self._lock:
+            if catalog_version != self._catalog_version:
+                if self._catalog_version is not None:
+                    logger.info("Catalog version changed to %r, dropping cached Mongo queries and results",
+                                catalog_version)
+                self.queries.clear()
+                self.results.clear()
+                self._catalog_version = catalog_version
+
+    def get_query(self, text: str, catalog_version: str) -> Optional[dict]:
+        self._check_version(catalog_version)
+        mongo_query = self.queries.get(normalize_query(text))
+        return copy.deepcopy(mongo_query) if mongo_query is not None else None
+
+    def set_query(self, text: str, catalog_version: str, mongo_query: dict):
+        self._check_version(catalog_version)
+        self.queries.set(normalize_query(text), copy.deepcopy(mongo_query))
+
+    def get_results(self, mongo_query: dict, catalog_version: str) -> Optional[dict]:
+        self._check_version(catalog_version)
+        return self.results.get(query_fingerprint(mongo_query))
+
+    def set_results(self, mongo_query: dict, catalog_version: str, results: dict):
+        self._check_version(catalog_version)
+        self.results.set(query_fingerprint(mongo_query), results)
+
+    def clear(self):
+        self.queries.clear()
+        self.results.clear()
+
+    def stats(self) -> dict:
+        return {"query": self.queries.stats(), "result": self.results.stats()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_mongo_cache() -> MongoRetrievalCache:
+    """Process-wide MongoDB query/result cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MongoRetrievalCache()
+    return _cache
@@ -0,0 +1,339 @@
+"""Index bootstrapper and search-field loader for the MongoDB products collection.
+
+Usage:
+    python -m scripts.mongo_indexes                      # create the indexes
+    python -m scripts.mongo_indexes --load ./fixture/products.json
+    python -m scripts.mongo_indexes --backfill           # add search fields to documents loaded elsewhere
+    python -m scripts.mongo_indexes --explain            # print the plans of the common query shapes
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from itertools import islice
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, TEXT, ReplaceOne, UpdateOne
+
+from scripts.catalog import DEPARTMENTS, current_catalog_version, iter_products
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+# Fraction of retrieval queries whose explain() output is appended to the explain log.
+MONGO_EXPLAIN_SAMPLE_RATE = float(os.getenv("MONGO_EXPLAIN_SAMPLE_RATE", "0.01"))
+MONGO_EXPLAIN_LOG = os.getenv("MONGO_EXPLAIN_LOG", "./data/mongo_explain.jsonl")
+MONGO_WRITE_BATCH_SIZE = int(os.getenv("MONGO_WRITE_BATCH_SIZE", "500"))
+# Seconds the name tokens read from the collection are reused for the same catalog version
+MONGO_VOCABULARY_TTL_S = float(os.getenv("MONGO_VOCABULARY_TTL_S", "300"))
+
+# Compound indexes matching the query shapes the compiler and the LLM generate:
+# equality filters first, then the sort key, then range-filtered fields.
+INDEXES = [
+    ([("sku", ASCENDING)], {"name": "sku_unique", "unique": True}),
+    ([("name_tokens", ASCENDING), ("price", DESCENDING)], {"name": "name_tokens_price"}),
+    ([("keywords", ASCENDING), ("popularity_order", ASCENDING)], {"name": "keywords_popularity"}),
+    ([("brand", ASCENDING), ("popularity_order", ASCENDING)], {"name": "brand_popularity"}),
+    ([("department", ASCENDING), ("popularity_order", ASCENDING)], {"name": "department_popularity"}),
+    ([("empty", ASCENDING), ("popularity_order", ASCENDING)], {"name": "empty_popularity"}),
+    ([("empty", ASCENDING), ("price", DESCENDING)], {"name": "empty_price"}),
+    ([("popularity_order", ASCENDING)], {"name": "popularity"}),
+    ([("price", DESCENDING)], {"name": "price"}),
+    ([("pricePer", ASCENDING)], {"name": "price_per"}),
+    ([("name", TEXT), ("text", TEXT)], {"name": "name_text", "weights": {"name": 10, "text": 1}}),
+]
+
+# Representative query shapes checked by --explain.
+EXPLAIN_QUERIES = [
+    "Find mozzarella under $50",
+    "most expensive cheese",
+    "What cheese does Galbani make?",
+    "all Sliced Cheeses in stock",
+    "how many brands have cheese under $10?",
+    "top 5 most popular cheeses",
+]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PLAIN_PATTERN = re.compile(r"^[A-Za-z0-9 ]+$")
+
+
+def search_tokens(text: str) -> List[str]:
+    """Normalized lowercase tokens of a text, with a singular form added for plurals."""
+    tokens = []
+    for token in _WORD.findall((text or "").lower()):
+        tokens.append(token)
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            tokens.append(token[:-1])
+    return list(dict.fromkeys(tokens))
+
+
+def search_fields(product: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Fields precomputed at load time so name and keyword searches are indexed equality matches."""
+    name_tokens = search_tokens(product.get("name", ""))
+    keywords = name_tokens + search_tokens(product.get("brand", "")) + search_tokens(product.get("department", ""))
+    return {"name_tokens": name_tokens, "keywords": list(dict.fromkeys(keywords))}
+
+
+def create_indexes(collection) -> List[str]:
+    """Create the compound and text indexes (a no-op for indexes that already exist)."""
+    names = []
+    for keys, options in INDEXES:
+        names.append(collection.create_index(keys, **options))
+    print(f"Indexes ready on {collection.name}: {', '.join(names)}")
+    return names
+
+
+def _batched(iterable: Iterable, size: int) -> Iterable[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_products(collection, json_path: str, batch_size: int = MONGO_WRITE_BATCH_SIZE) -> int:
+    """Upsert products by SKU with their search fields, streaming the feed in batches."""
+    loaded = 0
+    for batch in _batched(iter_products(json_path), batch_size):
+        operations = []
+        for product in batch:
+            document = {key: value for key, value in product.items() if key != "_id"}
+            document.update(search_fields(document))
+            operations.append(ReplaceOne({"sku": document["sku"]}, document, upsert=True))
+        collection.bulk_write(operations, ordered=False)
+        loaded += len(operations)
+    print(f"Loaded {loaded} products into {collection.name}")
+    return loaded
+
+
+def backfill_search_fields(collection, batch_size: int = MONGO_WRITE_BATCH_SIZE) -> int:
+    """Add search fields to documents that were loaded without them."""
+    cursor = collection.find({"name_tokens": {"$exists": False}}, {"name": 1, "brand": 1, "department": 1})
+    updated = 0
+    for batch in _batched(cursor, batch_size):
+        collection.bulk_write(
+            [UpdateOne({"_id": document["_id"]}, {"$set": search_fields(document)}) for document in batch],
+            ordered=False,
+        )
+        updated += len(batch)
+    print(f"Backfilled search fields on {updated} documents")
+    return updated
+
+
+def whole_tokens(tokens: Iterable[str]) -> FrozenSet[str]:
+    """The name tokens a substring regex can only match as a whole token: no other token
+    contains them, except their own plural ("cheddars" is indexed as "cheddar" too), so the
+    regex cannot match inside a longer word such as "mozz" in "mozzarella"."""
+    tokens = frozenset(tokens)
+    inside = set()
+    for token in tokens:
+        plural = len(token) > 3 and token.endswith("s")
+        for start in range(len(token)):
+            for end in range(start + 1, len(token) + 1):
+                if (start, end) != (0, len(token)) and not (plural and (start, end) == (0, len(token) - 1)):
+                    inside.add(token[start:end])
+    return tokens - inside
+
+
+# collection full name -> (catalog version, checked at, whole name tokens or None)
+_vocabularies: Dict[str, tuple] = {}
+
+
+def _cached_vocabulary(collection):
+    entry = _vocabularies.get(collection.full_name)
+    version = current_catalog_version()
+    if entry is not None and entry[0] == version and time.monotonic() - entry[1] < MONGO_VOCABULARY_TTL_S:
+        return True, entry[2]
+    return False, version
+
+
+def _store_vocabulary(collection, version: str, tokens: list) -> Optional[FrozenSet[str]]:
+    # No document carries name_tokens: the collection was loaded without search fields
+    vocabulary = whole_tokens(tokens) if tokens else None
+    _vocabularies[collection.full_name] = (version, time.monotonic(), vocabulary)
+    return vocabulary
+
+
+def name_vocabulary(collection) -> Optional[FrozenSet[str]]:
+    """The whole name tokens (see whole_tokens) of the collection being queried, or None when it
+    has no search fields. Re-read when the catalog version changes, and at least every
+    MONGO_VOCABULARY_TTL_S so search fields added later are picked up."""
+    cached, value = _cached_vocabulary(collection)
+    if cached:
+        return value
+    return _store_vocabulary(collection, value, collection.distinct("name_tokens"))
+
+
+async def aname_vocabulary(collection) -> Optional[FrozenSet[str]]:
+    """name_vocabulary() for an async collection."""
+    cached, value = _cached_vocabulary(collection)
+    if cached:
+        return value
+    return _store_vocabulary(collection, value, await collection.distinct("name_tokens"))
+
+
+def _plain_pattern(condition: Any) -> Optional[str]:
+    """The pattern of an unanchored, case-insensitive regex condition without metacharacters."""
+    if not isinstance(condition, dict) or set(condition) - {"$regex", "$options"}:
+        return None
+    pattern = condition.get("$regex")
+    if not isinstance(pattern, str) or "i" not in condition.get("$options", "") or not _PLAIN_PATTERN.match(pattern):
+        return None
+    return pattern.strip()
+
+
+def optimize_filter(filter_conditions: Dict[str, Any], vocabulary: Optional[FrozenSet[str]]) -> Dict[str, Any]:
+    """Rewrite regex conditions into indexable equality matches that select the same products.
+
+    A department regex becomes an $in over the known departments it matches. With
+    search fields loaded, a plain-word name regex whose words are whole name tokens
+    of the collection becomes an equality match on name_tokens; a phrase becomes
+    $all on its tokens and keeps the regex, which still requires the words in order.
+    Args:
+        vocabulary: name_vocabulary() of the collection; None when it has no search fields.
+    """
+    optimized = {}
+    for field, condition in (filter_conditions or {}).items():
+        if field in ("$and", "$or", "$nor") and isinstance(condition, list):
+            optimized[field] = [optimize_filter(clause, vocabulary) for clause in condition]
+            continue
+        pattern = _plain_pattern(condition)
+        matching = [department for department in DEPARTMENTS if pattern and pattern.lower() in department.lower()]
+        tokens = _WORD.findall(pattern.lower()) if pattern else []
+        if field == "department" and matching:
+            optimized[field] = matching[0] if len(matching) == 1 else {"$in": matching}
+        elif field == "name" and tokens and vocabulary is not None and "name_tokens" not in filter_conditions:
+            if not all(token in vocabulary for token in tokens):
+                optimized[field] = condition
+            elif len(tokens) == 1:
+                optimized["name_tokens"] = tokens[0]
+            else:
+                optimized["name_tokens"] = {"$all": tokens}
+                optimized[field] = condition
+        else:
+            optimized[field] = condition
+    return optimized
+
+
+def _walk_plan(plan: Dict[str, Any], stages: List[str], indexes: List[str]):
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    if plan.get("indexName"):
+        indexes.append(plan["indexName"])
+    for key in ("inputStage", "queryPlan"):
+        _walk_plan(plan.get(key), stages, indexes)
+    for child in plan.get("inputStages", []):
+        _walk_plan(child, stages, indexes)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce explain() output to the winning plan's stages, indexes and execution counters."""
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # Aggregations nest the planner under their first ($cursor) stage.
+        for stage in explain.get("stages", []):
+            planner = stage.get("$cursor", {}).get("queryPlanner")
+            if planner:
+                break
+    stages, indexes = [], []
+    _walk_plan((planner or {}).get("winningPlan", {}), stages, indexes)
+    execution = explain.get("executionStats", {})
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collection_scan": "COLLSCAN" in stages,
+        "docs_examined": execution.get("totalDocsExamined"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "returned": execution.get("nReturned"),
+        "time_ms": execution.get("executionTimeMillis"),
+    }
+
+
+_log_lock = threading.Lock()
+
+
+def explain_query(collection, mongo_query: Dict[str, Any], filter_conditions: Dict[str, Any]) -> Dict[str, Any]:
+    if mongo_query.get("query_type") == "aggregate":
+        pipeline = ([{"$match": filter_conditions}] if filter_conditions else []) + list(
+            mongo_query.get("aggregation_pipeline") or [])
+        explain = collection.database.command("aggregate", collection.name, pipeline=pipeline, explain=True)
+    else:
+        cursor = collection.find(filter_conditions, mongo_query.get("projection"))
+        if mongo_query.get("sort_conditions"):
+            cursor = cursor.sort(list(mongo_query["sort_conditions"].items()))
+        if mongo_query.get("limit"):
+            cursor = cursor.limit(mongo_query["limit"])
+        explain = cursor.explain()
+    return summarize_explain(explain)
+
+
+def explain_sampled() -> bool:
+    """Whether this query is in the sampled fraction whose plan gets logged."""
+    return MONGO_EXPLAIN_SAMPLE_RATE > 0 and random.random() < MONGO_EXPLAIN_SAMPLE_RATE
+
+
+def maybe_log_explain(collection, mongo_query: Dict[str, Any], filter_conditions: Dict[str, Any]):
+    """For a sampled fraction of queries, append the explain() summary to the explain log in the background."""
+    if explain_sampled():
+        log_explain(collection, mongo_query, filter_conditions)
+
+
+def log_explain(collection, mongo_query: Dict[str, Any], filter_conditions: Dict[str, Any]):
+    """Append the explain() summary of a query to the explain log from a background thread (sync collection)."""
+    def run():
+        try:
+            record = {"ts": time.time(), "filter": filter_conditions, "query_type": mongo_query.get("query_type"),
+                      **explain_query(collection, mongo_query, filter_conditions)}
+        except Exception as e:
+            logger.warning("explain() sampling failed: %s", e)
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(MONGO_EXPLAIN_LOG)), exist_ok=True)
+        with _log_lock, open(MONGO_EXPLAIN_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        if record["collection_scan"]:
+            logger.warning("Sampled Mongo query used a collection scan: %s", filter_conditions)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def main():
+    from scripts.clients import get_mongo_collection
+    from scripts.query_compiler import compile_query
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", metavar="JSON_PATH", help="Upsert the product feed with search fields")
+    parser.add_argument("--backfill", action="store_true", help="Add search fields to existing documents")
+    parser.add_argument("--explain", action="store_true", help="Print the plans of the common query shapes")
+    args = parser.parse_args()
+
+    collection = get_mongo_collection()
+    if args.load:
+        load_products(collection, args.load)
+    if args.backfill:
+        backfill_search_fields(collection)
+    create_indexes(collection)
+
+    if args.explain:
+        vocabulary = name_vocabulary(collection)
+        for query in EXPLAIN_QUERIES:
+            mongo_query = compile_query(query)
+            if mongo_query is None:
+                continue
+            filter_conditions = optimize_filter(mongo_query.get("filter_conditions"), vocabulary)
+            summary = explain_query(collection, mongo_query, filter_conditions)
+            plan = "COLLSCAN" if summary["collection_scan"] else ",".join(summary["indexes"]) or "-"
+            print(f"{plan:<32} examined {summary['docs_examined']!s:>6}  {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,52 @@
-import os
-from dotenv import load_dotenv
-from pymongo import MongoClient
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai.chat_models import ChatOpenAI
 from langchain.output_parsers import PydanticOutputParser
 import json
+import logging
+import os
 from typing import Optional
 
 from scripts.schema import PlanExecute
+from scripts.clients import get_async_mongo_collection, get_chat_model, get_mongo_collection
+from scripts.chains import get_chain, register_chain
+from scripts.query_compiler import QUERY_COMPILER_ENABLED, compile_query
+from scripts.mongo_cache import MONGO_CACHE_ENABLED, get_mongo_cache
+from scripts.catalog import current_catalog_version
+from scripts.mongo_indexes import (aname_vocabulary, explain_sampled, log_explain, maybe_log_explain, name_vocabulary,
+                                   optimize_filter)
+from scripts.tokens import estimate_tokens
+from scripts.context_encoder import encode_products, encode_table, estimate_product_tokens, product_references
+from scripts.context_store import get_context_store
+from scripts.tracing import span
 
-def MongoDBretrievalNode(state: PlanExecute):
-    """Retrieve the relevant information from the MongoDB database using ChatGPT to generate queries.
-    Args:
-        state: The current state of the plan execution.
-    Returns:
-        The updated state of the plan execution.
-    """
-    # Load environment variables
-    load_dotenv()
-    
-    # Connect to MongoDB
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    db = client[os.getenv("MONGODB_DB")]
-    collection = db[os.getenv("MONGODB_COLLECTION")]
-
-    # Define the query schema
-    class MongoQuery(BaseModel):
-        """Schema for MongoDB query generation."""
-        filter_conditions: dict = Field(description="MongoDB filter conditions")
-        sort_conditions: Optional[dict] = Field(description="MongoDB sort conditions", default=None)
-        projection: Optional[dict] = Field(description="Fields to include in results", default=None)
-
-    # Create the parser
-    parser = PydanticOutputParser(pydantic_object=MongoQuery)
-
-    # Create the prompt template
-    prompt_template = """
+logger = logging.getLogger(__name__)
+
+
+# ----- Configuration -----
+# Products fetched for the answer; the answer prompt lists at most 30.
+MONGODB_PAGE_SIZE = int(os.getenv("MONGODB_PAGE_SIZE", "30"))
+# Upper bound on the tokens of retrieved context passed to the answer LLM.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+LIGHT_PROJECTION = {
+    "sku": 1, "name": 1, "brand": 1, "price": 1, "pricePer": 1, "department": 1,
+    "weight_each": 1, "weight_unit": 1, "_id": 0,
+}
+
+
+# Define the query schema
+class MongoQuery(BaseModel):
+    """Schema for MongoDB query generation."""
+    filter_conditions: dict = Field(description="MongoDB filter conditions")
+    sort_conditions: Optional[dict] = Field(description="MongoDB sort conditions", default=None)
+    projection: Optional[dict] = Field(description="Fields to include in results", default=None)
+
+
+# Create the parser
+parser = PydanticOutputParser(pydantic_object=MongoQuery)
+
+
+MONGO_QUERY_PROMPT_TEMPLATE = """
     You are a MongoDB query generator. Given a user's message, generate a MongoDB query to find relevant information.
 
 Available fields in the database:
@@ -268,102 +278,298 @@ Important rules:
 Your query:
     """
 
+
+def create_mongo_query_chain():
     prompt = PromptTemplate(
-        template=prompt_template,
+        template=MONGO_QUERY_PROMPT_TEMPLATE,
         input_variables=["message"],
         partial_variables={"format_instructions": parser.get_format_instructions()}
     )
 
     # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4")
+    llm = get_chat_model("gpt-4", temperature=0)
+    return prompt | llm
 
-    # Generate the query
-    query = state["query_to_retrieve_or_answer"]
-    prompt_value = prompt.format(message=query)
-    response = llm.invoke(prompt_value)
-    print("Response:")
-    print(response)
-    print("--------------------------------")
-    mongo_query = json.loads(response.content)
-    print("MongoDB query:")
-    print(mongo_query)
-    print("--------------------------------")
-    results = []
-    # Execute the query
-    if mongo_query.get("query_type") == "aggregate":
-        pipeline = []
-        if mongo_query.get("filter_conditions"):
-            pipeline.append({"$match": mongo_query.get("filter_conditions")})
-        
-        if mongo_query.get("aggregation_pipeline"):
-            pipeline.extend(mongo_query.get("aggregation_pipeline"))
-        
-        if mongo_query.get("sort_conditions"):
-            pipeline.append({"$sort": mongo_query.get("sort_conditions")})
-        
-        if mongo_query.get("limit") and mongo_query.get("limit") > 0:
-            pipeline.append({"$limit": mongo_query.limit})
-
-        results = list(collection.aggregate(pipeline))
+
+register_chain("mongo_query", create_mongo_query_chain)
+
+
+def generate_mongo_query(query: str) -> dict:
+    """Compile the query locally when possible, otherwise ask ChatGPT to generate it.
+    Args:
+        query: The retrieval query chosen by the reasoning node.
+    Returns:
+        The MongoDB query dict.
+    """
+    mongo_query = compile_query(query) if QUERY_COMPILER_ENABLED else None
+    if mongo_query is None:
+        mongo_query = _parse_generated_query(get_chain("mongo_query").invoke({"message": query}))
     else:
-        cursor = collection.find(
-            mongo_query.get("filter_conditions"),
-            mongo_query.get("projection") or {
-                "name": 1,
-                "brand": 1,
-                "price": 1,
-                "pricePer": 1,
-                "department": 1,
-                "weight_each": 1,
-                "weight_unit": 1,
-                "text": 1,
-                "showImage": 1,
-                "_id": 0
-            }
+        logger.debug("Compiled MongoDB query locally")
+    return mongo_query
+
+
+async def agenerate_mongo_query(query: str) -> dict:
+    """Async generate_mongo_query()."""
+    mongo_query = compile_query(query) if QUERY_COMPILER_ENABLED else None
+    if mongo_query is None:
+        mongo_query = _parse_generated_query(await get_chain("mongo_query").ainvoke({"message": query}))
+    else:
+        logger.debug("Compiled MongoDB query locally")
+    return mongo_query
+
+
+def _parse_generated_query(response) -> dict:
+    logger.debug("Generated MongoDB query: %s", response.content)
+    return json.loads(response.content)
+
+
+def fit_to_budget(entries: list, budget: int, cost=estimate_product_tokens) -> list:
+    """Keep entries, in order, until the token budget is spent."""
+    kept, used = [], 0
+    for entry in entries:
+        used += cost(entry)
+        if used > budget:
+            break
+        kept.append(entry)
+    return kept
+
+
+def _aggregate_pipeline(mongo_query: dict, filter_conditions: dict, vocabulary) -> list:
+    pipeline = []
+    if filter_conditions:
+        pipeline.append({"$match": filter_conditions})
+
+    if mongo_query.get("aggregation_pipeline"):
+        pipeline.extend(
+            {"$match": optimize_filter(stage["$match"], vocabulary)} if "$match" in stage else stage
+            for stage in mongo_query.get("aggregation_pipeline")
         )
 
-        if mongo_query.get("sort_conditions"):
-            cursor = cursor.sort(list(mongo_query.get("sort_conditions").items()))
-        if mongo_query.get("limit") and mongo_query.get("limit") > 0:
-            cursor = cursor.limit(mongo_query.get("limit"))
-
-        results = list(cursor)
-    # print("Results:")
-    # print(results)
-    # print("--------------------------------")
-
-    # Format the results
-    formatted_results = []
-    if mongo_query.get("query_type") == "find":
-        formatted_results.append({
-            "the number of products": len(results)  # You might want to format this differently based on the aggregation
-        }) 
-    for result in results:
-        if mongo_query.get("query_type") == "aggregate":
-            formatted_result = {
-                "result": result  # You might want to format this differently based on the aggregation
-            }
-        else:
-            formatted_result = {
-                "name": result.get("name", "N/A"),
-                "brand": result.get("brand", "N/A"),
-                "price": f"${result.get('price', 'N/A')}",
-                "price_per_unit": f"${result.get('pricePer', 'N/A')}/{result.get('weight_unit', 'unit')}",
-                "department": result.get("department", "N/A"),
-                "weight": f"{result.get('weight_each', 'N/A')} {result.get('weight_unit', 'units')}",
-                "description": result.get("text", "N/A"),
-                "image": result.get("showImage", "N/A")
-            }
-        formatted_results.append(formatted_result)
-    
-    # Update the state with the results
-    # print("Formatted results:")
-    # print(len(formatted_results))
-    # print(formatted_results)
-    state["curr_context"]=[{"role": "system", "content": str(formatted_results)}]
-    if state["tool"] == "combined_search":
-        return {
-            "curr_context": state["curr_context"]
-        }
+    if mongo_query.get("sort_conditions"):
+        pipeline.append({"$sort": mongo_query.get("sort_conditions")})
+
+    limit = mongo_query.get("limit") or 0
+    if limit > 0:
+        pipeline.append({"$limit": limit})
+    return pipeline
+
+
+def _aggregate_results(documents: list) -> dict:
+    results = [
+        {("group" if key == "_id" else key): value for key, value in result.items()}
+        for result in documents
+    ]
+    rows = fit_to_budget(results, CONTEXT_TOKEN_BUDGET, cost=lambda row: estimate_tokens(str(row)))
+    return {"query_type": "aggregate", "rows": rows, "omitted": len(results) - len(rows)}
+
+
+def _count_kwargs(mongo_query: dict) -> dict:
+    limit = mongo_query.get("limit") or 0
+    return {"limit": limit} if limit > 0 else {}
+
+
+def _first_page(collection, mongo_query: dict, filter_conditions: dict):
+    """Cursor over the lightweight fields of the first page."""
+    limit = mongo_query.get("limit") or 0
+    page_size = min(limit, MONGODB_PAGE_SIZE) if limit > 0 else MONGODB_PAGE_SIZE
+    cursor = collection.find(filter_conditions, LIGHT_PROJECTION)
+    if mongo_query.get("sort_conditions"):
+        cursor = cursor.sort(list(mongo_query.get("sort_conditions").items()))
+    return cursor.limit(page_size)
+
+
+def _details_query(products: list):
+    """The filter and projection of the phase-two query, or None when nothing more fits."""
+    budget = CONTEXT_TOKEN_BUDGET - sum(estimate_product_tokens(product) for product in products)
+    skus = [product["sku"] for product in products if product.get("sku")]
+    if not skus or budget <= 0:
+        return None
+    return {"sku": {"$in": skus}}, {"sku": 1, "text": 1, "showImage": 1, "href": 1, "_id": 0}
+
+
+def _attach_details(products: list, documents: list):
+    budget = CONTEXT_TOKEN_BUDGET - sum(estimate_product_tokens(product) for product in products)
+    details = {document["sku"]: document for document in documents}
+    for product in products:
+        document = details.get(product.get("sku"))
+        if document is None:
+            continue
+        cost = estimate_tokens(document.get("text", ""))
+        if cost > budget:
+            break
+        product.update({"description": document.get("text"), "image": document.get("showImage"),
+                        "href": document.get("href")})
+        budget -= cost
+
+
+def run_mongo_query(mongo_query: dict) -> dict:
+    """Execute the query against the products collection.
+
+    Find queries run in two phases: the total is counted server-side and lightweight
+    fields are fetched for the first page only; descriptions and images are then
+    fetched for the products that fit in the context token budget.
+    Args:
+        mongo_query: The MongoDB query dict.
+    Returns:
+        The results, ready for encode_mongo_results.
+    """
+    # Shared, pooled connection to the products collection
+    collection = get_mongo_collection()
+    # Regex conditions are rewritten to indexed equality matches where that is equivalent
+    vocabulary = name_vocabulary(collection)
+    filter_conditions = optimize_filter(mongo_query.get("filter_conditions"), vocabulary)
+    maybe_log_explain(collection, mongo_query, filter_conditions)
+
+    if mongo_query.get("query_type") == "aggregate":
+        pipeline = _aggregate_pipeline(mongo_query, filter_conditions, vocabulary)
+        return dict(_aggregate_results(list(collection.aggregate(pipeline))), filter_conditions=filter_conditions)
+
+    # Phase 1: the total and the lightweight fields of the first page
+    total = collection.count_documents(filter_conditions, **_count_kwargs(mongo_query))
+    products = fit_to_budget(list(_first_page(collection, mongo_query, filter_conditions)), CONTEXT_TOKEN_BUDGET)
+
+    # Phase 2: descriptions and URLs, only for the products that will be shown
+    details_query = _details_query(products)
+    if details_query is not None:
+        _attach_details(products, list(collection.find(*details_query)))
+
+    return {"query_type": "find", "total": total, "products": products, "filter_conditions": filter_conditions}
+
+
+async def arun_mongo_query(mongo_query: dict) -> dict:
+    """Async run_mongo_query(), on the async Mongo client of the running loop."""
+    collection = get_async_mongo_collection()
+    vocabulary = await aname_vocabulary(collection)
+    filter_conditions = optimize_filter(mongo_query.get("filter_conditions"), vocabulary)
+    if explain_sampled():
+        # explain() runs on the sync client in a background thread, off the event loop
+        log_explain(get_mongo_collection(), mongo_query, filter_conditions)
+
+    if mongo_query.get("query_type") == "aggregate":
+        pipeline = _aggregate_pipeline(mongo_query, filter_conditions, vocabulary)
+        cursor = await collection.aggregate(pipeline)
+        return dict(_aggregate_results(await cursor.to_list()), filter_conditions=filter_conditions)
+
+    total = await collection.count_documents(filter_conditions, **_count_kwargs(mongo_query))
+    page = await _first_page(collection, mongo_query, filter_conditions).to_list()
+    products = fit_to_budget(page, CONTEXT_TOKEN_BUDGET)
+
+    details_query = _details_query(products)
+    if details_query is not None:
+        _attach_details(products, await collection.find(*details_query).to_list())
+
+    return {"query_type": "find", "total": total, "products": products, "filter_conditions": filter_conditions}
+
+
+def _sku_filter(filter_conditions: dict, skus: list) -> dict:
+    by_sku = {"sku": {"$in": skus}}
+    return {"$and": [filter_conditions, by_sku]} if filter_conditions else by_sku
+
+
+def filter_skus(filter_conditions: dict, skus: list) -> set:
+    """The SKUs among skus whose products match the filter conditions."""
+    cursor = get_mongo_collection().find(_sku_filter(filter_conditions, skus), {"sku": 1, "_id": 0})
+    return {document["sku"] for document in cursor}
+
+
+async def afilter_skus(filter_conditions: dict, skus: list) -> set:
+    """Async filter_skus()."""
+    cursor = get_async_mongo_collection().find(_sku_filter(filter_conditions, skus), {"sku": 1, "_id": 0})
+    return {document["sku"] for document in await cursor.to_list()}
+
+
+def encode_mongo_results(results: dict) -> str:
+    """Compact context for the answer LLM."""
+    if results["query_type"] == "aggregate":
+        context = encode_table(results["rows"], title=f"{len(results['rows'])} results:")
+        if results["omitted"]:
+            context += f"\n({results['omitted']} more results omitted)"
+        return context
+    return encode_products(results["products"], total=results["total"])
+
+
+def _result_size(results: dict) -> dict:
+    if results["query_type"] == "aggregate":
+        return {"rows": len(results["rows"])}
+    return {"total": results["total"], "products": len(results["products"])}
+
+
+def retrieve_mongo(query: str) -> dict:
+    """Generate and run the MongoDB query for a retrieval query, going through the query and result caches.
+    Args:
+        query: The retrieval query chosen by the reasoning node.
+    Returns:
+        The results, ready for encode_mongo_results.
+    """
+    cache = get_mongo_cache() if MONGO_CACHE_ENABLED else None
+    catalog_version = current_catalog_version()
+
+    # Generate the query
+    mongo_query = cache.get_query(query, catalog_version) if cache else None
+    if mongo_query is None:
+        mongo_query = generate_mongo_query(query)
+        if cache:
+            cache.set_query(query, catalog_version, mongo_query)
+    else:
+        logger.debug("Mongo query cache hit")
+    logger.debug("MongoDB query: %s", mongo_query)
+
+    results = cache.get_results(mongo_query, catalog_version) if cache else None
+    if results is None:
+        with span("mongo", mongo_query.get("query_type", "find")) as current:
+            results = run_mongo_query(mongo_query)
+            current.attributes.update(_result_size(results))
+        if cache:
+            cache.set_results(mongo_query, catalog_version, results)
+    else:
+        logger.debug("Mongo result cache hit")
+    return results
+
+
+async def aretrieve_mongo(query: str) -> dict:
+    """Async retrieve_mongo(): query generation and the database round trips are awaited."""
+    cache = get_mongo_cache() if MONGO_CACHE_ENABLED else None
+    catalog_version = current_catalog_version()
+
+    mongo_query = cache.get_query(query, catalog_version) if cache else None
+    if mongo_query is None:
+        mongo_query = await agenerate_mongo_query(query)
+        if cache:
+            cache.set_query(query, catalog_version, mongo_query)
+    else:
+        logger.debug("Mongo query cache hit")
+    logger.debug("MongoDB query: %s", mongo_query)
+
+    results = cache.get_results(mongo_query, catalog_version) if cache else None
+    if results is None:
+        with span("mongo", mongo_query.get("query_type", "find")) as current:
+            results = await arun_mongo_query(mongo_query)
+            current.attributes.update(_result_size(results))
+        if cache:
+            cache.set_results(mongo_query, catalog_version, results)
     else:
-        return state
+        logger.debug("Mongo result cache hit")
+    return results
+
+
+def MongoDBretrievalNode(state: PlanExecute):
+    """Retrieve the relevant information from the MongoDB database. Common queries are compiled
+    locally; the rest use ChatGPT to generate the query. Generated queries and their results
+    are cached, so a retry or a repeated question costs neither an LLM call nor a database round trip.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        The state keys that changed.
+    """
+    results = retrieve_mongo(state["query_to_retrieve_or_answer"])
+    # The results go to the context store; the state keeps the reference
+    return {"context_ref": get_context_store().put(encode_mongo_results(results)),
+            "references": product_references(results.get("products") or [])}
+
+
+async def MongoDBretrievalNodeAsync(state: PlanExecute):
+    """Async MongoDBretrievalNode()."""
+    results = await aretrieve_mongo(state["query_to_retrieve_or_answer"])
+    return {"context_ref": await get_context_store().aput(encode_mongo_results(results)),
+            "references": product_references(results.get("products") or [])}
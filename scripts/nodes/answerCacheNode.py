@@ -0,0 +1,47 @@
+import logging
+import time
+
+from scripts.schema import PlanExecute
+from scripts.answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from scripts.catalog import current_catalog_version
+
+logger = logging.getLogger(__name__)
+
+def answerCacheNode(state: PlanExecute):
+    """Serve the answer from the semantic answer cache when a question with the same meaning was answered before.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        The state keys that changed.
+    """
+    update = _start()
+    if not ANSWER_CACHE_ENABLED:
+        return update
+    return _serve(update, get_answer_cache().lookup(state["message"][0], current_catalog_version()))
+
+
+async def answerCacheNodeAsync(state: PlanExecute):
+    """Async answerCacheNode(): the query embedding is awaited."""
+    update = _start()
+    if not ANSWER_CACHE_ENABLED:
+        return update
+    return _serve(update, await get_answer_cache().alookup(state["message"][0], current_catalog_version()))
+
+
+def _start() -> dict:
+    return {"started_at": time.time(), "curr_state": "answer_cache"}
+
+
+def _serve(update: dict, cached):
+    if cached is None:
+        return update
+
+    logger.debug("Answer cache hit (similarity %.2f)", cached.similarity)
+    update["message"] = [cached.answer]
+    # The run starts here, so the cached chain is the whole chain
+    update["reasoning_chain"] = cached.reasoning_chain + [
+        f"Answered from the semantic answer cache (similarity {cached.similarity:.2f} to \"{cached.query}\")."
+    ]
+    update["answer_quality"] = "GOOD"
+    update["tool"] = "answer_cache"
+    return update
@@ -1,20 +1,22 @@
-from langchain_core.messages import HumanMessage
+import asyncio
+import logging
+
 from langchain_core.prompts import PromptTemplate
-from langchain_openai.chat_models import ChatOpenAI
 from scripts.schema import PlanExecute
-from openai import OpenAI
-import json
+from scripts.clients import get_chat_model
+from scripts.chains import get_chain, register_chain
+from scripts.context_encoder import expand_references
+from scripts.evaluation import get_evaluator, heuristic_evaluation
+from scripts.budget import accumulate_context, answer_context, charge_tokens, record_attempt
+from scripts.context_store import get_context_store
+from scripts.streaming import ANSWER_STREAM_TAG
 from pydantic import BaseModel, Field
+from langchain_core.runnables import RunnableConfig
+
+logger = logging.getLogger(__name__)
 
-def answerNode(state: PlanExecute):
-    """Answer the question from the given context.
-    Args:
-        state: The current state of the plan execution.
-    Returns:
-        The updated state of the plan execution.
-    """
-    # Create a prompt template for generating answers
-    answer_prompt_template = """You are a helpful cheese expert assistant. Your task is to answer the user's question about cheese products based on the provided context.
+
+ANSWER_PROMPT_TEMPLATE = """You are a helpful cheese expert assistant. Your task is to answer the user's question about cheese products based on the provided context.
 
 Context:
 {context}
@@ -66,43 +68,15 @@ Guidelines:
    - Include all available details (price, brand, type, etc.)
    - Maintain consistent formatting throughout the list
 
-Your answer:"""
+7. Reading the context:
+   - Products come as a table: the first line names the columns, each following line is one product
+   - Descriptions are listed below the table, prefixed by the SKUs they belong to
+   - To show a product's image or page, write [image:SKU] or [link:SKU] exactly; they are replaced with the real image and link
 
-    # Create the prompt\
-    current_context = ''
-    print("Current context:", state['curr_context'])
-    if len(state['curr_context'])==0:
-        current_context = ""
-    elif len(state['curr_context'])==1:
-        current_context = state['curr_context'][0].content
-    else:
-        current_context += state['curr_context'][0].content
-        current_context += state['curr_context'][1].content
-    
-    answer_prompt = PromptTemplate(
-        template=answer_prompt_template,
-        input_variables=["context", "question"]
-    )
-
-    print("Current context:", current_context)
+Your answer:"""
 
-    # Initialize the LLM
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
 
-    # Generate the answer
-    print("Context:", current_context)
-    print("Question:", state["query_to_retrieve_or_answer"])
-    prompt_value = answer_prompt.format(
-        context=current_context,
-        question=state["query_to_retrieve_or_answer"]
-    )
-    
-    response = llm.invoke(prompt_value)
-    
-    # Update the state with the answer
-    state["message"].append(HumanMessage(content=response.content))
-    client = OpenAI()
-    evaluation_prompt_template = """
+EVALUATION_PROMPT_TEMPLATE = """
     You are an AI assistant evaluating the quality of an answer about cheese products.
     
     Original Question: {message}
@@ -113,33 +87,118 @@ Your answer:"""
     Return only "GOOD" if the answer is informative and addresses the question well.
     Return only "POOR" if the answer is vague, uninformative, or doesn't properly address the question.
     """
-    class reasoningOutput(BaseModel):
-        """Output schema for the task handler."""
-        analysis: str = Field(description="Brief explanation of why this tool was chosen")
-        tool: str = Field(description="The tool to be used should be either GOOD or POOR")
 
+
+class evaluationOutput(BaseModel):
+    """Output schema for the answer quality evaluation."""
+    analysis: str = Field(description="Brief explanation of why this tool was chosen")
+    tool: str = Field(description="The tool to be used should be either GOOD or POOR")
+
+
+def create_answer_chain():
+    answer_prompt = PromptTemplate(
+        template=ANSWER_PROMPT_TEMPLATE,
+        input_variables=["context", "question"]
+    )
+    llm = get_chat_model("gpt-4o-mini", temperature=0)
+    # Tagged so the streaming UI can pick out the answer tokens
+    return answer_prompt | llm.with_config(tags=[ANSWER_STREAM_TAG])
+
+
+def create_evaluation_chain():
     evaluation_prompt = PromptTemplate(
-        template=evaluation_prompt_template,
+        template=EVALUATION_PROMPT_TEMPLATE,
         input_variables=["message", "response"]
     )
-    llm1 = ChatOpenAI(temperature=0, model_name="gpt-4o-mini")
-    evaluation_chain = evaluation_prompt | llm1.with_structured_output(reasoningOutput)
+    llm = get_chat_model("gpt-4o-mini", temperature=0)
+    return evaluation_prompt | llm.with_structured_output(evaluationOutput)
+
+
+register_chain("answer", create_answer_chain)
+register_chain("evaluation", create_evaluation_chain)
+
+
+def answerNode(state: PlanExecute, config: RunnableConfig):
+    """Answer the question from the given context, then grade the answer according to the evaluation policy.
+    Args:
+        state: The current state of the plan execution.
+        config: The run config; its thread id keys speculative grades.
+    Returns:
+        The state keys that changed.
+    """
+    store = get_context_store()
+    latest, aggregated = store.get(state["context_ref"]), store.get(state["aggregated_context_ref"])
+    context = _answer_context(state, latest, aggregated)
+    response = get_chain("answer").invoke({
+        "context": context,
+        "question": state["query_to_retrieve_or_answer"]
+    })
     
-    evaluation_response = evaluation_chain.invoke({
-        "message": state["message"],
-        "response": response.content
+    # SKU references in the answer become real links
+    answer = expand_references(response.content, state.get("references") or {})
+    evaluation_response = get_evaluator().evaluate(
+        state["message"] + [answer], response.content, context, _thread_id(config))
+    update = _record_evaluation(state, answer, evaluation_response, context, response.content)
+    # Retries build on what this attempt retrieved instead of starting from scratch
+    accumulated = accumulate_context(aggregated, latest)
+    if accumulated != aggregated:
+        update["aggregated_context_ref"] = store.put(accumulated)
+    return update
+
+
+async def answerNodeAsync(state: PlanExecute, config: RunnableConfig):
+    """Async answerNode(): the answer and evaluation calls are awaited."""
+    store = get_context_store()
+    latest, aggregated = await asyncio.gather(store.aget(state["context_ref"]),
+                                              store.aget(state["aggregated_context_ref"]))
+    context = _answer_context(state, latest, aggregated)
+    response = await get_chain("answer").ainvoke({
+        "context": context,
+        "question": state["query_to_retrieve_or_answer"]
     })
+    answer = expand_references(response.content, state.get("references") or {})
+    evaluation_response = await get_evaluator().aevaluate(
+        state["message"] + [answer], response.content, context, _thread_id(config))
+    update = _record_evaluation(state, answer, evaluation_response, context, response.content)
+    accumulated = accumulate_context(aggregated, latest)
+    if accumulated != aggregated:
+        update["aggregated_context_ref"] = await store.aput(accumulated)
+    return update
+
+
+def _thread_id(config: RunnableConfig):
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    return None if thread_id is None else str(thread_id)
 
-    state["reasoning_chain"].append(evaluation_response.analysis)
+
+def _answer_context(state: PlanExecute, latest: str, aggregated: str) -> str:
+    """The answer context: the latest retrieved context plus what earlier attempts found."""
+    current_context = answer_context(aggregated, latest)
+    logger.debug("Question: %s\nContext: %s", state["query_to_retrieve_or_answer"], current_context)
+    return current_context
+
+
+def _record_evaluation(state: PlanExecute, answer: str, evaluation_response, context: str, response: str):
     quality_assessment = evaluation_response.tool
-    print("Quality assessment:", quality_assessment)
+    logger.debug("Quality assessment: %s", quality_assessment)
     
-    # Store the answer and quality assessment in state
-    state["answer_quality"] = quality_assessment
-    state["message"].append(response.content)
-    state["curr_context"] = []
-    print("--------------------------------")
-    print("Current context:", state["curr_context"])
-    print("--------------------------------")
-
-    return state
+    # The answer and its quality assessment; the retrieved context has been used
+    update = {
+        "message": [answer],
+        "reasoning_chain": [evaluation_response.analysis],
+        "answer_quality": quality_assessment,
+        "graded_by": evaluation_response.source,
+        "context_ref": "",
+    }
+
+    texts = [ANSWER_PROMPT_TEMPLATE, context, state["query_to_retrieve_or_answer"], response]
+    if evaluation_response.source == "llm":
+        texts += [EVALUATION_PROMPT_TEMPLATE, state["message"] + [answer], response]
+    update.update(charge_tokens(state, *texts))
+    if quality_assessment == "GOOD":
+        score = 2
+    else:
+        score = 1 if heuristic_evaluation(response, context).tool == "GOOD" else 0
+    update.update(record_attempt(state, answer, score))
+
+    return update
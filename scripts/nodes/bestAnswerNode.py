@@ -0,0 +1,21 @@
+from scripts.schema import PlanExecute
+from scripts.budget import budget_exhausted
+
+def bestAnswerNode(state: PlanExecute):
+    """Finish with the best answer so far once the retry budget is spent.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        The state keys that changed.
+    """
+    update = {
+        "curr_state": "best_answer",
+        "reasoning_chain": [
+            f"Stopped retrying after {state.get('iterations', 0)} attempts ({budget_exhausted(state)} spent); "
+            f"returned the best answer so far."
+        ],
+    }
+    best_answer = state.get("best_answer")
+    if best_answer and state["message"][-1] != best_answer:
+        update["message"] = [best_answer]
+    return update
@@ -0,0 +1,59 @@
+import time
+
+from scripts.schema import PlanExecute
+from scripts.answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from scripts.catalog import current_catalog_version
+
+def cacheStoreNode(state: PlanExecute):
+    """Store the final answer in the semantic answer cache.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        The state keys that changed.
+    """
+    if _should_store(state):
+        get_answer_cache().store(**_entry(state))
+    return {"curr_state": "cache_store"}
+
+
+async def cacheStoreNodeAsync(state: PlanExecute):
+    """Async cacheStoreNode(): the query embedding is awaited."""
+    if _should_store(state):
+        await get_answer_cache().astore(**_entry(state))
+    return {"curr_state": "cache_store"}
+
+
+def store_confirmed_answer(state: PlanExecute):
+    """Store a finished run's answer once its background LLM grade (speculative policy) came back GOOD.
+    Args:
+        state: The run's final state.
+    """
+    if _cacheable(state):
+        get_answer_cache().store(**_entry(state))
+
+
+async def astore_confirmed_answer(state: PlanExecute):
+    """Async store_confirmed_answer()."""
+    if _cacheable(state):
+        await get_answer_cache().astore(**_entry(state))
+
+
+def _should_store(state: PlanExecute) -> bool:
+    # A cached answer is served without grading, so only answers the evaluation LLM graded GOOD
+    # qualify; heuristic and unsampled grades are not trusted that far.
+    return _cacheable(state) and state.get("graded_by") == "llm"
+
+
+def _cacheable(state: PlanExecute) -> bool:
+    # Answers shaped by a clarification round depend on more than the original question.
+    return ANSWER_CACHE_ENABLED and not state["human_feedback"]
+
+
+def _entry(state: PlanExecute) -> dict:
+    return {
+        "query": state["message"][0],
+        "answer": state["message"][-1],
+        "reasoning_chain": state["reasoning_chain"],
+        "catalog_version": current_catalog_version(),
+        "latency_s": time.time() - state["started_at"],
+    }
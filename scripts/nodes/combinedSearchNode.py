@@ -1,12 +1,177 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
 from scripts.schema import PlanExecute
+from scripts.context_encoder import encode_products, encode_table, product_references
+from scripts.context_store import get_context_store
+from scripts.fusion import reciprocal_rank_fusion
+from scripts.nodes.MongoDBretrievalNode import afilter_skus, aretrieve_mongo, filter_skus, retrieve_mongo
+from scripts.nodes.pineconeretrievalNode import asearch_vectors, search_vectors
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+# Per-branch deadlines; a branch that misses its deadline is dropped and the answer uses the other one.
+# The catalog branch may need an LLM call to generate its query, so it gets more time.
+MONGO_BRANCH_DEADLINE_S = float(os.getenv("MONGO_BRANCH_DEADLINE_S", "8"))
+VECTOR_BRANCH_DEADLINE_S = float(os.getenv("VECTOR_BRANCH_DEADLINE_S", "3"))
+COMBINED_SEARCH_WORKERS = int(os.getenv("COMBINED_SEARCH_WORKERS", "32"))
+
+BRANCHES = {
+    "catalog": (retrieve_mongo, aretrieve_mongo, MONGO_BRANCH_DEADLINE_S),
+    "vector": (search_vectors, asearch_vectors, VECTOR_BRANCH_DEADLINE_S),
+}
+
+# Shared so a branch still running past its deadline does not hold up the request.
+_executor = ThreadPoolExecutor(max_workers=COMBINED_SEARCH_WORKERS, thread_name_prefix="combined_search")
+
+
+@dataclass
+class BranchResult:
+    """Outcome of one retrieval branch."""
+    name: str
+    result: Any = None
+    latency_s: float = 0.0
+    error: Optional[str] = None
+
+
+def _timed(function, query):
+    start = time.perf_counter()
+    result = function(query)
+    return result, time.perf_counter() - start
+
 
 def combinedSearchNode(state: PlanExecute):
+    """Search the catalog database and the vector index at the same time and fuse the results.
+    Each branch has its own deadline; when one is late or fails, the answer uses the other.
+    Vector hits are kept only when their product also passes the catalog filter (price caps,
+    brand and so on), so the fused list respects the user's constraints.
+    Args:
+        state: The current state of the plan execution.
+    Returns:
+        The state keys that changed.
     """
-    This node is used to search for a product in the database.
+    query = state["query_to_retrieve_or_answer"]
+
+    start = time.perf_counter()
+    futures = {
+        # Each branch runs in a copy of the caller's context so callbacks and tracing follow it.
+        name: _executor.submit(contextvars.copy_context().run, _timed, sync_function, query)
+        for name, (sync_function, _, _) in BRANCHES.items()
+    }
+    branches = []
+    for name, future in futures.items():
+        deadline = BRANCHES[name][2]
+        try:
+            result, latency = future.result(timeout=max(0.0, deadline - (time.perf_counter() - start)))
+            branches.append(BranchResult(name, result, latency))
+        except FutureTimeoutError:
+            branches.append(BranchResult(name, latency_s=time.perf_counter() - start, error="timed out"))
+        except Exception as e:
+            branches.append(BranchResult(name, latency_s=time.perf_counter() - start, error=str(e)))
+    allowed, check = None, _filter_check(branches)
+    if check:
+        try:
+            allowed = filter_skus(*check)
+        except Exception as e:
+            # Unchecked hits may break the user's constraints; keep the catalog's products only
+            logger.warning("Could not check vector hits against the catalog filter: %s", e)
+            allowed = set()
+    context, references = _fuse(branches, allowed)
+    return _update(branches, get_context_store().put(context), references)
+
+
+async def combinedSearchNodeAsync(state: PlanExecute):
+    """Async combinedSearchNode(): both branches are awaited concurrently on the event loop."""
+    query = state["query_to_retrieve_or_answer"]
+
+    async def run(name):
+        _, async_function, deadline = BRANCHES[name]
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(async_function(query), timeout=deadline)
+            return BranchResult(name, result, time.perf_counter() - start)
+        except asyncio.TimeoutError:
+            return BranchResult(name, latency_s=time.perf_counter() - start, error="timed out")
+        except Exception as e:
+            return BranchResult(name, latency_s=time.perf_counter() - start, error=str(e))
+
+    branches = list(await asyncio.gather(*(run(name) for name in BRANCHES)))
+    allowed, check = None, _filter_check(branches)
+    if check:
+        try:
+            allowed = await afilter_skus(*check)
+        except Exception as e:
+            # Unchecked hits may break the user's constraints; keep the catalog's products only
+            logger.warning("Could not check vector hits against the catalog filter: %s", e)
+            allowed = set()
+    context, references = _fuse(branches, allowed)
+    return _update(branches, await get_context_store().aput(context), references)
+
+
+def _results(branches) -> dict:
+    return {branch.name: branch.result for branch in branches if branch.error is None}
+
+
+def _filter_check(branches):
+    """(catalog filter, vector hit SKUs) to check against the catalog, or None when there is
+    nothing to check: no vector hits, no catalog filter, or no catalog result to take it from."""
+    results = _results(branches)
+    filter_conditions = (results.get("catalog") or {}).get("filter_conditions")
+    skus = [product["sku"] for product in results.get("vector") or [] if product.get("sku")]
+    if not filter_conditions or not skus:
+        return None
+    return filter_conditions, skus
+
+
+def _fuse(branches, allowed=None) -> Tuple[str, dict]:
+    """Merge the catalog and vector products into one ranked, deduplicated context.
+    Args:
+        branches: The branch results.
+        allowed: SKUs of the vector hits that pass the catalog filter, or None to keep every hit.
+    Returns:
+        The context, and the URLs of its products (product_references).
     """
-    print("combine searching...")
-    state["tool"] = "combined_search"
-    state["curr_state"] = "combined_search"
-    return state
+    results = _results(branches)
+    catalog = results.get("catalog")
+    vector_products = [{key: value for key, value in product.items() if key != "score"}
+                       for product in results.get("vector") or []
+                       if allowed is None or product.get("sku") in allowed]
+
+    sections = []
+    catalog_products, total = [], None
+    if catalog is not None and catalog["query_type"] == "aggregate":
+        sections.append(encode_table(catalog["rows"], title=f"{len(catalog['rows'])} catalog results:"))
+    elif catalog is not None:
+        catalog_products, total = catalog["products"], catalog["total"]
+
+    fused = [{key: value for key, value in product.items() if key != "rrf_score"}
+             for product in reciprocal_rank_fusion([catalog_products, vector_products])]
+    if fused:
+        # The total stays the catalog's: vector hits that pass its filter are already counted in it
+        sections.append(encode_products(fused, total=total))
+    if not sections:
+        sections.append("No products found.")
+    return "\n".join(sections), product_references(fused)
 
 
+def _update(branches, context_ref: str, references: dict):
+    """The state update of a combined search whose fused context is stored under context_ref."""
+    report = ", ".join(
+        f"{branch.name} {branch.latency_s * 1000:.0f}ms" + (f" ({branch.error})" if branch.error else "")
+        for branch in branches
+    )
+    logger.debug("Combined search: %s", report)
+    return {
+        "tool": "combined_search",
+        "curr_state": "combined_search",
+        "reasoning_chain": [f"Combined search: {report}."],
+        "context_ref": context_ref,
+        "references": references,
+    }
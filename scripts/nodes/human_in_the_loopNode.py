@@ -1,17 +1,19 @@
+import logging
+
 from scripts.schema import PlanExecute
 from langgraph.types import interrupt
 
+logger = logging.getLogger(__name__)
+
 def human_in_the_loopNode(state: PlanExecute):
     """
     This function is used to handle queries that are not clear or ambiguous.
     It will ask the user for more information and then update the state with the new query.
     """
 
-    print("Human in the loop")
+    logger.debug("Asking the user for more details")
     response = interrupt({"query": state["query_to_retrieve_or_answer"]})
     # Command(resume=[{"args":"Help me."}])
-    state["human_feedback"] = response[0]["args"]
-    print("human_feedback:")
-    print(state["human_feedback"])
-    print("--------------------------------")
-    return state
+    human_feedback = response[0]["args"]
+    logger.debug("Human feedback: %s", human_feedback)
+    return {"human_feedback": human_feedback}
@@ -1,52 +1,59 @@
 from scripts.schema import PlanExecute
-from openai import OpenAI
-from dotenv import load_dotenv
-from pinecone import Pinecone
-import os
+from scripts.clients import get_async_vector_index, get_vector_index
+from scripts.embeddings import aembed_query, embed_query
+from scripts.context_encoder import encode_products, product_references
+from scripts.context_store import get_context_store
+from scripts.tracing import span
+
+def search_vectors(query: str, top_k: int = 5) -> list:
+    """Products most similar to the query in the vector index (Pinecone or the local NumPy index),
+    best first, with their similarity score."""
+    index = get_vector_index()
+
+    # Repeated queries skip the embedding call entirely
+    with span("embedding", "query"):
+        query_embedding = embed_query(query)
+        
+    # Query the vector index
+    with span("vector", "query", top_k=top_k) as current:
+        results = index.query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True
+        )
+        current.attributes["matches"] = len(results.matches)
+    return [dict(match.metadata, score=match.score) for match in results.matches]
+
+
+async def asearch_vectors(query: str, top_k: int = 5) -> list:
+    """Async search_vectors(): the embedding and the index query are awaited."""
+    index = get_async_vector_index()
+    with span("embedding", "query"):
+        query_embedding = await aembed_query(query)
+    with span("vector", "query", top_k=top_k) as current:
+        results = await index.query(
+            vector=query_embedding,
+            top_k=top_k,
+            include_metadata=True
+        )
+        current.attributes["matches"] = len(results.matches)
+    return [dict(match.metadata, score=match.score) for match in results.matches]
+
 
 def pineconeretrievalNode(state: PlanExecute):
-    """Retrieve the relevant information from the Pinecone database.
+    """Retrieve the relevant information from the vector index.
     Args:
         state: The current state of the plan execution.
     Returns:
-        The updated state of the plan execution.
+        The state keys that changed.
     """
-    client = OpenAI()
-    load_dotenv()
-    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-    INDEX_NAME = os.getenv("INDEX_NAME")
-
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index(INDEX_NAME)
-
-    query_embedding = client.embeddings.create(
-        input=state["query_to_retrieve_or_answer"],
-        model=EMBEDDING_MODEL
-    ).data[0].embedding
-        
-    # Query Pinecone
-    results = index.query(
-        vector=query_embedding,
-        top_k=5,
-        include_metadata=True
-    )
-    relevant_products = results.matches
-    formatted_info = []
-    for product in relevant_products:
-        info = f"Product: {product.metadata.get('name', 'N/A')}\n"
-        info += f"Category: {product.metadata.get('department', 'N/A')}\n"
-        info += f"Price: ${product.metadata.get('price', 'N/A')}\n"
-        if product.metadata.get('pricePer'):
-            info += f"Price per pound: ${product.metadata.get('pricePer')}/lb\n"
-        info += f"Brand: {product.metadata.get('brand', 'N/A')}\n"
-        info += f"Similarity Score: {product.score:.2f}\n"
-        info += f"Product URL: {product.metadata.get('href', 'N/A')}\n"
-        info += f"image_url: {product.metadata.get('showImage', 'N/A')}\n"
-        info += f"SKU: {product.metadata.get('sku', 'N/A')}\n"
-        info += f"Related Products: {product.metadata.get('relateds', 'N/A')}\n"
-        formatted_info.append(info)
-
-    context = "\n".join(formatted_info)
-    state["curr_context"] = [{"role": "system", "content": context}]
-    return state
+    products = search_vectors(state["query_to_retrieve_or_answer"])
+    return {"context_ref": get_context_store().put(encode_products(products)),
+            "references": product_references(products)}
+
+
+async def pineconeretrievalNodeAsync(state: PlanExecute):
+    """Async pineconeretrievalNode()."""
+    products = await asearch_vectors(state["query_to_retrieve_or_answer"])
+    return {"context_ref": await get_context_store().aput(encode_products(products)),
+            "references": product_references(products)}
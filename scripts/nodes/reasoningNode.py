@@ -1,7 +1,15 @@
+import logging
+
 from scripts.schema import PlanExecute
 from pydantic import BaseModel, Field
 from langchain_core.prompts import PromptTemplate
-from langchain_openai.chat_models import ChatOpenAI
+from scripts.clients import get_chat_model
+from scripts.chains import get_chain, register_chain
+from scripts.router import ROUTER_ENABLED, get_router
+from scripts.budget import charge_tokens
+from scripts.context_store import get_context_store
+
+logger = logging.getLogger(__name__)
 
 
 def reasoningNode(state: PlanExecute):
@@ -9,45 +17,86 @@ def reasoningNode(state: PlanExecute):
     Args:
        state: The current state of the plan execution.
     Returns:
-       The updated state of the plan execution.
+       The state keys that changed.
     """
-    state["curr_state"] = "reasoning"
-    inputs = {
+    update = _fast_path(state)
+    if update is not None:
+        return update
+
+    reasoning_chain = get_chain("reasoning")
+    inputs = _reasoning_inputs(state, get_context_store().get(state["aggregated_context_ref"]))
+    output = reasoning_chain.invoke(inputs)
+    return _apply_reasoning(state, inputs, output)
+
+
+async def reasoningNodeAsync(state: PlanExecute):
+    """Async reasoningNode(): the reasoning LLM call is awaited."""
+    update = _fast_path(state)
+    if update is not None:
+        return update
+
+    inputs = _reasoning_inputs(state, await get_context_store().aget(state["aggregated_context_ref"]))
+    output = await get_chain("reasoning").ainvoke(inputs)
+    return _apply_reasoning(state, inputs, output)
+
+
+def _first_pass(state: PlanExecute) -> bool:
+    # The local router only decides fresh queries; retries and clarified queries go to the LLM.
+    return len(state["message"]) == 1 and not state["human_feedback"]
+
+
+def _fast_path(state: PlanExecute):
+    """Route the query with the local router; returns the state update when it decided, else None."""
+    if not (ROUTER_ENABLED and _first_pass(state)):
+        return None
+    decision = get_router().route(state["message"][0])
+    if decision is None:
+        return None
+    logger.debug("Fast-path route: %s -> %s (%s, %.2f)", decision.route, decision.tool, decision.source,
+                 decision.confidence)
+    update = {"curr_state": "reasoning", "reasoning_chain": [decision.analysis]}
+    if decision.reply is not None:
+        update.update(message=[decision.reply], answer_quality="GOOD", tool="fast_reply")
+        return update
+    update["query_to_retrieve_or_answer"] = decision.query
+    update["tool"] = "MongoDB_retrieval" if decision.tool == "mongoDB_retrieval" else decision.tool
+    return update
+
+
+def _reasoning_inputs(state: PlanExecute, aggregated_context: str) -> dict:
+    return {
                 "message": state["message"],
-                "aggregated_context": state["aggregated_context"],
+                "aggregated_context": aggregated_context,
                 "human_feedback": state["human_feedback"]
             }
-    
-    reasoning_chain = create_reasoning_chain()
-    output = reasoning_chain.invoke(inputs)
-    print("reasoning output:")
-    print(output)
-    print("--------------------------------")
-    state["reasoning_chain"].append(output.analysis)
+
+
+def _apply_reasoning(state: PlanExecute, inputs: dict, output):
+    logger.debug("Reasoning output: %s", output)
+    if ROUTER_ENABLED and _first_pass(state):
+        get_router().log_decision(state["message"][0], output.tool)
     if output.tool == "mongoDB_retrieval":
-        state["query_to_retrieve_or_answer"] = output.query
-        state["tool"]="MongoDB_retrieval"
-    
+        tool = "MongoDB_retrieval"
     elif output.tool == "pinecone_retrieval":
-        state["query_to_retrieve_or_answer"] = output.query
-        state["tool"]="pinecone_retrieval"
-
+        tool = "pinecone_retrieval"
     elif output.tool == "human_in_the_loop":
-        state["query_to_retrieve_or_answer"] = output.query
-        state["tool"]="human_in_the_loop"
-
+        tool = "human_in_the_loop"
     elif output.tool == "out_of_scope":
-        state["query_to_retrieve_or_answer"] = output.query
-        state["tool"]="answer"
+        tool = "answer"
     elif output.tool == "combined_search":
-        state["query_to_retrieve_or_answer"] = output.query
-        state["tool"]="combined_search"
+        tool = "combined_search"
     else:
         raise ValueError("Invalid tool was outputed. Must be either 'retrieve' or 'answer_from_context'")
-    return state  
+    return {
+        "curr_state": "reasoning",
+        "reasoning_chain": [output.analysis],
+        "query_to_retrieve_or_answer": output.query,
+        "tool": tool,
+        **charge_tokens(state, REASONING_PROMPT_TEMPLATE, *inputs.values(), output),
+    }
 
-def create_reasoning_chain():
-    reasoning_prompt_template  = """
+
+REASONING_PROMPT_TEMPLATE = """
     You are an intelligent task handler that analyzes user queries about cheese products and determines the most appropriate tool to use. Your goal is to provide the most relevant and accurate information to the user.
 
 Available Tools:
@@ -165,19 +214,24 @@ Important Guidelines:
 - Acknowledge and incorporate any additional context provided in human feedback
     """
 
-    class reasoningOutput(BaseModel):
-        """Output schema for the task handler."""
-        query: str = Field(description="The specific query or question to be used")
-        analysis: str = Field(description="Brief explanation of why this tool was chosen")
-        curr_context: str = Field(description="The context to use")
-        tool: str = Field(description="The tool to be used should be either mongoDB_retrieval, pinecone_retrieval, human_in_the_loop, combined_search or out_of_scope.")
+
+class reasoningOutput(BaseModel):
+    """Output schema for the task handler."""
+    query: str = Field(description="The specific query or question to be used")
+    analysis: str = Field(description="Brief explanation of why this tool was chosen")
+    curr_context: str = Field(description="The context to use")
+    tool: str = Field(description="The tool to be used should be either mongoDB_retrieval, pinecone_retrieval, human_in_the_loop, combined_search or out_of_scope.")
 
 
+def create_reasoning_chain():
     reasoning_prompt = PromptTemplate(
-        template=reasoning_prompt_template,
+        template=REASONING_PROMPT_TEMPLATE,
         input_variables=["message", "aggregated_context", "human_feedback"],
     )
 
-    reasoning_llm = ChatOpenAI(temperature=0, model_name="gpt-4o", max_tokens=2000)
+    reasoning_llm = get_chat_model("gpt-4o", temperature=0, max_tokens=2000)
     reasoning_chain = reasoning_prompt | reasoning_llm.with_structured_output(reasoningOutput)
     return reasoning_chain
+
+
+register_chain("reasoning", create_reasoning_chain)
@@ -0,0 +1,234 @@
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from scripts.catalog import DEPARTMENTS, load_brands
+
+load_dotenv()
+
+# ----- Configuration -----
+QUERY_COMPILER_ENABLED = os.getenv("QUERY_COMPILER_ENABLED", "true").lower() == "true"
+
+# Same shape as the projections in the LLM prompt's examples, plus the fields the node formats.
+FIND_PROJECTION = {
+    "name": 1, "brand": 1, "price": 1, "pricePer": 1, "department": 1,
+    "weight_each": 1, "weight_unit": 1, "_id": 0,
+}
+
+CHEESE_KEYWORDS = [
+    "pepper jack", "monterey jack", "mozzarella", "cheddar", "parmesan", "parmigiano", "feta", "goat", "brie",
+    "provolone", "ricotta", "swiss", "american", "gouda", "havarti", "muenster", "colby", "pecorino", "romano",
+    "asiago", "mascarpone", "gorgonzola", "blue", "camembert", "halloumi", "queso", "cotija", "fresco",
+    "burrata", "string", "manchego", "fontina", "emmental", "gruyere", "paneer", "kasseri", "kefalotyri",
+    "mizithra", "jack",
+]
+
+# Shorthand for the departments; the full names are matched as well.
+DEPARTMENT_ALIASES = {
+    "sliced": "Sliced Cheese",
+    "slices": "Sliced Cheese",
+    "shredded": "Shredded Cheese",
+    "cream cheeses?": "Cream Cheese",
+    "cottage": "Cottage Cheese",
+    "loaf": "Cheese Loaf",
+    "loaves": "Cheese Loaf",
+    "wheels?": "Cheese Wheel",
+    "crumbled": "Crumbled, Cubed, Grated, Shaved",
+    "crumbles": "Crumbled, Cubed, Grated, Shaved",
+    "cubed": "Crumbled, Cubed, Grated, Shaved",
+    "grated": "Crumbled, Cubed, Grated, Shaved",
+    "shaved": "Crumbled, Cubed, Grated, Shaved",
+    "specialty": "Specialty Cheese",
+}
+
+# Words that carry no filter of their own. Anything else left over sends the query to the LLM.
+STOPWORDS = set("""
+    a all an and any are available be brand by can carry cheese cheeses cost costing costs could department
+    display do does each every find for from get give have has how i in is it item items kind kinds list
+    look looking lb lbs made make makes me much need of on only options our per please pound pounds price
+    priced prices product products search sell sells show some that the their them there to type types want
+    we what whats which with would you your
+""".split())
+
+_NUMBER = r"\$?\s*(\d+(?:\.\d+)?)\s*(?:dollars?|usd|bucks)?"
+_PER_POUND = r"(\s*(?:/|per|a|an)\s*(?:lb|lbs|pound))?"
+_BOUNDS = [
+    (r"under|at most|up to|no more than|max(?:imum)?|<=", "$lte"),
+    (r"below|less than|cheaper than|<", "$lt"),
+    (r"at least|min(?:imum)?|>=", "$gte"),
+    (r"over|above|more than|greater than|pricier than|>", "$gt"),
+]
+_SUPERLATIVES = [
+    (r"most expensive|priciest|highest priced|highest price", ("price", -1)),
+    (r"cheapest|least expensive|lowest priced|lowest price", ("price", 1)),
+    (r"most popular|best selling|best-selling|top selling", ("popularity_order", 1)),
+]
+
+
+class _Text:
+    """Lowercased query text that matched spans are cut out of."""
+
+    def __init__(self, text: str):
+        text = text.lower().replace("`", "'")
+        text = re.sub(r"[^\w$.'<>=/\s-]", " ", text)
+        self.value = " " + re.sub(r"(?<!\d)\.|\.(?!\d)|'(?!s\b)", " ", text) + " "
+
+    def take(self, pattern: str) -> Optional[re.Match]:
+        match = re.search(pattern, self.value)
+        if match:
+            self.value = self.value[:match.start()] + " " + self.value[match.end():]
+        return match
+
+    def leftover(self) -> List[str]:
+        return re.findall(r"[a-z0-9$]+", re.sub(r"'s\b", " ", self.value))
+
+
+class QueryCompiler:
+    """Compiles common catalog questions to the MongoDB query dict the LLM would produce.
+
+    It recognizes the intents in the query-generation prompt's examples: price and
+    pricePer bounds, brand, department, stock status, a cheese-type keyword,
+    most/least expensive and most popular, counts and per-brand/per-department
+    grouping. A query with any word it does not understand is left to the LLM.
+    """
+
+    def __init__(self, brands: Optional[List[str]] = None):
+        brands = brands if brands is not None else load_brands()
+        self._brands = [(self._phrase(brand.lower()) + r"(?:'s|s)?", brand) for brand in brands]
+        departments = {self._phrase(department.lower()): department for department in DEPARTMENTS}
+        departments.update({rf"\b{alias}\b": department for alias, department in DEPARTMENT_ALIASES.items()})
+        self._departments = sorted(departments.items(), key=lambda item: -len(item[0]))
+
+    @staticmethod
+    def _phrase(words: str) -> str:
+        words = re.sub(r"[^\w'\s]", " ", words.replace("`", "'")).split()
+        return r"\b" + r"\s+".join(re.escape(word) for word in words) + r"\b"
+
+    def _aggregation(self, text: _Text) -> Optional[List[dict]]:
+        if text.take(r"\bhow many (?:different |distinct )?brands\b|\b(?:count|number of)(?: the)?(?: number of)? brands\b"):
+            return [{"$group": {"_id": "$brand"}}, {"$count": "total_brands"}]
+        group = text.take(r"\b(?:by|per|for each|each|every) (brand|department)\b")
+        field = f"${group.group(1)}" if group else None
+        if text.take(r"\baverage price\b|\bavg price\b|\bmean price\b"):
+            return [
+                {"$group": {"_id": field, "avg_price": {"$avg": "$price"}, "count": {"$sum": 1}}},
+                {"$sort": {"avg_price": -1}},
+            ]
+        if text.take(r"\bhow many\b|\b(?:total )?number of\b|\bcount(?: of)?\b"):
+            if field:
+                return [{"$group": {"_id": field, "count": {"$sum": 1}}}, {"$sort": {"count": -1}}]
+            return [{"$count": "total_cheeses"}]
+        if text.take(r"\b(?:which|what) brands\b|\b(?:list|show)(?: me)?(?: all)?(?: the)? brands\b|^\s*(?:all )?brands\s*$"):
+            return [{"$group": {"_id": "$brand"}}, {"$sort": {"_id": 1}}]
+        if field:
+            return None  # a grouping without a known measure
+        return []
+
+    def _prices(self, text: _Text, filters: dict) -> bool:
+        between = text.take(rf"\b(?:between|from) {_NUMBER}\s*(?:and|to|-)\s*{_NUMBER}{_PER_POUND}")
+        if between:
+            field = "pricePer" if between.group(3) else "price"
+            filters[field] = {"$gte": float(between.group(1)), "$lte": float(between.group(2))}
+        for words, operator in _BOUNDS:
+            bound = text.take(rf"(?:\b|(?<=\s))(?:{words}) ?{_NUMBER}{_PER_POUND}")
+            if not bound:
+                continue
+            field = "pricePer" if bound.group(2) else "price"
+            if operator in filters.get(field, {}):
+                return False
+            filters.setdefault(field, {})[operator] = float(bound.group(1))
+        return True
+
+    def _single(self, text: _Text, patterns) -> Tuple[bool, Optional[str]]:
+        """Take at most one of the (pattern, value) pairs; a second distinct match is ambiguous."""
+        found = None
+        for pattern, value in patterns:
+            while text.take(pattern):
+                if found is not None and found != value:
+                    return False, None
+                found = value
+        return True, found
+
+    def compile(self, query: str) -> Optional[dict]:
+        """Return the MongoDB query dict for `query`, or None when the LLM should handle it."""
+        text = _Text(query)
+        filters: dict = {}
+
+        pipeline = self._aggregation(text)
+        if pipeline is None:
+            return None
+
+        sort, limit = None, 0
+        for words, order in _SUPERLATIVES:
+            superlative = text.take(rf"\b(?:top )?(\d+ )?(?:{words})\b")
+            if superlative:
+                if sort is not None or pipeline:
+                    return None
+                sort = dict([order])
+                limit = int(superlative.group(1)) if superlative.group(1) else 1
+
+        if not self._prices(text, filters):
+            return None
+
+        if text.take(r"\bout of (?:the )?stock\b|\bsold out\b|\bunavailable\b|\bnot (?:in stock|available)\b"):
+            filters["empty"] = True
+        elif text.take(r"\bin (?:the )?stock\b|\bon hand\b|\bavailable\b"):
+            filters["empty"] = False
+
+        ok, brand = self._single(text, self._brands)
+        if not ok:
+            return None
+        if brand:
+            filters["brand"] = brand
+
+        ok, department = self._single(text, self._departments)
+        if not ok:
+            return None
+        if department:
+            filters["department"] = {"$regex": department, "$options": "i"}
+
+        ok, keyword = self._single(text, [(rf"\b{keyword}(?:s|es)?\b", keyword) for keyword in CHEESE_KEYWORDS])
+        if not ok:
+            return None
+        if keyword:
+            filters["name"] = {"$regex": keyword, "$options": "i"}
+
+        leftover = text.leftover()
+        if any(word not in STOPWORDS for word in leftover):
+            return None
+        if not (filters or sort or pipeline or "all" in leftover or "every" in leftover):
+            return None
+
+        if pipeline:
+            return {"query_type": "aggregate", "filter_conditions": filters, "aggregation_pipeline": pipeline}
+        if sort is None:
+            sort = {"price": -1} if "price" in filters or "pricePer" in filters else {"popularity_order": 1}
+        return {
+            "query_type": "find",
+            "filter_conditions": filters,
+            "sort_conditions": sort,
+            "projection": dict(FIND_PROJECTION),
+            "limit": limit,
+        }
+
+
+_compiler = None
+_compiler_lock = threading.Lock()
+
+
+def get_query_compiler() -> QueryCompiler:
+    """Process-wide compiler, with brands read from the product feed."""
+    global _compiler
+    if _compiler is None:
+        with _compiler_lock:
+            if _compiler is None:
+                _compiler = QueryCompiler()
+    return _compiler
+
+
+def compile_query(query: str) -> Optional[dict]:
+    """Compile a natural-language catalog query locally; None means fall back to the LLM."""
+    return get_query_compiler().compile(query)
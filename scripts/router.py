@@ -0,0 +1,332 @@
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from scripts.catalog import DEPARTMENTS, load_brands
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+# Logged (query, tool) decisions from the LLM router, used to train the local classifier.
+# Off by default: the log keeps the users' raw questions.
+ROUTER_LOG_ENABLED = os.getenv("ROUTER_LOG_ENABLED", "false").lower() == "true"
+ROUTER_LOG_PATH = os.getenv("ROUTER_LOG_PATH", "./data/routing_log.jsonl")
+# The log rotates to routing_log.jsonl.1, .2, ... once it reaches the size limit
+ROUTER_LOG_MAX_BYTES = int(os.getenv("ROUTER_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+ROUTER_LOG_BACKUPS = int(os.getenv("ROUTER_LOG_BACKUPS", "2"))
+# Decisions waiting to be written; more are dropped rather than slowing requests down
+ROUTER_LOG_QUEUE_SIZE = int(os.getenv("ROUTER_LOG_QUEUE_SIZE", "1000"))
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.9"))
+ROUTER_MIN_TRAINING_EXAMPLES = int(os.getenv("ROUTER_MIN_TRAINING_EXAMPLES", "50"))
+
+GREETING_REPLY = "Hello! I'm your cheese expert assistant. How can I help you find the perfect cheese today?"
+THANKS_REPLY = "You're welcome! Let me know if there's any other cheese I can help you find."
+OUT_OF_SCOPE_REPLY = (
+    "I'm specialized in cheese products, so I can't help with that. "
+    "Try asking me something like \"Find mozzarella under $50\" or \"What cheese is similar to brie?\""
+)
+
+_GREETING = re.compile(
+    r"^(hi|hello|hey|hiya|howdy|yo|greetings|good (morning|afternoon|evening|day)|how are you( doing)?|"
+    r"what'?s up|sup)( there)?[\s!.?,]*$", re.IGNORECASE)
+_THANKS = re.compile(r"^(thanks|thank you|thx|cheers|great|ok|okay|cool)( (so much|a lot|very much))?[\s!.?,]*$",
+                     re.IGNORECASE)
+# Only subjects a cheese shop has nothing to say about: food and drink words are left out, since
+# "what goes with a dry red wine for dinner" is a pairing question.
+_OFF_TOPIC = re.compile(
+    r"\b(weather|news|sports?|football|soccer|basketball|stock market|movies?|music|songs?|jokes?|politics|"
+    r"bitcoin|crypto|programming|python|javascript|homework)\b", re.IGNORECASE)
+_PAIRING = re.compile(r"\b(pair(s|ed|ing)?|go(es)? (well )?with|serve with|match(es)? with)\b", re.IGNORECASE)
+_CHEESE_WORDS = re.compile(
+    r"\b(chee?se|cheeses|mozzarella|cheddar|brie|parmesan|parmigiano|feta|gouda|swiss|provolone|ricotta|"
+    r"mascarpone|goat|blue|gorgonzola|camembert|havarti|muenster|colby|jack|pecorino|romano|asiago|halloumi|"
+    r"paneer|queso|burrata|manchego|fontina|emmental|gruyere|string|curds?|sku|products?)\b", re.IGNORECASE)
+# Signals of a structured catalog query, answerable with a MongoDB filter/sort/count.
+_PRICE = re.compile(
+    r"(\b(under|below|less than|cheaper than|over|above|more than|greater than|between|at most|at least|"
+    r"up to|within)\s*\$?\s*\d)|(\$\s*\d)|(\d+\s*(dollars|usd|bucks)\b)|[<>]\s*\$?\d", re.IGNORECASE)
+_SORT = re.compile(r"\b((most|least) (expensive|popular)|cheapest|priciest|lowest price|highest price)\b",
+                   re.IGNORECASE)
+_COUNT = re.compile(r"\b(how many|count|number of|total number|list all|all (the )?brands)\b", re.IGNORECASE)
+_STOCK = re.compile(r"\b(in stock|out of stock|available|sold out)\b", re.IGNORECASE)
+# Signals that the query needs semantic understanding, where rules should not decide.
+_SEMANTIC = re.compile(
+    r"\b(similar|alternative|substitute|like (brie|mozzarella|cheddar)|good for|best for|taste|tastes|texture|"
+    r"flavou?rs?|describe|tell me (more )?about|pairs?|pairing|recommend|creamy|sharp|mild|smoky|melt(s|ing)?|"
+    r"characteristics|special|why)\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9$]+")
+# Tools the classifier may pick on its own; human_in_the_loop needs the LLM to phrase the clarifying question.
+CLASSIFIER_TOOLS = {"mongoDB_retrieval", "pinecone_retrieval", "combined_search", "out_of_scope"}
+
+
+@dataclass
+class RouteDecision:
+    """A routing decision made without the LLM."""
+    tool: str  # same vocabulary as the reasoning LLM: mongoDB_retrieval, pinecone_retrieval, ...
+    query: str
+    confidence: float
+    source: str  # "rule" or "classifier"
+    route: str  # finer-grained label for hit-rate reporting
+    reply: Optional[str] = None  # templated answer for greetings and out-of-scope messages
+    analysis: str = ""
+
+
+def _features(text: str) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesRouter:
+    """Multinomial naive Bayes over unigrams and bigrams, trained on logged routing decisions."""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.classes: List[str] = []
+        self._log_prior: Dict[str, float] = {}
+        self._log_likelihood: Dict[str, Dict[str, float]] = {}
+        self._log_unseen: Dict[str, float] = {}
+
+    def fit(self, examples: Iterable[Tuple[str, str]]) -> "NaiveBayesRouter":
+        class_counts = Counter()
+        feature_counts = defaultdict(Counter)
+        for text, label in examples:
+            class_counts[label] += 1
+            feature_counts[label].update(_features(text))
+        vocabulary = {feature for counts in feature_counts.values() for feature in counts}
+        total = sum(class_counts.values())
+        self.classes = sorted(class_counts)
+        for label in self.classes:
+            counts = feature_counts[label]
+            denominator = sum(counts.values()) + self.alpha * (len(vocabulary) + 1)
+            self._log_prior[label] = math.log(class_counts[label] / total)
+            self._log_likelihood[label] = {
+                feature: math.log((count + self.alpha) / denominator) for feature, count in counts.items()
+            }
+            self._log_unseen[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """Most likely tool and its posterior probability."""
+        if not self.classes:
+            return None, 0.0
+        features = _features(text)
+        scores = {}
+        for label in self.classes:
+            likelihood = self._log_likelihood[label]
+            unseen = self._log_unseen[label]
+            scores[label] = self._log_prior[label] + sum(likelihood.get(feature, unseen) for feature in features)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / normalizer
+
+
+def load_routing_log(path: str = ROUTER_LOG_PATH, backups: int = ROUTER_LOG_BACKUPS) -> List[Tuple[str, str]]:
+    """The logged (query, tool) decisions, oldest first, rotated files included."""
+    examples = []
+    for name in [f"{path}.{number}" for number in range(backups, 0, -1)] + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    examples.append((record["query"], record["tool"]))
+                except (ValueError, KeyError):
+                    continue
+    return examples
+
+
+class RoutingLog:
+    """Appends routing decisions to a size-bounded JSONL file from a background thread.
+
+    Requests only put the record on a bounded queue; when the writer falls behind,
+    records are dropped and counted. The file is rotated like a RotatingFileHandler.
+    """
+
+    def __init__(self, path: str = ROUTER_LOG_PATH, max_bytes: int = ROUTER_LOG_MAX_BYTES,
+                 backups: int = ROUTER_LOG_BACKUPS, queue_size: int = ROUTER_LOG_QUEUE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def append(self, record: dict):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="routing_log", daemon=True)
+                self._writer.start()
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued record is written."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                self._write(json.dumps(record) + "\n")
+            except OSError as e:
+                logger.warning("Could not write the routing log: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, line: str):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _rotate(self):
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class FastPathRouter:
+    """Routes obvious queries locally, ahead of the LLM router in reasoningNode.
+
+    Keyword and pattern rules answer greetings and off-topic chit-chat with
+    templated replies and send clearly structured catalog queries (price bounds,
+    sorting, counts, stock, brands, departments) to MongoDB retrieval. A naive
+    Bayes classifier trained from logged LLM decisions covers the rest when it is
+    confident; everything else falls back to the LLM.
+    """
+
+    def __init__(self, brands: Optional[List[str]] = None, classifier: Optional[NaiveBayesRouter] = None,
+                 confidence: float = ROUTER_CONFIDENCE, log_path: str = ROUTER_LOG_PATH,
+                 log_enabled: bool = ROUTER_LOG_ENABLED):
+        self.confidence = confidence
+        self.log = RoutingLog(log_path) if log_enabled else None
+        self.classifier = classifier
+        brands = brands if brands is not None else load_brands()
+        self._brand = re.compile(r"\b(" + "|".join(re.escape(brand) for brand in brands) + r")\b",
+                                 re.IGNORECASE) if brands else None
+        self._department = re.compile(
+            r"\b(" + "|".join(re.escape(department) for department in DEPARTMENTS) + r")\b", re.IGNORECASE)
+        self._lock = threading.Lock()
+        self.route_counts = Counter()
+
+    def _rules(self, query: str) -> Optional[RouteDecision]:
+        text = query.strip()
+        if _GREETING.match(text):
+            return RouteDecision("out_of_scope", text, 1.0, "rule", "greeting", GREETING_REPLY,
+                                 "Greeting detected by the local router.")
+        if _THANKS.match(text):
+            return RouteDecision("out_of_scope", text, 1.0, "rule", "thanks", THANKS_REPLY,
+                                 "Small talk detected by the local router.")
+        if _OFF_TOPIC.search(text) and not _CHEESE_WORDS.search(text) and not _PAIRING.search(text):
+            return RouteDecision("out_of_scope", text, 0.95, "rule", "off_topic", OUT_OF_SCOPE_REPLY,
+                                 "Query is not about cheese products.")
+        if _SEMANTIC.search(text):
+            return None
+        signals = [name for name, pattern in (
+            ("price", _PRICE), ("sort", _SORT), ("count", _COUNT), ("stock", _STOCK),
+            ("brand", self._brand), ("department", self._department),
+        ) if pattern is not None and pattern.search(text)]
+        if signals:
+            return RouteDecision("mongoDB_retrieval", text, 0.95, "rule", "structured",
+                                 analysis=f"Structured catalog query ({', '.join(signals)}) routed to MongoDB.")
+        return None
+
+    def route(self, query: str) -> Optional[RouteDecision]:
+        """Decide locally, or return None to fall back to the LLM router."""
+        decision = self._rules(query)
+        if decision is None and self.classifier is not None:
+            tool, probability = self.classifier.predict(query)
+            if tool in CLASSIFIER_TOOLS and probability >= self.confidence:
+                reply = OUT_OF_SCOPE_REPLY if tool == "out_of_scope" else None
+                decision = RouteDecision(tool, query.strip(), probability, "classifier", tool, reply,
+                                         f"Local classifier routed to {tool} (confidence {probability:.2f}).")
+        with self._lock:
+            self.route_counts[f"{decision.source}:{decision.route}" if decision else "llm_fallback"] += 1
+        return decision
+
+    def log_decision(self, query: str, tool: str):
+        """Queue an LLM routing decision for the training log, when logging is enabled."""
+        if self.log is not None:
+            self.log.append({"query": query, "tool": tool})
+
+    def stats(self) -> dict:
+        total = sum(self.route_counts.values())
+        fast = total - self.route_counts["llm_fallback"]
+        return {
+            "requests": total,
+            "fast_path_rate": fast / total if total else 0.0,
+            "routes": {route: count / total for route, count in self.route_counts.items()} if total else {},
+            "log_dropped": self.log.dropped if self.log is not None else 0,
+        }
+
+
+def train_classifier(examples: List[Tuple[str, str]]) -> Optional[NaiveBayesRouter]:
+    if len(examples) < ROUTER_MIN_TRAINING_EXAMPLES:
+        return None
+    return NaiveBayesRouter().fit(examples)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> FastPathRouter:
+    """Process-wide router; the classifier is trained from the routing log on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = FastPathRouter(classifier=train_classifier(load_routing_log()))
+    return _router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local router against the logged LLM decisions.")
+    parser.add_argument("--log", default=ROUTER_LOG_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    examples = load_routing_log(args.log)
+    random.Random(0).shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train, test = examples[:split], examples[split:]
+    router = FastPathRouter(classifier=NaiveBayesRouter().fit(train) if train else None)
+    agree = 0
+    for query, tool in test:
+        decision = router.route(query)
+        agree += decision is not None and decision.tool == tool
+    fast = sum(count for route, count in router.route_counts.items() if route != "llm_fallback")
+    print(f"Trained on {len(train)} decisions, evaluated on {len(test)}")
+    if test:
+        print(f"Fast-path coverage: {fast / len(test):.1%}")
+        print(f"Agreement with the LLM on fast-path decisions: {agree / fast if fast else 0.0:.1%}")
+    for route, share in sorted(router.stats()["routes"].items()):
+        print(f"  {route:<32} {share:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
-from typing import TypedDict, List, Annotated
-from langgraph.graph.message import add_messages
+import operator
+from typing import TypedDict, Dict, List, Annotated
+
 
 class PlanExecute(TypedDict):
     curr_state: str
-    message: List[str]
+    # The question, then every answer; nodes return only the new entries
+    message: Annotated[List[str], operator.add]
     query_to_retrieve_or_answer: str
-    curr_context: Annotated[List[str], add_messages]
-    aggregated_context: str
+    # References into the context store (scripts/context_store.py); the context text is not checkpointed
+    context_ref: str
+    aggregated_context_ref: str
+    # URLs by SKU of every product retrieved in the run, for the [image:SKU] / [link:SKU] references
+    references: Annotated[Dict[str, Dict[str, str]], operator.or_]
     tool: str
     human_feedback: str
     answer_quality: str
-    reasoning_chain: List[str]
\ No newline at end of file
+    # What graded the last answer: "llm" or "heuristic" (only LLM-graded answers are cached)
+    graded_by: str
+    reasoning_chain: Annotated[List[str], operator.add]
+    started_at: float
+    # Retry budget (scripts/budget.py)
+    iterations: int
+    tokens_used: int
+    best_answer: str
+    best_score: int
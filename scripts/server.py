@@ -0,0 +1,492 @@
+"""Headless HTTP/JSON serving entry point for the agent.
+
+One compiled graph is shared by a bounded pool of worker threads. Requests wait
+in a bounded queue; when it is full they are turned away with 429 and a
+Retry-After, so a load balancer can send them to another replica. Every request
+has a deadline: a request whose deadline passes while queued is dropped, and a
+running one is stopped at the next graph step.
+
+    POST /v1/chat                        {"message": "...", "stream": false, "timeout_s": 30}
+    POST /v1/threads/<thread_id>/resume  {"feedback": "...", "stream": false, "timeout_s": 30}
+    GET  /v1/threads/<thread_id>         running, interrupted (waiting for feedback) or done
+    GET  /healthz                        queue and worker status; 503 while draining
+    GET  /metrics                        Prometheus text (spans and server counters)
+    GET  /traces/<thread_id>             the request's trace as JSON
+
+A run that needs more details from the shopper ends with status "interrupted"
+and the question; answering it through the resume endpoint continues the same
+thread. With "stream": true the response is newline-delimited JSON events
+(status, token, reset, then interrupt, done or error) sent as they happen.
+
+Interrupted threads live in the checkpointer, so behind a load balancer either
+route /v1/threads/<thread_id>/... to the replica that started the thread or
+point every replica at a shared checkpoint store.
+
+Usage:
+    python -m scripts.server
+    python -m scripts.server --port 8080 --workers 16 --queue-size 64
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from langgraph.types import Command
+
+from scripts.agent import make_agent_workflow
+from scripts.evaluation import get_evaluator, retry_if_poor
+from scripts.streaming import StreamEvent, stream_workflow
+from scripts.tracing import configure_logging, get_tracer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+# Graph runs in parallel; each holds a thread while it waits on the LLM, Mongo and Pinecone
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "8"))
+# Requests admitted beyond the running ones; past this the server answers 429
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "32"))
+# Default and maximum per-request deadline, queueing included
+SERVER_REQUEST_TIMEOUT_S = float(os.getenv("SERVER_REQUEST_TIMEOUT_S", "60"))
+SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", "65536"))
+
+_THREAD_PATH = re.compile(r"^/v1/threads/([A-Za-z0-9_.:-]{1,128})(/resume)?$")
+_FINAL_EVENTS = ("interrupt", "done", "error")
+
+
+class Overloaded(Exception):
+    """The request queue is full, or the server is draining."""
+
+
+class ThreadBusy(Exception):
+    """Another request is already running on the thread."""
+
+
+@dataclass
+class Job:
+    """A graph run waiting for, or holding, a worker. Its events are handed to the HTTP handler."""
+    inputs: object
+    thread_id: str
+    deadline: float
+    events: queue.Queue = field(default_factory=queue.Queue)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class AgentService:
+    """Runs graph requests on a fixed pool of workers fed by a bounded queue.
+    Args:
+        workflow: The compiled agent graph, shared by every worker.
+        workers: Number of worker threads.
+        queue_size: Requests admitted to wait for a worker.
+    """
+
+    def __init__(self, workflow, workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE):
+        self.workflow = workflow
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._active_threads = set()
+        self.draining = False
+        self.counters = {"accepted": 0, "rejected": 0, "expired": 0, "completed": 0, "interrupted": 0,
+                         "failed": 0, "cancelled": 0}
+        self.in_flight = 0
+        self._service_s = 0.0
+        self._threads = [threading.Thread(target=self._work, name=f"agent_worker_{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, inputs, thread_id: str, timeout_s: float) -> Job:
+        """Admit a run to the queue.
+        Raises:
+            Overloaded: The queue is full or the server is draining.
+            ThreadBusy: A run on the same thread is queued or running.
+        """
+        job = Job(inputs, thread_id, time.monotonic() + timeout_s)
+        with self._lock:
+            if self.draining:
+                raise Overloaded("draining")
+            if thread_id in self._active_threads:
+                raise ThreadBusy(thread_id)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.counters["rejected"] += 1
+                raise Overloaded("queue full")
+            self._active_threads.add(thread_id)
+            self.counters["accepted"] += 1
+        return job
+
+    def running(self, thread_id: str) -> bool:
+        """Whether a run on the thread is queued or on a worker."""
+        with self._lock:
+            return thread_id in self._active_threads
+
+    def retry_after_s(self) -> int:
+        """Seconds until the queue has likely drained, from the mean service time so far."""
+        with self._lock:
+            finished = sum(self.counters[key] for key in ("completed", "interrupted", "failed"))
+            mean_s = self._service_s / finished if finished else 1.0
+        return max(1, math.ceil((self._queue.qsize() + 1) * mean_s / self.workers))
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            final = None
+            try:
+                if job.cancelled.is_set() or job.expired():
+                    self._count("expired")
+                    final = StreamEvent("error", "deadline exceeded while queued")
+                    continue
+                with self._lock:
+                    self.in_flight += 1
+                start = time.perf_counter()
+                outcome, final = self._run(job)
+                with self._lock:
+                    self.in_flight -= 1
+                    self._service_s += time.perf_counter() - start
+                self._count(outcome)
+            finally:
+                # Free the thread before the client hears the run is over, so a resume or a
+                # state read sent straight after the response is not refused or served stale.
+                with self._lock:
+                    self._active_threads.discard(job.thread_id)
+                if final is not None:
+                    job.events.put(final)
+
+    def _run(self, job: Job) -> Tuple[str, Optional[StreamEvent]]:
+        """Stream the run's events to the job; stop at the next step once the deadline passes or
+        the client goes away. With the speculative evaluation policy a POOR background grade
+        reopens the run, and the retried answer follows a "reset" event.
+        Returns:
+            The outcome, and the final event ("interrupt", "done" or "error") for the caller to
+            send once the thread is released; the graph run is over by then.
+        """
+        config = {"configurable": {"thread_id": job.thread_id}}
+        inputs = job.inputs
+        try:
+            while True:
+                with closing(stream_workflow(self.workflow, inputs, config)) as events:
+                    for event in events:
+                        if job.cancelled.is_set():
+                            return "cancelled", None
+                        if job.expired():
+                            return "expired", StreamEvent("error", "deadline exceeded")
+                        if event.kind == "done" and get_evaluator().policy == "speculative" \
+                                and retry_if_poor(self.workflow, config):
+                            job.events.put(StreamEvent("reset", elapsed_s=event.elapsed_s))
+                            break
+                        if event.kind == "interrupt":
+                            return "interrupted", event
+                        if event.kind == "done":
+                            return "completed", event
+                        job.events.put(event)
+                    else:
+                        return "failed", StreamEvent("error", "run ended without a result")
+                inputs = None
+        except Exception as e:
+            logger.exception("Run on thread %s failed", job.thread_id)
+            return "failed", StreamEvent("error", f"{type(e).__name__}: {e}")
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "in_flight": self.in_flight, "queued": self._queue.qsize(),
+                    "queue_size": self._queue.maxsize, "draining": self.draining, **self.counters}
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop admitting requests, let the queued and running ones finish, then stop the workers."""
+        with self._lock:
+            self.draining = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def event_payload(event: StreamEvent, thread_id: str) -> dict:
+    """The JSON form of a stream event; the final one carries the answer or the question."""
+    payload = {"event": event.kind, "elapsed_s": round(event.elapsed_s, 3)}
+    if event.kind == "done":
+        state = event.state or {}
+        messages = state.get("message") or [""]
+        payload.update(thread_id=thread_id, status="done", answer=messages[-1],
+                       reasoning=state.get("reasoning_chain", []))
+    elif event.kind == "interrupt":
+        payload.update(thread_id=thread_id, status="interrupted", question=event.text)
+    elif event.kind == "error":
+        payload.update(thread_id=thread_id, status="error", error=event.text)
+    elif event.text:
+        payload["text"] = event.text
+    return payload
+
+
+class _AgentHandler(BaseHTTPRequestHandler):
+    # Chunked transfer for streamed responses and keep-alive behind a load balancer
+    protocol_version = "HTTP/1.1"
+    service: AgentService = None
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            stats = self.service.stats()
+            self._send_json(503 if stats["draining"] else 200, {"status": "draining" if stats["draining"] else "ok",
+                                                                 **stats})
+        elif self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", get_tracer().prometheus() + self._server_metrics())
+        elif self.path.startswith("/traces/"):
+            trace = get_tracer().export(self.path[len("/traces/"):])
+            if trace is None:
+                self._send_json(404, {"error": "unknown trace"})
+            else:
+                self._send_json(200, trace)
+        else:
+            match = _THREAD_PATH.match(self.path)
+            if match is None or match.group(2):
+                self._send_json(404, {"error": "not found"})
+                return
+            if self.service.running(match.group(1)):
+                # Its checkpoint is not final until the worker lets go of the thread
+                self._send_json(200, {"thread_id": match.group(1), "status": "running", "question": None})
+                return
+            snapshot = self.service.workflow.get_state({"configurable": {"thread_id": match.group(1)}})
+            if not snapshot.values:
+                self._send_json(404, {"error": "unknown thread"})
+                return
+            questions = [str(item.value.get("query", "")) for item in getattr(snapshot, "interrupts", ())]
+            self._send_json(200, {"thread_id": match.group(1), "status": "interrupted" if questions else "done",
+                                  "question": questions[0] if questions else None})
+
+    def do_POST(self):
+        body = self._read_json()
+        if body is None:
+            return
+        if self.path == "/v1/chat":
+            message = body.get("message")
+            if not isinstance(message, str) or not message.strip():
+                self._send_json(400, {"error": "message must be a non-empty string"})
+                return
+            self._run(_initial_state(message), str(uuid.uuid4()), body)
+            return
+        match = _THREAD_PATH.match(self.path)
+        if match is None or not match.group(2):
+            self._send_json(404, {"error": "not found"})
+            return
+        thread_id, feedback = match.group(1), body.get("feedback")
+        if not isinstance(feedback, str) or not feedback.strip():
+            self._send_json(400, {"error": "feedback must be a non-empty string"})
+            return
+        if self.service.running(thread_id):
+            # The checkpoint mid-run no longer shows the interrupt being answered
+            self._send_json(409, {"error": "a request is already running on this thread"})
+            return
+        snapshot = self.service.workflow.get_state({"configurable": {"thread_id": thread_id}})
+        if not snapshot.values:
+            self._send_json(404, {"error": "unknown thread"})
+        elif not getattr(snapshot, "interrupts", ()):
+            self._send_json(409, {"error": "thread is not waiting for feedback"})
+        else:
+            self._run(Command(resume=[{"args": feedback}]), thread_id, body)
+
+    def _run(self, inputs, thread_id: str, body: dict):
+        try:
+            timeout_s = min(float(body.get("timeout_s", SERVER_REQUEST_TIMEOUT_S)), SERVER_REQUEST_TIMEOUT_S)
+        except (TypeError, ValueError):
+            self._send_json(400, {"error": "timeout_s must be a number"})
+            return
+        try:
+            job = self.service.submit(inputs, thread_id, max(timeout_s, 0.0))
+        except ThreadBusy:
+            self._send_json(409, {"error": "a request is already running on this thread"})
+            return
+        except Overloaded as e:
+            status = 503 if self.service.draining else 429
+            self._send_json(status, {"error": str(e)}, {"Retry-After": str(self.service.retry_after_s())})
+            return
+        if body.get("stream"):
+            self._stream(job)
+        else:
+            self._respond(job)
+
+    def _respond(self, job: Job):
+        while True:
+            try:
+                event = job.events.get(timeout=job.remaining() + 1.0)
+            except queue.Empty:
+                job.cancelled.set()
+                self._send_json(504, event_payload(StreamEvent("error", "deadline exceeded"), job.thread_id))
+                return
+            if event.kind in _FINAL_EVENTS:
+                payload = event_payload(event, job.thread_id)
+                status = 200
+                if event.kind == "error":
+                    status = 504 if event.text.startswith("deadline exceeded") else 500
+                self._send_json(status, payload, {"X-Thread-Id": job.thread_id})
+                return
+
+    def _stream(self, job: Job):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Thread-Id", job.thread_id)
+        self.end_headers()
+        try:
+            while True:
+                try:
+                    event = job.events.get(timeout=job.remaining() + 1.0)
+                except queue.Empty:
+                    event = StreamEvent("error", "deadline exceeded")
+                    job.cancelled.set()
+                self._write_chunk(json.dumps(event_payload(event, job.thread_id)) + "\n")
+                if event.kind in _FINAL_EVENTS:
+                    break
+            self._write_chunk("")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; stop the run at its next step
+            job.cancelled.set()
+            self.close_connection = True
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _read_json(self) -> Optional[dict]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > SERVER_MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413 if length > 0 else 400, {"error": "missing or oversized body"})
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "body must be JSON"})
+            return None
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "body must be a JSON object"})
+            return None
+        return body
+
+    def _server_metrics(self) -> str:
+        stats = self.service.stats()
+        lines = ["# HELP cheese_agent_requests_total Requests by outcome.",
+                 "# TYPE cheese_agent_requests_total counter"]
+        lines += [f'cheese_agent_requests_total{{outcome="{outcome}"}} {stats[outcome]}'
+                  for outcome in ("accepted", "rejected", "expired", "completed", "interrupted", "failed",
+                                  "cancelled")]
+        lines += ["# HELP cheese_agent_queue_depth Requests waiting for a worker.",
+                  "# TYPE cheese_agent_queue_depth gauge",
+                  f"cheese_agent_queue_depth {stats['queued']}",
+                  "# HELP cheese_agent_in_flight Requests running on a worker.",
+                  "# TYPE cheese_agent_in_flight gauge",
+                  f"cheese_agent_in_flight {stats['in_flight']}"]
+        return "\n".join(lines) + "\n"
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        self._send(status, "application/json", json.dumps(payload), headers)
+
+    def _send(self, status: int, content_type: str, body: str, headers: Optional[dict] = None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+
+def _initial_state(message: str) -> dict:
+    return {
+        "curr_state": "",
+        "message": [message],
+        "context_ref": "",
+        "aggregated_context_ref": "",
+        "references": {},
+        "query_to_retrieve_or_answer": "",
+        "tool": "",
+        "human_feedback": "",
+        "answer_quality": "",
+        "graded_by": "",
+        "reasoning_chain": [],
+        "iterations": 0,
+        "tokens_used": 0,
+        "best_answer": "",
+        "best_score": -1,
+    }
+
+
+class AgentServer(ThreadingHTTPServer):
+    # Connections accepted while the workers are busy wait here rather than being refused by the OS
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_server(service: AgentService, host: str = SERVER_HOST, port: int = SERVER_PORT) -> AgentServer:
+    """An HTTP server for the service; run it with serve_forever()."""
+    handler = type("AgentHandler", (_AgentHandler,), {"service": service})
+    return AgentServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the agent over HTTP/JSON.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    configure_logging()
+    service = AgentService(make_agent_workflow(warm_up=True), workers=args.workers, queue_size=args.queue_size)
+    server = make_server(service, args.host, args.port)
+
+    def drain(signum, frame):
+        # Fail health checks and refuse new work, finish what was admitted, then stop
+        logger.info("Draining: %s", service.stats())
+        threading.Thread(target=lambda: (service.close(), server.shutdown()), name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    logger.info("Serving the agent on %s:%d with %d workers and a queue of %d", args.host, args.port,
+                args.workers, args.queue_size)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        service.close(timeout=SERVER_REQUEST_TIMEOUT_S)
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+# Tag on the answer LLM; only its tokens are streamed to the user.
+ANSWER_STREAM_TAG = "answer_stream"
+
+TOOL_LABELS = {
+    "MongoDB_retrieval": "searching the catalog database",
+    "pinecone_retrieval": "searching product descriptions",
+    "combined_search": "searching the catalog and product descriptions",
+    "human_in_the_loop": "asking for more details",
+    "answer": "answering directly",
+    "fast_reply": "replying directly",
+}
+
+
+@dataclass
+class StreamEvent:
+    """One event of a streamed run: an answer token, a status update, an interrupt or the end."""
+    kind: str  # "token", "reset", "status", "interrupt" or "done"
+    text: str = ""
+    elapsed_s: float = 0.0
+    state: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class StreamTimings:
+    ttft_s: Optional[float] = None
+    total_s: float = 0.0
+    steps: Dict[str, float] = field(default_factory=dict)
+
+
+def _status(node: str, update: Dict[str, Any]) -> Optional[str]:
+    if node == "answer_cache" and update.get("tool") == "answer_cache":
+        return "Answered from the answer cache"
+    if node == "reasoning":
+        tool = update.get("tool", "")
+        return f"Chose {tool}: {TOOL_LABELS.get(tool, tool)}"
+    if node == "MongoDB_retrieval":
+        return "Catalog database search done"
+    if node == "pinecone_retrieval":
+        return "Product description search done"
+    if node == "combined_search":
+        # "Combined search: catalog 120ms, vector 85ms."
+        return (update.get("reasoning_chain") or [None])[-1]
+    if node == "answer":
+        return f"Answer graded {update.get('answer_quality', '')}"
+    if node == "best_answer":
+        return "Retry budget spent, returning the best answer so far"
+    return None
+
+
+def stream_workflow(workflow, inputs, config, timings: Optional[StreamTimings] = None) -> Iterator[StreamEvent]:
+    """Run the graph with streaming and yield answer tokens and step updates as they happen.
+    Args:
+        workflow: The compiled agent graph.
+        inputs: The initial state, or a Command to resume an interrupted run.
+        config: The run config (thread_id).
+        timings: Filled with time to first token, total latency and per-step completion times.
+    Returns:
+        An iterator of StreamEvent; the last one is "interrupt" or "done" and carries the final state.
+        It comes once the graph run has ended and its checkpoint is saved.
+    """
+    timings = timings if timings is not None else StreamTimings()
+    start = time.perf_counter()
+    state = None
+    answered = False
+    interrupt = None
+    stream = workflow.stream(inputs, config=config, stream_mode=["messages", "updates", "values"])
+    with closing(stream):
+        for mode, chunk in stream:
+            elapsed = time.perf_counter() - start
+            if mode == "messages":
+                message, metadata = chunk
+                if ANSWER_STREAM_TAG not in metadata.get("tags", []) or not message.content:
+                    continue
+                if timings.ttft_s is None:
+                    timings.ttft_s = elapsed
+                if answered:
+                    # A new answer after a POOR grade replaces the streamed one.
+                    answered = False
+                    yield StreamEvent("reset", elapsed_s=elapsed)
+                yield StreamEvent("token", message.content, elapsed)
+            elif mode == "updates":
+                for node, update in chunk.items():
+                    if node == "__interrupt__":
+                        # Not the end yet: the run saves its checkpoint after announcing the interrupt.
+                        interrupt = str(update[0].value.get("query", ""))
+                        continue
+                    timings.steps[node] = elapsed
+                    answered = answered or node == "answer"
+                    status = _status(node, update or {})
+                    if status:
+                        yield StreamEvent("status", status, elapsed)
+            else:
+                state = chunk
+    timings.total_s = time.perf_counter() - start
+    if interrupt is not None:
+        yield StreamEvent("interrupt", interrupt, timings.total_s, state)
+    else:
+        yield StreamEvent("done", elapsed_s=timings.total_s, state=state)
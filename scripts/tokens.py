@@ -0,0 +1,6 @@
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text).
+
+    Good enough for budgeting and rate limiting without loading a tokenizer.
+    """
+    return max(1, (len(text) + 3) // 4) if text else 0
@@ -0,0 +1,356 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig, RunnableSequence
+from langchain_core.prompts import BasePromptTemplate
+from langgraph.errors import GraphBubbleUp
+
+from scripts.cache import LRUCache
+from scripts.tokens import estimate_tokens
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ----- Configuration -----
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Request traces kept for the JSON export and the Streamlit waterfall
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "200"))
+# Serve /metrics (Prometheus text) and /traces/<id> (JSON) on this port; 0 disables the endpoint
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Log to stderr at the given level; the nodes log their inputs and outputs at DEBUG."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+@dataclass
+class Span:
+    """One timed operation of a request: a graph node, an LLM call, a Mongo or a vector query."""
+    kind: str
+    name: str
+    start_s: float = 0.0  # offset from the start of the trace
+    duration_s: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Trace:
+    """The spans of one request, keyed by its thread id. A resumed run adds to the same trace."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+
+    def offset(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_s)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_s": max((span.start_s + span.duration_s for span in spans), default=0.0),
+            "spans": [asdict(span) for span in spans],
+        }
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets, Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_S):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    """Collects spans into per-request traces, latency histograms and token counters."""
+
+    def __init__(self, history: int = TRACE_HISTORY):
+        self._lock = threading.Lock()
+        self.traces = LRUCache(maxsize=history)
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.tokens: Dict[tuple, Dict[str, int]] = {}
+        self.errors: Dict[tuple, int] = {}
+
+    def trace(self, trace_id: str) -> Trace:
+        """The trace of a request, started on first use."""
+        with self._lock:
+            trace = self.traces.get(trace_id)
+            if trace is None:
+                trace = Trace(trace_id)
+                self.traces.set(trace_id, trace)
+            return trace
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        """Time the enclosed block as a span of the current request (if any) and feed the histograms.
+        Yields the Span, so the block can add attributes such as result sizes and token counts."""
+        trace = _current_trace.get()
+        span = Span(kind, name, trace.offset() if trace else 0.0, attributes=attributes)
+        start = time.perf_counter()
+        try:
+            yield span
+        except GraphBubbleUp:
+            # Interrupts are how human_in_the_loop waits for the user, not failures
+            span.attributes["interrupted"] = True
+            raise
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - start
+            self._record(span)
+            if trace is not None:
+                trace.add(span)
+
+    def _record(self, span: Span):
+        key = (span.kind, span.name)
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(span.duration_s)
+            if "prompt_tokens" in span.attributes or "completion_tokens" in span.attributes:
+                tokens = self.tokens.setdefault(key, {"prompt": 0, "completion": 0})
+                tokens["prompt"] += span.attributes.get("prompt_tokens", 0)
+                tokens["completion"] += span.attributes.get("completion_tokens", 0)
+            if span.error:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def export(self, trace_id: str) -> Optional[dict]:
+        """A request's trace as a JSON-serializable dict, or None when it is not kept."""
+        trace = self.traces.get(trace_id)
+        return trace.to_dict() if trace is not None else None
+
+    def summary(self) -> dict:
+        """Per span kind and name: count, mean, p50 and p95 latency, tokens and errors."""
+        with self._lock:
+            return {
+                f"{kind}:{name}": {
+                    "count": histogram.count,
+                    "mean_s": histogram.sum / histogram.count if histogram.count else 0.0,
+                    "p50_s": histogram.quantile(0.5),
+                    "p95_s": histogram.quantile(0.95),
+                    **{f"{part}_tokens": count for part, count in self.tokens.get((kind, name), {}).items()},
+                    "errors": self.errors.get((kind, name), 0),
+                }
+                for (kind, name), histogram in sorted(self.histograms.items())
+            }
+
+    def prometheus(self) -> str:
+        """All histograms and counters in the Prometheus text exposition format."""
+        lines = [
+            "# HELP cheese_agent_span_duration_seconds Duration of graph nodes, LLM calls, Mongo and vector queries.",
+            "# TYPE cheese_agent_span_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (kind, name), histogram in sorted(self.histograms.items()):
+                labels = f'kind="{kind}",name="{name}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'cheese_agent_span_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'cheese_agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"cheese_agent_span_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"cheese_agent_span_duration_seconds_count{{{labels}}} {histogram.count}")
+            lines += ["# HELP cheese_agent_llm_tokens_total LLM tokens (estimated when the model reports no usage).",
+                      "# TYPE cheese_agent_llm_tokens_total counter"]
+            for (kind, name), tokens in sorted(self.tokens.items()):
+                for part, count in tokens.items():
+                    lines.append(f'cheese_agent_llm_tokens_total{{name="{name}",type="{part}"}} {count}')
+            lines += ["# HELP cheese_agent_span_errors_total Spans that raised.",
+                      "# TYPE cheese_agent_span_errors_total counter"]
+            for (kind, name), count in sorted(self.errors.items()):
+                lines.append(f'cheese_agent_span_errors_total{{kind="{kind}",name="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer."""
+    return _tracer
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """get_tracer().span(), or a detached span when tracing is disabled."""
+    if not TRACING_ENABLED:
+        yield Span(kind, name, attributes=attributes)
+        return
+    with _tracer.span(kind, name, **attributes) as current:
+        yield current
+
+
+def traced_node(name: str, node):
+    """Wrap a graph node so each run is a span of the request's trace (keyed by thread id).
+    The spans of LLM, Mongo and vector calls made inside the node land in the same trace."""
+    if not TRACING_ENABLED:
+        return node
+    takes_config = "config" in inspect.signature(node).parameters
+
+    def enter(config):
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        return _current_trace.set(_tracer.trace(str(thread_id)) if thread_id is not None else None)
+
+    def record_update(current: Span, update):
+        if isinstance(update, dict):
+            current.attributes["updated"] = sorted(update)
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def traced(state, config: RunnableConfig):
+            token = enter(config)
+            try:
+                with _tracer.span("node", name) as current:
+                    update = await (node(state, config) if takes_config else node(state))
+                    record_update(current, update)
+                return update
+            finally:
+                _current_trace.reset(token)
+    else:
+        @functools.wraps(node)
+        def traced(state, config: RunnableConfig):
+            token = enter(config)
+            try:
+                with _tracer.span("node", name) as current:
+                    update = node(state, config) if takes_config else node(state)
+                    record_update(current, update)
+                return update
+            finally:
+                _current_trace.reset(token)
+    # LangGraph passes the config when the signature asks for it
+    traced.__signature__ = inspect.Signature([
+        inspect.Parameter("state", inspect.Parameter.POSITIONAL_OR_KEYWORD),
+        inspect.Parameter("config", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=RunnableConfig),
+    ])
+    return traced
+
+
+class TracedChain:
+    """A registered chain whose invoke/ainvoke calls are recorded as "llm" spans with token counts.
+
+    Token counts come from the model's usage metadata when the output carries it; structured
+    outputs do not, so the prompt and completion are estimated (chars/4) instead.
+    """
+
+    def __init__(self, name: str, chain):
+        self.name = name
+        self.chain = chain
+        self._prompt = chain.first if isinstance(chain, RunnableSequence) else None
+
+    def invoke(self, inputs, config: Optional[RunnableConfig] = None, **kwargs):
+        with span("llm", self.name) as current:
+            output = self.chain.invoke(inputs, config, **kwargs)
+            self._count_tokens(current, inputs, output)
+        return output
+
+    async def ainvoke(self, inputs, config: Optional[RunnableConfig] = None, **kwargs):
+        with span("llm", self.name) as current:
+            output = await self.chain.ainvoke(inputs, config, **kwargs)
+            self._count_tokens(current, inputs, output)
+        return output
+
+    def __getattr__(self, attribute):
+        return getattr(self.chain, attribute)
+
+    def _count_tokens(self, current: Span, inputs, output):
+        usage = getattr(output, "usage_metadata", None)
+        if usage:
+            current.attributes.update(prompt_tokens=usage.get("input_tokens", 0),
+                                      completion_tokens=usage.get("output_tokens", 0))
+            return
+        prompt = inputs
+        if isinstance(self._prompt, BasePromptTemplate) and isinstance(inputs, dict):
+            try:
+                prompt = self._prompt.format(**inputs)
+            except (KeyError, ValueError):
+                pass
+        completion = getattr(output, "content", None)
+        if completion is None:
+            completion = output.model_dump_json() if hasattr(output, "model_dump_json") else output
+        current.attributes.update(prompt_tokens=estimate_tokens(str(prompt)),
+                                  completion_tokens=estimate_tokens(str(completion)), tokens_estimated=True)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", _tracer.prometheus())
+        elif self.path.startswith("/traces/"):
+            trace = _tracer.export(self.path[len("/traces/"):])
+            if trace is None:
+                self._send(404, "application/json", json.dumps({"error": "unknown trace"}))
+            else:
+                self._send(200, "application/json", json.dumps(trace))
+        else:
+            self._send(404, "text/plain", "not found\n")
+
+    def _send(self, status: int, content_type: str, body: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics and /traces/<id> from a background thread, once per process."""
+    global _metrics_server
+    if port <= 0:
+        return None
+    with _metrics_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info("Serving /metrics and /traces on port %d", port)
+    return _metrics_server
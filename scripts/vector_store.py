@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Match:
+    """One query hit, shaped like a Pinecone match."""
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class QueryResult:
+    """Query response, shaped like a Pinecone query response."""
+    matches: List[Match]
+
+
+def build_product_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored next to each product vector, whatever the backend."""
+    return {
+        "name": product.get("name", ""),
+        "sku": str(product.get("sku", "")),
+        "department": str(product.get("department", "")),
+        "brand": str(product.get("brand", "")),
+        "showImage": str(product.get("showImage", "")),
+        "price": float(product.get("price", 0)),
+        "pricePer": float(product.get("pricePer", 0)),
+        "price_each": float(product.get("price_each", 0)),
+        "price_unit": str(product.get("price_unit", "")),
+        "price_order": float(product.get("price_order", 0)),
+        "weight_each": float(product.get("weight_each", 0)),
+        "weight_case": float(product.get("weight_case", 0)),
+        "count_unit": str(product.get("count_unit", "")),
+        "dimension_each": str(product.get("dimension_each", "")),
+        "href": str(product.get("href", "")),
+        "popularity_order": float(product.get("popularity_order", 0)),
+        "relateds": [str(sku) for sku in product.get("relateds", [])],
+    }
+
+
+def _index_files(path: str):
+    return f"{path}.npy", f"{path}.meta.json"
+
+
+class LocalIndexWriter:
+    """Streams rows into a new local index: a float32 .npy matrix plus a JSON sidecar.
+
+    Rows are spooled to temporary files as they arrive, so memory stays flat however
+    many vectors are written. The finished files are swapped in on close(), so readers
+    never see a partial index.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.dimension = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)) or ".", exist_ok=True)
+        self._rows_path = f"{path}.rows.tmp"
+        self._ids_path = f"{path}.ids.tmp"
+        self._metadata_path = f"{path}.metadata.tmp"
+        self._rows = open(self._rows_path, "wb")
+        self._ids = open(self._ids_path, "w", encoding="utf-8")
+        self._metadata = open(self._metadata_path, "w", encoding="utf-8")
+
+    def add(self, vector_id: str, vector: Sequence[float], metadata: Dict[str, Any]):
+        row = np.array(vector, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = row.shape[0]
+        elif row.shape[0] != self.dimension:
+            raise ValueError(f"Vector {vector_id} has dimension {row.shape[0]}, expected {self.dimension}")
+        # Rows are stored L2-normalized so a query is a single matrix-vector product.
+        norm = np.linalg.norm(row)
+        if norm:
+            row /= norm
+        self._rows.write(row.tobytes())
+        self._ids.write(json.dumps(vector_id) + "\n")
+        self._metadata.write(json.dumps(metadata) + "\n")
+        self.count += 1
+
+    def add_many(self, records: Iterable[Tuple[str, Sequence[float], Dict[str, Any]]]):
+        for vector_id, vector, metadata in records:
+            self.add(vector_id, vector, metadata)
+
+    def _close_spools(self):
+        for f in (self._rows, self._ids, self._metadata):
+            f.close()
+
+    def _remove_spools(self):
+        for spool in (self._rows_path, self._ids_path, self._metadata_path):
+            if os.path.exists(spool):
+                os.remove(spool)
+
+    def abort(self):
+        self._close_spools()
+        self._remove_spools()
+
+    def close(self):
+        """Assemble the final files and atomically replace the previous index."""
+        self._close_spools()
+        matrix_path, meta_path = _index_files(self.path)
+        dimension = self.dimension or 0
+        tmp_matrix = f"{self.path}.tmp.npy"
+        tmp_meta = f"{meta_path}.tmp"
+
+        matrix = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=np.float32, shape=(self.count, dimension))
+        if self.count:
+            rows_per_chunk = max(1, (8 << 20) // (4 * dimension))
+            with open(self._rows_path, "rb") as rows:
+                for start in range(0, self.count, rows_per_chunk):
+                    chunk = np.fromfile(rows, dtype=np.float32, count=rows_per_chunk * dimension)
+                    matrix[start:start + chunk.shape[0] // dimension] = chunk.reshape(-1, dimension)
+        matrix.flush()
+        del matrix
+
+        with open(tmp_meta, "w", encoding="utf-8") as out:
+            out.write(f'{{"dimension": {dimension}, ')
+            for key, spool in (("ids", self._ids_path), ("metadata", self._metadata_path)):
+                out.write(f'"{key}": [')
+                with open(spool, "r", encoding="utf-8") as lines:
+                    for i, line in enumerate(lines):
+                        out.write(("," if i else "") + line.rstrip("\n"))
+                out.write("]" + (", " if key == "ids" else "}"))
+
+        os.replace(tmp_matrix, matrix_path)
+        os.replace(tmp_meta, meta_path)
+        self._remove_spools()
+        print(f"Wrote local vector index with {self.count} vectors to {matrix_path}")
+
+
+def write_local_index(path: str, ids: Sequence[str], embeddings: Sequence[Sequence[float]],
+                      metadata_list: Sequence[Dict[str, Any]]):
+    """Write vectors and metadata as a float32 .npy matrix plus a JSON sidecar.
+    Args:
+        path: Index path without extension.
+        ids: One vector ID per row.
+        embeddings: The raw embedding vectors.
+        metadata_list: One metadata dict per row.
+    """
+    if not (len(ids) == len(embeddings) == len(metadata_list)):
+        raise ValueError("ids, embeddings and metadata_list must have the same length")
+    writer = LocalIndexWriter(path)
+    try:
+        writer.add_many(zip(ids, embeddings, metadata_list))
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+class LocalVectorIndex:
+    """In-process cosine-similarity index over a memory-mapped float32 matrix.
+
+    Exposes the subset of the Pinecone Index API the nodes use (query), so it
+    can be swapped in through configuration.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self.refresh()
+
+    def refresh(self):
+        """Reload the index if convert_data swapped in new files since the last load."""
+        matrix_path, meta_path = _index_files(self.path)
+        mtime = os.stat(meta_path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.vectors = np.load(matrix_path, mmap_mode="r")
+        self.ids = sidecar["ids"]
+        self.metadata = sidecar["metadata"]
+        self.dimension = sidecar["dimension"]
+        self._mtime = mtime
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, vector: Sequence[float], top_k: int = 5, include_metadata: bool = True, **kwargs) -> QueryResult:
+        """Return the top_k rows by cosine similarity to vector."""
+        self.refresh()
+        if len(self.ids) == 0 or top_k <= 0:
+            return QueryResult(matches=[])
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.vectors @ query
+        k = min(top_k, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return QueryResult(matches=[
+            Match(
+                id=self.ids[i],
+                score=float(scores[i]),
+                metadata=self.metadata[i] if include_metadata else {},
+            )
+            for i in top
+        ])
+
+
+class AsyncLocalVectorIndex:
+    """Awaitable query() over a LocalVectorIndex, for the async graph.
+
+    The matrix product runs in a worker thread so a large index does not stall the event loop.
+    """
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    async def query(self, vector: Sequence[float], top_k: int = 5, include_metadata: bool = True,
+                    **kwargs) -> QueryResult:
+        return await asyncio.to_thread(self.index.query, vector=vector, top_k=top_k,
+                                       include_metadata=include_metadata)
@@ -0,0 +1,43 @@
+import contextlib
+import io
+
+import pytest
+
+import scripts.chains as chains
+import scripts.checkpointer as checkpointer_module
+import scripts.context_store as context_store
+import scripts.nodes.MongoDBretrievalNode as mongo_node
+import scripts.nodes.answerCacheNode as answer_cache_node
+import scripts.nodes.cacheStoreNode as cache_store_node
+import scripts.nodes.pineconeretrievalNode as vector_node
+import scripts.nodes.reasoningNode as reasoning_node
+from benchmarks.async_throughput import install_standins
+from scripts.checkpointer import SQLiteCheckpointer
+
+CATALOG = "./fixture/products.json"
+
+
+@pytest.fixture(scope="module")
+def standins(tmp_path_factory):
+    """The graph's remote services stood in locally (benchmarks.async_throughput), with a fresh
+    checkpointer and chain registry; everything is put back after the module."""
+    directory = tmp_path_factory.mktemp("standins")
+    with pytest.MonkeyPatch.context() as patch:
+        for module, name in ((mongo_node, "get_mongo_collection"), (mongo_node, "get_async_mongo_collection"),
+                             (vector_node, "get_vector_index"), (vector_node, "get_async_vector_index"),
+                             (vector_node, "embed_query"), (vector_node, "aembed_query")):
+            patch.setattr(module, name, getattr(module, name))
+        patch.setattr(chains, "_factories", dict(chains._factories))
+        patch.setattr(chains, "_chains", {})
+        checkpointer = SQLiteCheckpointer(str(directory / "checkpoints.sqlite"), compact_interval=0)
+        patch.setattr(checkpointer_module, "_checkpointer", checkpointer)
+        patch.setattr(context_store, "_store", None)
+        # Caches and the local router would answer without running the graph
+        patch.setattr(answer_cache_node, "ANSWER_CACHE_ENABLED", False)
+        patch.setattr(cache_store_node, "ANSWER_CACHE_ENABLED", False)
+        patch.setattr(reasoning_node, "ROUTER_ENABLED", False)
+        patch.setattr(mongo_node, "MONGO_CACHE_ENABLED", False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            install_standins(CATALOG, str(directory), 0, 0, 0)
+        yield directory
+        checkpointer.close()
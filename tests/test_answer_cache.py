@@ -0,0 +1,46 @@
+import threading
+
+from scripts.answer_cache import SemanticAnswerCache
+
+
+def make_cache():
+    # Every query embeds to the same vector, so only the key-term check tells them apart
+    return SemanticAnswerCache(embed=lambda text: [1.0, 0.0], terms=["Galbani", "Belgioioso", "Specialty Cheese"])
+
+
+def test_semantic_hit_needs_the_same_prices():
+    cache = make_cache()
+    cache.store("mozzarella under $50", "answer for $50", [], "v1", 1.0)
+    assert cache.lookup("mozzarella under $20", "v1") is None
+    assert cache.lookup("mozzarella under 50 dollars please", "v1").answer == "answer for $50"
+
+
+def test_semantic_hit_needs_the_same_brand_and_department():
+    cache = make_cache()
+    cache.store("What cheese does Galbani make?", "Galbani answer", [], "v1", 1.0)
+    assert cache.lookup("What cheese does Belgioioso make?", "v1") is None
+    assert cache.lookup("Galbani cheese in Specialty Cheese", "v1") is None
+    assert cache.lookup("which cheeses does galbani make", "v1").answer == "Galbani answer"
+
+
+def test_prices_match_with_or_without_the_currency_sign():
+    cache = make_cache()
+    cache.store("mozzarella under $50", "answer for $50", [], "v1", 1.0)
+    assert cache.lookup("mozzarella for under 50", "v1").answer == "answer for $50"
+    assert cache.lookup("mozzarella under $50.00 please", "v1").answer == "answer for $50"
+    assert cache.lookup("mozzarella for under 5", "v1") is None
+
+
+def test_concurrent_lookups_count_every_miss():
+    cache = make_cache()
+
+    def look_up():
+        for _ in range(500):
+            cache.lookup("mozzarella under $50", "v1")
+
+    threads = [threading.Thread(target=look_up) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["misses"] == 4000
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+import scripts.budget as budget
+from benchmarks.async_throughput import initial_state
+from benchmarks.end_to_end import install_scripted_models
+from benchmarks.standins import LatencyStandIn, fake_chain
+from scripts.agent import make_agent_workflow
+from scripts.budget import accumulate_context, answer_context, budget_exhausted, record_attempt
+from scripts.chains import register_chain
+from scripts.conditional_edges.retry_or_end import retry_or_end
+
+QUESTION = "Find mozzarella under $50"
+
+
+def test_record_attempt_keeps_the_best_answer():
+    state = {"iterations": 0, "best_score": -1}
+    state.update(record_attempt(state, "first", 1))
+    assert state == {"iterations": 1, "best_answer": "first", "best_score": 1}
+    state.update(record_attempt(state, "worse", 0))
+    assert (state["iterations"], state["best_answer"]) == (2, "first")
+    # Ties go to the later attempt
+    state.update(record_attempt(state, "as good, later", 1))
+    assert (state["iterations"], state["best_answer"]) == (3, "as good, later")
+    assert record_attempt({}, "no budget state yet", 0) == {"iterations": 1, "best_answer": "no budget state yet",
+                                                            "best_score": 0}
+
+
+def test_accumulate_context_drops_repeats_and_the_oldest_blocks(monkeypatch):
+    aggregated = accumulate_context("", "block a")
+    aggregated = accumulate_context(aggregated, "block b")
+    assert accumulate_context(aggregated, "block a") == aggregated
+    assert accumulate_context(aggregated, "") == aggregated
+    assert answer_context(aggregated, "block b") == "block b\n\nFrom earlier searches:\nblock a"
+    assert answer_context("", "block b") == "block b"
+
+    monkeypatch.setattr(budget, "AGGREGATED_CONTEXT_TOKENS", 10)
+    aggregated = accumulate_context("", "old " * 8)
+    assert accumulate_context(aggregated, "new " * 8) == "new " * 8
+    # The latest block is kept even when it alone is over the limit
+    assert accumulate_context("", "huge " * 50) == "huge " * 50
+
+
+def test_budget_exhausted_by_attempts_deadline_and_tokens(monkeypatch):
+    monkeypatch.setattr(budget, "MAX_ITERATIONS", 3)
+    monkeypatch.setattr(budget, "REQUEST_DEADLINE_S", 60.0)
+    monkeypatch.setattr(budget, "REQUEST_TOKEN_BUDGET", 1000)
+    fresh = {"iterations": 1, "started_at": time.time(), "tokens_used": 10}
+    assert budget_exhausted(fresh) is None
+    assert budget_exhausted({**fresh, "iterations": 3}) == "3 attempts"
+    assert budget_exhausted({**fresh, "started_at": time.time() - 61}) == "the 60s deadline"
+    assert budget_exhausted({**fresh, "tokens_used": 1000}) == "the 1000 token budget"
+    # A request that never set started_at has no deadline
+    assert budget_exhausted({"iterations": 0}) is None
+
+    assert retry_or_end({**fresh, "answer_quality": "GOOD", "iterations": 3}) == "end_workflow"
+    assert retry_or_end({**fresh, "answer_quality": "POOR"}) == "retry_reasoning"
+    assert retry_or_end({**fresh, "answer_quality": "POOR", "tokens_used": 1000}) == "return_best_answer"
+
+
+@pytest.fixture(scope="module")
+def poor_workflow(standins):
+    """A graph whose grader calls every answer POOR; the third attempt's answer is a refusal,
+    so the heuristic scores it below the first two."""
+    install_scripted_models({"queries": [{"id": "always-poor", "query": QUESTION, "route": "mongoDB_retrieval",
+                                          "grades": ["POOR"] * 10}]}, 0)
+    answers = []
+
+    def answer(inputs):
+        attempt = len(answers) + 1
+        if attempt == 3:
+            answers.append("I couldn't find any mozzarella in the catalog.")
+        else:
+            answers.append(f"Attempt {attempt}: Galbani Whole Milk Mozzarella costs $4.99.")
+        return AIMessage(content=answers[-1])
+
+    register_chain("answer", lambda: fake_chain(answer, LatencyStandIn(0)))
+    return make_agent_workflow(), answers
+
+
+def run(workflow, answers, thread_id):
+    answers.clear()
+    return workflow.invoke(initial_state(QUESTION), config={"configurable": {"thread_id": thread_id}})
+
+
+def test_loop_stops_at_max_iterations_with_the_best_answer(monkeypatch, poor_workflow):
+    workflow, answers = poor_workflow
+    monkeypatch.setattr(budget, "MAX_ITERATIONS", 3)
+    result = run(workflow, answers, "max-iterations")
+    assert result["iterations"] == len(answers) == 3
+    assert result["curr_state"] == "best_answer"
+    # The second attempt ties the first and beats the refusal, so it is what the user gets
+    assert result["message"][-1] == result["best_answer"] == answers[1]
+    assert "Stopped retrying after 3 attempts (3 attempts spent)" in result["reasoning_chain"][-1]
+
+
+@pytest.mark.parametrize("limit, value, reason", [
+    ("REQUEST_DEADLINE_S", 0.0, "the 0s deadline"),
+    ("REQUEST_TOKEN_BUDGET", 1, "the 1 token budget"),
+])
+def test_loop_stops_when_time_or_tokens_run_out(monkeypatch, poor_workflow, limit, value, reason):
+    workflow, answers = poor_workflow
+    monkeypatch.setattr(budget, "MAX_ITERATIONS", 10)
+    monkeypatch.setattr(budget, limit, value)
+    result = run(workflow, answers, f"budget-{limit}")
+    assert result["iterations"] == len(answers) == 1
+    assert result["message"][-1] == result["best_answer"] == answers[0]
+    assert result["tokens_used"] > 0
+    assert f"({reason} spent)" in result["reasoning_chain"][-1]
@@ -0,0 +1,119 @@
+import operator
+import time
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from scripts.checkpointer import SQLiteCheckpointer
+
+
+class State(TypedDict):
+    answer: str
+    steps: Annotated[List[str], operator.add]
+
+
+def make_graph(checkpointer):
+    graph = StateGraph(State)
+    graph.add_node("answer", lambda state: {"answer": "first", "steps": ["answer"]})
+    graph.add_edge(START, "answer")
+    graph.add_edge("answer", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def test_updates_forked_from_the_same_checkpoint_keep_their_own_values(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0)
+    graph = make_graph(checkpointer)
+    config = {"configurable": {"thread_id": "t1"}}
+    graph.invoke({"answer": "", "steps": []}, config)
+    base = graph.get_state(config).config
+
+    # Two updates from the same checkpoint bump the channel from the same version
+    first = graph.update_state(base, {"answer": "retry one"}, as_node="answer")
+    second = graph.update_state(base, {"answer": "retry two"}, as_node="answer")
+    assert graph.get_state(first).values["answer"] == "retry one"
+    assert graph.get_state(second).values["answer"] == "retry two"
+
+    # A fresh saver on the same file reads the same values back
+    reopened = make_graph(SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0))
+    assert reopened.get_state(second).values["answer"] == "retry two"
+    checkpointer.close()
+
+
+def make_interrupting_graph(checkpointer):
+    graph = StateGraph(State)
+    graph.add_node("ask", lambda state: {"steps": ["ask"]})
+    graph.add_node("human", lambda state: {"answer": interrupt("which cheese?"), "steps": ["human"]})
+    graph.add_edge(START, "ask")
+    graph.add_edge("ask", "human")
+    graph.add_edge("human", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def run_threads(checkpointer, *thread_ids):
+    graph = make_graph(checkpointer)
+    for thread_id in thread_ids:
+        graph.invoke({"answer": "", "steps": []}, {"configurable": {"thread_id": thread_id}})
+
+
+def set_age(checkpointer, thread_id, seconds_ago):
+    checkpointer._conn.execute("UPDATE checkpoints SET created_at = ? WHERE thread_id = ?",
+                               (time.time() - seconds_ago, thread_id))
+    checkpointer._conn.commit()
+
+
+def thread_ids(checkpointer):
+    return {row[0] for row in checkpointer._conn.execute("SELECT DISTINCT thread_id FROM checkpoints")}
+
+
+def test_expired_threads_are_evicted(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), ttl=60, compact_interval=0)
+    run_threads(checkpointer, "old", "new")
+    set_age(checkpointer, "old", 120)
+
+    assert checkpointer.compact()["evicted_threads"] == 1
+    assert thread_ids(checkpointer) == {"new"}
+    assert checkpointer._conn.execute("SELECT COUNT(*) FROM blobs WHERE thread_id = 'old'").fetchone()[0] == 0
+    checkpointer.close()
+
+
+def test_size_limit_evicts_the_least_recently_updated_threads_first(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), ttl=None, compact_interval=0)
+    run_threads(checkpointer, "oldest", "older", "newest")
+    for age, thread_id in ((30, "oldest"), (20, "older"), (10, "newest")):
+        set_age(checkpointer, thread_id, age)
+    # Room for a little more than one thread
+    checkpointer.max_bytes = checkpointer.stats()["bytes"] // 3 + 10
+
+    assert checkpointer.compact()["evicted_threads"] == 2
+    assert thread_ids(checkpointer) == {"newest"}
+    assert checkpointer.stats()["bytes"] <= checkpointer.max_bytes
+    checkpointer.close()
+
+
+def test_threads_are_trimmed_to_their_latest_checkpoints(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), keep_per_thread=2, compact_interval=0)
+    graph = make_graph(checkpointer)
+    config = {"configurable": {"thread_id": "t1"}}
+    for _ in range(3):
+        graph.invoke({"answer": "", "steps": []}, config)
+    history = [snapshot.config["configurable"]["checkpoint_id"] for snapshot in graph.get_state_history(config)]
+    assert len(history) > 2
+
+    assert checkpointer.compact()["trimmed_checkpoints"] == len(history) - 2
+    remaining = [snapshot.config["configurable"]["checkpoint_id"] for snapshot in graph.get_state_history(config)]
+    assert remaining == history[:2]
+    assert graph.get_state(config).values["steps"] == ["answer"] * 3
+    checkpointer.close()
+
+
+def test_interrupted_thread_resumes_after_compaction(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), keep_per_thread=1, compact_interval=0)
+    graph = make_interrupting_graph(checkpointer)
+    config = {"configurable": {"thread_id": "t1"}}
+    result = graph.invoke({"answer": "", "steps": []}, config)
+    assert "__interrupt__" in result
+
+    checkpointer.compact()
+    assert graph.invoke(Command(resume="brie"), config) == {"answer": "brie", "steps": ["ask", "human"]}
+    checkpointer.close()
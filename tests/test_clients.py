@@ -0,0 +1,33 @@
+import asyncio
+
+import scripts.clients as clients
+
+
+class Closeable:
+    def __init__(self, closed, name):
+        self.closed, self.name = closed, name
+
+    async def close(self):
+        self.closed.append(self.name)
+
+
+def test_async_close_releases_the_pinecone_client_and_its_index(monkeypatch):
+    closed = []
+
+    class PineconeAsyncio(Closeable):
+        def __init__(self, api_key):
+            super().__init__(closed, "pinecone")
+
+        def IndexAsyncio(self, host):
+            return Closeable(closed, f"index {host}")
+
+    monkeypatch.setattr(clients, "PineconeAsyncio", PineconeAsyncio)
+    monkeypatch.setenv("PINECONE_INDEX_HOST", "products.example")
+
+    async def run():
+        index = clients.get_async_pinecone_index()
+        assert clients.get_async_pinecone_index() is index
+        await clients.aclose_clients()
+
+    asyncio.run(run())
+    assert sorted(closed) == ["index products.example", "pinecone"]
@@ -0,0 +1,27 @@
+from scripts.nodes.combinedSearchNode import BranchResult, _filter_check, _fuse
+
+CHEAP = {"sku": "1", "name": "Mozzarella", "price": 9.99}
+PRICEY = {"sku": "2", "name": "Aged Parmesan", "price": 89.0}
+
+
+def branches():
+    catalog = {"query_type": "find", "total": 1, "products": [CHEAP],
+               "filter_conditions": {"price": {"$lt": 30}}}
+    return [BranchResult("catalog", catalog), BranchResult("vector", [dict(PRICEY, score=0.9), dict(CHEAP, score=0.8)])]
+
+
+def test_vector_hits_are_checked_against_the_catalog_filter():
+    assert _filter_check(branches()) == ({"price": {"$lt": 30}}, ["2", "1"])
+
+
+def test_vector_hits_failing_the_filter_are_dropped_and_the_total_is_the_catalogs():
+    context, _ = _fuse(branches(), allowed={"1"})
+    assert "Aged Parmesan" not in context
+    assert "Mozzarella" in context
+    assert "Found 1 products." in context
+
+
+def test_without_a_catalog_result_every_vector_hit_is_kept():
+    vector_only = [BranchResult("catalog", error="timed out"), branches()[1]]
+    assert _filter_check(vector_only) is None
+    assert "Aged Parmesan" in _fuse(vector_only)[0]
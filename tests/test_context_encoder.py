@@ -0,0 +1,64 @@
+import asyncio
+import re
+
+from langchain_core.messages import AIMessage
+
+from benchmarks.async_throughput import initial_state
+from benchmarks.end_to_end import DEFAULT_CORPUS, install_scripted_models, load_corpus
+from benchmarks.standins import LatencyStandIn, fake_chain
+from scripts.agent import make_agent_workflow
+from scripts.chains import register_chain
+from scripts.context_encoder import encode_products, expand_references, product_references
+
+BRIE = {"sku": "101", "name": "Brie - 101", "brand": "Président", "price": 12.5,
+        "showImage": "https://img.example/brie.jpg", "href": "https://shop.example/sku/brie/101",
+        "description": "Soft cheese, see https://shop.example/sku/brie/101 for details."}
+GOUDA = {"sku": "102", "name": "Gouda", "price": 8.0, "href": "https://shop.example/sku/gouda/102",
+         "description": "Semi-hard cheese."}
+
+
+def test_urls_become_references_and_expand_back():
+    context = encode_products([BRIE, GOUDA], total=5)
+    assert context.startswith("Found 5 products in total; showing the first 2.")
+    assert "https://" not in context
+    assert "101: Soft cheese, see [link:101] for details." in context
+    assert "Brie|Président" in context
+
+    references = product_references([BRIE, GOUDA])
+    assert references == {"101": {"image": "https://img.example/brie.jpg", "link": "https://shop.example/sku/brie/101"},
+                          "102": {"link": "https://shop.example/sku/gouda/102"}}
+    answer = "Try brie [image:101] ([link:101]) or gouda [link:102] [image:102]."
+    assert expand_references(answer, references) == (
+        "Try brie ![101](https://img.example/brie.jpg) ([product page](https://shop.example/sku/brie/101)) "
+        "or gouda [product page](https://shop.example/sku/gouda/102) .")
+
+
+def test_unknown_references_keep_the_sku():
+    assert expand_references("See [link:999] [image:999].", {}) == "See SKU 999 ."
+    assert product_references([{"sku": "", "href": "https://shop.example/x"}, {"sku": "3", "href": "N/A"}]) == {}
+
+
+def test_each_run_expands_its_own_references(standins):
+    """Concurrent runs on separate threads link the products each of them retrieved."""
+    install_scripted_models(load_corpus(DEFAULT_CORPUS), 20)
+    picks = {}
+
+    def answer(inputs):
+        picks[inputs["question"]] = re.search(r"^(\d+)\|", inputs["context"], re.MULTILINE).group(1)
+        return AIMessage(content=f"Here is a good pick for you: [link:{picks[inputs['question']]}]")
+
+    register_chain("answer", lambda: fake_chain(answer, LatencyStandIn(20)))
+    workflow = make_agent_workflow(async_mode=True)
+    questions = ["Find mozzarella under $50", "Something mild for kids' sandwiches"]
+
+    async def run_all():
+        return await asyncio.gather(*(workflow.ainvoke(initial_state(question),
+                                                       config={"configurable": {"thread_id": f"refs-{i}"}})
+                                      for i, question in enumerate(questions)))
+
+    results = asyncio.run(run_all())
+    assert picks[questions[0]] != picks[questions[1]]
+    for question, result in zip(questions, results):
+        link = result["references"][picks[question]]["link"]
+        assert result["message"][-1] == f"Here is a good pick for you: [product page]({link})"
+        assert link.endswith(picks[question])
@@ -0,0 +1,83 @@
+import asyncio
+import random
+import threading
+
+from scripts.checkpointer import SQLiteCheckpointer
+from scripts.context_store import ContextStore
+
+
+def test_context_survives_a_restart_on_the_same_checkpoint_file(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    first = SQLiteCheckpointer(path, compact_interval=0)
+    ref = ContextStore(backend=first).put("sku 124254 | Mozzarella | $53.98")
+    first.close()
+
+    second = SQLiteCheckpointer(path, compact_interval=0)
+    assert ContextStore(backend=second).get(ref) == "sku 124254 | Mozzarella | $53.98"
+    assert second.stats()["contexts"] == 1
+    second.close()
+
+
+def test_unknown_context_reads_as_empty(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0)
+    assert ContextStore(backend=checkpointer).get("ctx-0000000000000000") == ""
+    assert ContextStore().get("") == ""
+    checkpointer.close()
+
+
+def test_unused_contexts_expire_with_the_thread_ttl(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0)
+    ContextStore(backend=checkpointer).put("old context")
+    checkpointer.ttl = 0
+    checkpointer.compact()
+    assert checkpointer.stats()["contexts"] == 0
+    checkpointer.close()
+
+
+def test_async_calls_reach_the_backend_off_the_event_loop(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0)
+    loop_threads = []
+    put_context = checkpointer.put_context
+
+    def record_put(ref, text):
+        loop_threads.append(threading.current_thread())
+        put_context(ref, text)
+
+    checkpointer.put_context = record_put
+
+    async def round_trip():
+        ref = await ContextStore(backend=checkpointer).aput("brie | $7.99")
+        return ref, await ContextStore(backend=checkpointer).aget(ref), threading.current_thread()
+
+    ref, text, loop_thread = asyncio.run(round_trip())
+    assert text == "brie | $7.99"
+    assert loop_threads and loop_threads[0] is not loop_thread
+    checkpointer.close()
+
+
+def test_reads_do_not_write_until_compaction(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0)
+    ref = ContextStore(backend=checkpointer).put("brie | $7.99")
+    checkpointer._conn.execute("UPDATE contexts SET used_at = 0")
+    checkpointer._conn.commit()
+
+    assert ContextStore(backend=checkpointer).get(ref) == "brie | $7.99"
+    assert checkpointer._conn.execute("SELECT used_at FROM contexts").fetchone()[0] == 0
+    checkpointer.compact()
+    assert checkpointer._conn.execute("SELECT used_at FROM contexts").fetchone()[0] > 0
+    checkpointer.close()
+
+
+def test_contexts_count_toward_the_size_limit(tmp_path):
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "checkpoints.sqlite"), compact_interval=0, max_bytes=2000)
+    store = ContextStore(backend=checkpointer)
+    # Random text, so compression cannot bring it under the limit
+    refs = [store.put(random.Random(number).randbytes(600).hex()) for number in range(10)]
+    assert checkpointer.stats()["bytes"] > 2000
+
+    checkpointer.compact()
+    assert checkpointer.stats()["bytes"] <= 2000
+    # The most recently used contexts stay
+    assert checkpointer.get_context(refs[-1]) is not None
+    assert checkpointer.get_context(refs[0]) is None
+    checkpointer.close()
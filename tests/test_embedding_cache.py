@@ -0,0 +1,18 @@
+import asyncio
+
+from scripts.embedding_cache import EmbeddingCache
+
+
+def test_aembed_embeds_misses_once_and_serves_hits(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    calls = []
+
+    async def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    first = asyncio.run(cache.aembed(["brie", "feta", "brie"], "model", embed))
+    second = asyncio.run(cache.aembed(["feta", "gouda"], "model", embed))
+    assert first == [[4.0, 1.0], [4.0, 1.0], [4.0, 1.0]]
+    assert second == [[4.0, 1.0], [5.0, 1.0]]
+    assert calls == [["brie", "feta"], ["gouda"]]
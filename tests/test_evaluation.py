@@ -0,0 +1,113 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import scripts.evaluation as evaluation
+import scripts.nodes.cacheStoreNode as cache_store_node
+from scripts.answer_cache import SemanticAnswerCache
+from scripts.evaluation import AnswerEvaluator, heuristic_evaluation
+
+ANSWER = "Galbani Whole Milk Mozzarella costs $4.99."
+
+
+@pytest.fixture
+def grader(monkeypatch):
+    """The evaluation LLM: grades everything `verdict`, once `release` is set."""
+    grader = SimpleNamespace(calls=[], threads=set(), verdict="GOOD", release=threading.Event())
+    grader.release.set()
+
+    class Chain:
+        def invoke(self, inputs):
+            grader.calls.append(inputs["response"])
+            grader.threads.add(threading.current_thread().name)
+            grader.release.wait(5)
+            return SimpleNamespace(tool=grader.verdict, analysis="graded")
+
+    monkeypatch.setattr(evaluation, "get_chain", lambda name: Chain())
+    return grader
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SemanticAnswerCache(embed=lambda text: [1.0, 0.0], terms=[])
+    monkeypatch.setattr(cache_store_node, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(evaluation, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(cache_store_node, "ANSWER_CACHE_ENABLED", True)
+    return cache
+
+
+def final_state(graded_by, **values):
+    return {"message": ["Find mozzarella", ANSWER], "reasoning_chain": ["graded"], "human_feedback": "",
+            "started_at": 0.0, "graded_by": graded_by, "iterations": 1, **values}
+
+
+class Workflow:
+    """Holds a finished run's state, like the graph's checkpointer."""
+
+    def __init__(self, values):
+        self.values = values
+        self.updates = []
+
+    def get_state(self, config):
+        return SimpleNamespace(values=self.values)
+
+    def update_state(self, config, values, as_node):
+        self.updates.append((values, as_node))
+
+
+def test_heuristic_catches_refusals_and_wrong_counts():
+    assert heuristic_evaluation("", "").tool == "POOR"
+    assert heuristic_evaluation("There is not enough information to answer.", "").tool == "POOR"
+    assert heuristic_evaluation("Found 3 products under $5.", "Found 7 products\n...").tool == "POOR"
+    assert heuristic_evaluation("Found 7 products under $5.", "Found 7 products\n...").source == "heuristic"
+
+
+def test_policies_decide_when_the_llm_grades(grader):
+    assert AnswerEvaluator("llm").evaluate([], ANSWER, "").source == "llm"
+    assert AnswerEvaluator("heuristic").evaluate([], ANSWER, "").source == "heuristic"
+    assert AnswerEvaluator("sampled", sample_rate=0.0).evaluate([], ANSWER, "").source == "heuristic"
+    assert AnswerEvaluator("sampled", sample_rate=1.0).evaluate([], ANSWER, "").source == "llm"
+    # A locally POOR answer is never sent on to the LLM
+    assert AnswerEvaluator("sampled", sample_rate=1.0).evaluate([], "", "").source == "heuristic"
+    assert len(grader.calls) == 2
+    with pytest.raises(ValueError):
+        AnswerEvaluator("always")
+
+
+def test_speculative_grades_share_one_executor(grader):
+    grader.release.clear()
+    evaluators = [AnswerEvaluator("speculative") for _ in range(3)]
+    for i, evaluator in enumerate(evaluators):
+        assert evaluator.evaluate([], ANSWER, "", thread_id=f"t{i}").source == "heuristic"
+    grader.release.set()
+    assert [evaluator.speculative_grade(f"t{i}").source for i, evaluator in enumerate(evaluators)] == ["llm"] * 3
+    assert all(name.startswith("speculative_grade") for name in grader.threads)
+    assert not hasattr(evaluators[0], "_executor")
+    # The grade is handed out once
+    assert evaluators[0].speculative_grade("t0") is None
+
+
+def test_only_llm_graded_answers_are_cached(cache):
+    version = cache_store_node.current_catalog_version()
+    cache_store_node.cacheStoreNode(final_state("heuristic"))
+    assert cache.lookup("Find mozzarella", version) is None
+    cache_store_node.cacheStoreNode(final_state("llm"))
+    assert cache.lookup("Find mozzarella", version).answer == ANSWER
+
+
+def test_speculative_grade_caches_good_and_reopens_poor(monkeypatch, grader, cache):
+    monkeypatch.setattr(evaluation, "_evaluator", AnswerEvaluator("speculative"))
+    config = {"configurable": {"thread_id": "speculative-1"}}
+    version = cache_store_node.current_catalog_version()
+
+    workflow = Workflow(final_state("heuristic"))
+    evaluation.get_evaluator().evaluate(workflow.values["message"], ANSWER, "", "speculative-1")
+    assert not evaluation.retry_if_poor(workflow, config)
+    assert cache.lookup("Find mozzarella", version).answer == ANSWER
+
+    grader.verdict = "POOR"
+    evaluation.get_evaluator().evaluate(workflow.values["message"], ANSWER, "", "speculative-1")
+    assert evaluation.retry_if_poor(workflow, config)
+    assert cache.lookup("Find mozzarella", version) is None
+    assert workflow.updates == [({"answer_quality": "POOR", "reasoning_chain": ["graded"]}, "answer")]
@@ -0,0 +1,36 @@
+import threading
+import time
+
+from scripts.ingestion import IngestionPipeline, TokenBucketLimiter
+
+
+def acquire_within(limiter, timeout_s, tokens=0):
+    """Run limiter.acquire() in a thread; True when it returns within timeout_s."""
+    done = threading.Event()
+    threading.Thread(target=lambda: (limiter.acquire(tokens), done.set()), daemon=True).start()
+    return done.wait(timeout_s)
+
+
+def test_limiter_below_one_request_per_second_admits_requests():
+    # 50 RPM refills 0.83 requests per second, less than the one request each acquire needs
+    limiter = TokenBucketLimiter(requests_per_minute=50, tokens_per_minute=1_000_000)
+    assert acquire_within(limiter, 0.5)
+    start = time.monotonic()
+    assert acquire_within(limiter, 3.0)
+    assert time.monotonic() - start >= 1.0
+
+
+def test_limiter_admits_a_request_larger_than_the_token_bucket():
+    limiter = TokenBucketLimiter(requests_per_minute=6000, tokens_per_minute=30)
+    assert acquire_within(limiter, 0.5, tokens=500)
+
+
+def test_pipeline_counts_every_product_batch_and_upsert():
+    upserted = []
+    pipeline = IngestionPipeline(embed=lambda texts: [[float(len(text))] for text in texts],
+                                 upsert=lambda records: upserted.append(len(records)),
+                                 concurrency=4, batch_size=7, upsert_batch_size=10, queue_size=2)
+    stats = pipeline.run((str(i), f"product {i}", {}) for i in range(95))
+    assert (stats.products, stats.batches) == (95, 14)
+    assert stats.upserts == len(upserted) == 10
+    assert sum(upserted) == 95
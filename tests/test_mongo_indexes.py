@@ -0,0 +1,53 @@
+import pytest
+
+from benchmarks.standins import InMemoryCollection
+from scripts.catalog import iter_products
+import scripts.mongo_indexes as mongo_indexes
+from scripts.mongo_indexes import name_vocabulary, optimize_filter, search_fields, whole_tokens
+
+CATALOG = "./fixture/products.json"
+
+
+@pytest.fixture(scope="module")
+def collection():
+    return InMemoryCollection([dict(product, **search_fields(product)) for product in iter_products(CATALOG)])
+
+
+@pytest.mark.parametrize("pattern", ["mozz", "mozzarella", "string cheese", "cheddar", "cheese", "jack",
+                                     "shred", "sliced", "cream cheese"])
+def test_name_rewrite_selects_the_same_products(collection, pattern):
+    original = {"name": {"$regex": pattern, "$options": "i"}}
+    optimized = optimize_filter(original, name_vocabulary(collection))
+    skus = lambda query: sorted(document["sku"] for document in collection.find(query))
+    assert skus(optimized) == skus(original)
+
+
+def test_whole_word_is_rewritten_to_a_token_match():
+    vocabulary = whole_tokens({"mozzarella", "mozzarellas", "string", "cheese"})
+    assert optimize_filter({"name": {"$regex": "Mozzarella", "$options": "i"}}, vocabulary) == \
+        {"name_tokens": "mozzarella"}
+    assert optimize_filter({"name": {"$regex": "mozz", "$options": "i"}}, vocabulary) == \
+        {"name": {"$regex": "mozz", "$options": "i"}}
+    phrase = optimize_filter({"name": {"$regex": "string cheese", "$options": "i"}}, vocabulary)
+    assert phrase == {"name_tokens": {"$all": ["string", "cheese"]},
+                      "name": {"$regex": "string cheese", "$options": "i"}}
+
+
+def test_vocabulary_comes_from_the_queried_collection():
+    # "brie" is a whole token here but not in a collection that also sells "briefcase"
+    products = [{"sku": "1", "name": "Brie Wheel"}, {"sku": "2", "name": "Briefcase Cheddar"}]
+    collection = InMemoryCollection([dict(product, **search_fields(product)) for product in products],
+                                    name="other_products")
+    vocabulary = name_vocabulary(collection)
+    assert "brie" not in vocabulary and "cheddar" in vocabulary
+    original = {"name": {"$regex": "brie", "$options": "i"}}
+    assert optimize_filter(original, vocabulary) == original
+
+
+def test_search_fields_added_later_are_picked_up(monkeypatch):
+    collection = InMemoryCollection([{"sku": "1", "name": "Brie Wheel"}], name="late_products")
+    assert name_vocabulary(collection) is None
+
+    collection._documents[0].update(search_fields(collection._documents[0]))
+    monkeypatch.setattr(mongo_indexes, "MONGO_VOCABULARY_TTL_S", 0)
+    assert name_vocabulary(collection) == {"brie", "wheel"}
@@ -0,0 +1,88 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import scripts.nodes.MongoDBretrievalNode as retrieval
+from scripts.query_compiler import QueryCompiler
+
+CORPUS = "./fixture/benchmark_queries_v1.json"
+
+
+@pytest.fixture(scope="module")
+def compiler():
+    return QueryCompiler(brands=["Galbani", "Organic Valley", "Boar's Head"])
+
+
+def filters(compiler, query):
+    compiled = compiler.compile(query)
+    assert compiled is not None, query
+    return compiled["filter_conditions"]
+
+
+def test_price_bounds_and_ranges(compiler):
+    assert filters(compiler, "Find mozzarella under $50") == {
+        "price": {"$lte": 50.0}, "name": {"$regex": "mozzarella", "$options": "i"}}
+    assert filters(compiler, "cheese between $20 and $40") == {"price": {"$gte": 20.0, "$lte": 40.0}}
+    assert filters(compiler, "cheese over 100 dollars") == {"price": {"$gt": 100.0}}
+    assert filters(compiler, "cheese under $5/lb") == {"pricePer": {"$lte": 5.0}}
+
+
+def test_brand_department_and_stock(compiler):
+    assert filters(compiler, "Boar's Head sliced cheese") == {
+        "brand": "Boar's Head", "department": {"$regex": "Sliced Cheese", "$options": "i"}}
+    assert filters(compiler, "Galbani mozzarella in stock") == {
+        "empty": False, "brand": "Galbani", "name": {"$regex": "mozzarella", "$options": "i"}}
+    assert filters(compiler, "sliced cheddar out of stock")["empty"] is True
+
+
+def test_superlatives_and_aggregations(compiler):
+    top = compiler.compile("top 3 most popular cheeses")
+    assert (top["sort_conditions"], top["limit"]) == ({"popularity_order": 1}, 3)
+    assert compiler.compile("Show me the most expensive cheese")["limit"] == 1
+    brands = compiler.compile("how many brands have cheese under $10?")
+    assert brands["query_type"] == "aggregate"
+    assert brands["aggregation_pipeline"] == [{"$group": {"_id": "$brand"}}, {"$count": "total_brands"}]
+    assert compiler.compile("average price by department")["aggregation_pipeline"][0]["$group"]["_id"] == \
+        "$department"
+
+
+@pytest.mark.parametrize("query", [
+    "cheese",                              # only stopwords: no filter of its own
+    "Which Galbani cheeses come in a pack of six?",  # leftover words the compiler does not understand
+    "cheese under $10 and under $20",      # the same bound twice
+    "mozzarella and cheddar",              # two cheese types
+    "Galbani Organic Valley cheese",       # two brands
+    "most expensive and cheapest cheese",  # two sort orders
+    "cheese by brand",                     # a grouping without a measure
+])
+def test_ambiguous_or_unknown_queries_go_to_the_llm(compiler, query):
+    assert compiler.compile(query) is None
+
+
+def test_benchmark_corpus(compiler):
+    with open(CORPUS, "r", encoding="utf-8") as f:
+        queries = json.load(f)["queries"]
+    for entry in queries:
+        compiled = compiler.compile(entry["query"])
+        # Only catalog questions may be compiled; the rest must reach the LLM router's tools
+        if entry["route"] != "mongoDB_retrieval":
+            assert compiled is None, entry["id"]
+    compiled = {entry["id"] for entry in queries if compiler.compile(entry["query"]) is not None}
+    assert compiled == {"mongo-01", "mongo-02", "mongo-03", "mongo-04", "mongo-06"}
+
+
+def test_uncompiled_queries_fall_back_to_the_llm(monkeypatch):
+    calls = []
+    generated = {"query_type": "find", "filter_conditions": {"pack": 6}}
+
+    class Chain:
+        def invoke(self, inputs):
+            calls.append(inputs["message"])
+            return SimpleNamespace(content=json.dumps(generated))
+
+    monkeypatch.setattr(retrieval, "get_chain", lambda name: Chain())
+    assert retrieval.generate_mongo_query("Which Galbani cheeses come in a pack of six?") == generated
+    assert retrieval.generate_mongo_query("Find mozzarella under $50")["filter_conditions"]["price"] == \
+        {"$lte": 50.0}
+    assert calls == ["Which Galbani cheeses come in a pack of six?"]
@@ -0,0 +1,40 @@
+import os
+
+from scripts.router import FastPathRouter, RoutingLog, load_routing_log
+
+
+def make_router():
+    return FastPathRouter(brands=["Galbani"])
+
+
+def test_pairing_questions_are_not_refused():
+    router = make_router()
+    for query in ("what goes with a dry red wine for dinner", "something to pair with beer",
+                  "a cheese for wine night"):
+        decision = router.route(query)
+        assert decision is None or decision.route != "off_topic", query
+
+
+def test_off_topic_questions_are_refused():
+    decision = make_router().route("what's the weather tomorrow?")
+    assert decision is not None and decision.route == "off_topic"
+
+
+def test_decisions_are_not_logged_unless_enabled(tmp_path):
+    path = str(tmp_path / "routing_log.jsonl")
+    FastPathRouter(brands=[], log_path=path).log_decision("my address is 1 Main St", "out_of_scope")
+    assert not os.path.exists(path)
+
+
+def test_routing_log_rotates_at_its_size_limit(tmp_path):
+    path = str(tmp_path / "routing_log.jsonl")
+    log = RoutingLog(path, max_bytes=200, backups=1)
+    for number in range(20):
+        log.append({"query": f"brie under ${number}", "tool": "mongoDB_retrieval"})
+    log.flush()
+
+    assert os.path.getsize(path) <= 200
+    assert not os.path.exists(path + ".2")
+    examples = load_routing_log(path, backups=1)
+    assert examples[-1] == ("brie under $19", "mongoDB_retrieval")
+    assert len(examples) < 20
@@ -0,0 +1,108 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks.end_to_end import DEFAULT_CORPUS, install_scripted_models, load_corpus
+from scripts.agent import make_agent_workflow
+from scripts.server import AgentService, make_server
+
+# Each scripted model call takes this long, so a run holds its worker for a few of them
+LLM_MS = 150
+
+
+@pytest.fixture(scope="module")
+def server(standins):
+    install_scripted_models(load_corpus(DEFAULT_CORPUS), LLM_MS)
+    service = AgentService(make_agent_workflow(), workers=1, queue_size=1)
+    httpd = make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield service, httpd.server_address[1]
+    httpd.shutdown()
+    service.close()
+
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server[1], timeout=30)
+    connection.request(method, path, json.dumps(body) if body is not None else None,
+                       {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), json.loads(response.read() or b"null")
+
+
+def wait_until(condition, timeout_s=5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_chat_answers(server):
+    status, headers, payload = request(server, "POST", "/v1/chat", {"message": "Find mozzarella under $50"})
+    assert status == 200 and payload["status"] == "done"
+    assert headers["X-Thread-Id"] == payload["thread_id"]
+    assert payload["answer"].startswith("Here is what I found for Find mozzarella under $50")
+
+
+def test_interrupted_thread_resumes_once(server):
+    status, _, payload = request(server, "POST", "/v1/chat", {"message": "I need some cheese"})
+    assert (status, payload["status"], payload["question"]) == (200, "interrupted", "I need some cheese")
+    thread = f"/v1/threads/{payload['thread_id']}"
+    assert request(server, "GET", thread)[2]["status"] == "interrupted"
+
+    status, _, payload = request(server, "POST", thread + "/resume", {"feedback": "Shredded mozzarella under $40"})
+    assert (status, payload["status"]) == (200, "done")
+    assert "Shredded mozzarella under $40" in payload["answer"]
+    assert request(server, "GET", thread)[2]["status"] == "done"
+    assert request(server, "POST", thread + "/resume", {"feedback": "brie"})[0] == 409
+    assert request(server, "POST", "/v1/threads/unknown/resume", {"feedback": "brie"})[0] == 404
+
+
+def test_thread_is_running_and_busy_while_a_worker_holds_it(server):
+    service = server[0]
+    thread_id = request(server, "POST", "/v1/chat", {"message": "I need some cheese"})[2]["thread_id"]
+    thread = f"/v1/threads/{thread_id}"
+    results = []
+    first = threading.Thread(target=lambda: results.append(
+        request(server, "POST", thread + "/resume", {"feedback": "Shredded mozzarella under $40"})))
+    first.start()
+    wait_until(lambda: service.running(thread_id))
+
+    assert request(server, "GET", thread)[2]["status"] == "running"
+    status, _, payload = request(server, "POST", thread + "/resume", {"feedback": "brie"})
+    assert status == 409 and payload["error"] == "a request is already running on this thread"
+    first.join()
+    assert results[0][2]["status"] == "done"
+    assert request(server, "GET", thread)[2]["status"] == "done"
+
+
+def test_full_queue_is_turned_away_with_retry_after(server):
+    service = server[0]
+    before = service.stats()
+    results = []
+
+    def chat():
+        results.append(request(server, "POST", "/v1/chat", {"message": "Find cheese that's good for pizza"}))
+
+    # One run on the worker and one in the queue; the third request finds the queue full
+    clients = [threading.Thread(target=chat) for _ in range(2)]
+    clients[0].start()
+    wait_until(lambda: service.stats()["in_flight"] == 1)
+    clients[1].start()
+    wait_until(lambda: service.stats()["queued"] == 1)
+    status, headers, payload = request(server, "POST", "/v1/chat", {"message": "Find cheese that's good for pizza"})
+    for client in clients:
+        client.join()
+
+    assert status == 429 and payload["error"] == "queue full"
+    assert int(headers["Retry-After"]) >= 1
+    assert [result[0] for result in results] == [200, 200]
+    assert service.stats()["rejected"] == before["rejected"] + 1
+
+
+def test_deadline_is_enforced(server):
+    status, _, payload = request(server, "POST", "/v1/chat",
+                                 {"message": "Find mozzarella under $50", "timeout_s": 0.05})
+    assert status == 504 and payload["error"] == "deadline exceeded"
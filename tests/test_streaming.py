@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+from scripts.streaming import stream_workflow
+
+
+class InterruptingWorkflow:
+    """Streams an interrupt, then saves its checkpoint the way the graph does once the run ends."""
+
+    def __init__(self):
+        self.saved = False
+
+    def stream(self, inputs, config, stream_mode):
+        yield "values", {"message": ["I need some cheese"]}
+        yield "updates", {"reasoning": {"tool": "human_in_the_loop"}}
+        yield "updates", {"__interrupt__": (SimpleNamespace(value={"query": "I need some cheese"}),)}
+        self.saved = True
+
+
+def test_interrupt_comes_after_the_run_has_saved_its_checkpoint():
+    workflow = InterruptingWorkflow()
+    events = stream_workflow(workflow, {}, {})
+    for event in events:
+        if event.kind == "interrupt":
+            break
+    assert workflow.saved
+    assert event.text == "I need some cheese"
+    assert event.state == {"message": ["I need some cheese"]}